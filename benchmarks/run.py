@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Run OcrRegenerator.check end to end against local stand-ins for Fedora, ActiveMQ and the gatekeeper and report
+its throughput, per pid latency and peak memory.
+
+    python -m benchmarks.run --objects 10000 --fedora-latency 0.02 --workers 8
+"""
+
+import argparse
+import copy
+import json
+import logging
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import yaml
+
+from ocr import OcrRegenerator
+from ocr.async_regenerator import AsyncOcrRegenerator
+from .standins import ActiveMQStandIn, Broker, CHECK_BEFORE, FedoraStandIn, GatekeeperStandIn, StompStandIn
+
+DEFAULT_SETTINGS = {
+    'objects': 1000,
+    'datastreams': 10,
+    'stale_every': 2,
+    'no_ocr_every': 10,
+    'fedora_latency': 0.0,
+    'activemq_latency': 0.0,
+    'gatekeeper_latency': 0.0,
+    'drain_rate': None,
+    'messages_per_pid': 1,
+    'queue_backend': 'xml',
+}
+
+
+class _LatencyRecorder:
+    """ Records the time taken to process each pid """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latencies = []
+
+    def _process_pid(self, pid):
+        start = time.perf_counter()
+        try:
+            super()._process_pid(pid)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def _process_pid_async(self, client, session, pid):
+        start = time.perf_counter()
+        try:
+            await super()._process_pid_async(client, session, pid)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+
+class TimedOcrRegenerator(_LatencyRecorder, OcrRegenerator):
+    pass
+
+
+class TimedAsyncOcrRegenerator(_LatencyRecorder, AsyncOcrRegenerator):
+    pass
+
+
+def serve(settings: dict, connection):
+    """
+    Run the stand-ins until told to stop, in their own process so they do not add to the regenerator's CPU or memory
+    :param settings: The benchmark settings
+    :param connection: Receives the stand-ins' urls, then their request counts once anything is sent back
+    """
+    broker = Broker(messages_per_pid=settings['messages_per_pid'], drain_rate=settings['drain_rate'])
+    stand_ins = {
+        'fedora': FedoraStandIn(settings['objects'], settings['datastreams'], settings['stale_every'],
+                                settings['no_ocr_every'], settings['fedora_latency']),
+        'activemq': ActiveMQStandIn(broker, settings['activemq_latency']),
+        'stomp': StompStandIn(broker, settings['activemq_latency']),
+        'gatekeeper': GatekeeperStandIn(broker, settings['gatekeeper_latency']),
+    }
+    for stand_in in stand_ins.values():
+        stand_in.start()
+    connection.send({name: stand_in.url for name, stand_in in stand_ins.items()})
+    connection.recv()
+    connection.send({name: stand_in.requests for name, stand_in in stand_ins.items()})
+    for stand_in in stand_ins.values():
+        stand_in.stop()
+
+
+def create_config(urls: dict, base: dict = None, queue_backend: str = 'xml') -> dict:
+    """
+    Point a configuration at the stand-ins
+    :param urls: The stand-ins' urls
+    :param base: A configuration to take every other setting from
+    :param queue_backend: How the queue monitor reads the broker, xml or stomp
+    :return: The configuration
+    """
+    config = copy.deepcopy(base) if base is not None else {}
+    config['fedora'] = {'url': urls['fedora'] + '/fedora', 'username': 'fedoraAdmin', 'password': 'fedoraAdmin'}
+    regenerator = config.setdefault('regenerator', {})
+    regenerator['url'] = urls['gatekeeper'] + '/islandora-1x-gatekeeper/process/pid'
+    regenerator.setdefault('delay_seconds', 1)
+    queue_monitor = config.setdefault('queue_monitor', {})
+    queue_monitor.update({'host': urls['activemq'], 'username': 'admin', 'password': 'admin', 'queue_name': 'fedora',
+                          'backend': queue_backend})
+    if queue_backend == 'stomp':
+        stomp = urlparse(urls['stomp'])
+        queue_monitor.update({'stomp_host': stomp.hostname, 'stomp_port': stomp.port})
+    queue_monitor.setdefault('max_queue_size', 100)
+    return config
+
+
+def percentile(values, percent: float) -> float:
+    """ The nearest rank percentile of values, 0 if there are none """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """ The peak resident set size of this process in megabytes """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmark(settings: dict = None, config: dict = None, workers: int = None, use_async: bool = False) -> dict:
+    """
+    Check every stand-in object with a regenerator and measure the run
+    :param settings: Overrides of DEFAULT_SETTINGS for the stand-ins
+    :param config: A regenerator configuration to take everything but the service urls from
+    :param workers: The number of pids to check concurrently, defaults to the configuration's
+    :param use_async: Whether to use the asyncio regenerator
+    :return: The results
+    """
+    settings = {**DEFAULT_SETTINGS, **(settings or {})}
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve, args=(settings, child), daemon=True)
+    process.start()
+    pid_file = None
+    try:
+        urls = parent.recv()
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            pid_file = f.name
+            f.writelines(f'bench:{i}\n' for i in range(settings['objects']))
+        regenerator_class = TimedAsyncOcrRegenerator if use_async else TimedOcrRegenerator
+        regen = regenerator_class(create_config(urls, config, settings['queue_backend']),
+                                  datetime.strptime(CHECK_BEFORE, '%Y-%m-%d'))
+        if workers is not None:
+            regen.set_workers(workers)
+        start = time.perf_counter()
+        regen.check(pid_file)
+        elapsed = time.perf_counter() - start
+        parent.send('stop')
+        requests = parent.recv()
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+        if pid_file is not None:
+            os.unlink(pid_file)
+    return {
+        'settings': settings,
+        'workers': regen.workers,
+        'async': use_async,
+        'pids': len(regen.latencies),
+        'seconds': elapsed,
+        'pids_per_second': len(regen.latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(regen.latencies, 50) * 1000,
+        'p99_ms': percentile(regen.latencies, 99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+        'stats': dict(regen.stats),
+        'requests': requests,
+    }
+
+
+def format_results(results: dict) -> str:
+    stats = results['stats']
+    return '\n'.join([
+        f"{results['pids']} pids in {results['seconds']:.2f}s with {results['workers']} workers"
+        f"{' (async)' if results['async'] else ''}",
+        f"  throughput  {results['pids_per_second']:.1f} pids/s",
+        f"  latency     p50 {results['p50_ms']:.1f}ms  p99 {results['p99_ms']:.1f}ms",
+        f"  peak RSS    {results['peak_rss_mb']:.1f}MB",
+        f"  outcomes    regenerated {stats['regenerated']}, up to date {stats['up_to_date']}, "
+        f"no OCR {stats['no_ocr']}, failed {stats['failed']}",
+        '  requests    ' + ', '.join(f'{name} {count}' for name, count in results['requests'].items()),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark OCR checks against local stand-in services')
+    parser.add_argument('-c', '--config', type=str,
+                        help='A configuration file to take the regenerator, queue monitor and http settings from')
+    parser.add_argument('-w', '--workers', type=int, help='Number of PIDs to check concurrently')
+    parser.add_argument('--async', dest='use_async', action='store_true', help='Check PIDs with asyncio')
+    parser.add_argument('--objects', type=int, default=DEFAULT_SETTINGS['objects'], help='Number of objects to check')
+    parser.add_argument('--datastreams', type=int, default=DEFAULT_SETTINGS['datastreams'],
+                        help='Datastreams per object')
+    parser.add_argument('--stale-every', type=int, default=DEFAULT_SETTINGS['stale_every'],
+                        help='One in this many objects has stale OCR')
+    parser.add_argument('--no-ocr-every', type=int, default=DEFAULT_SETTINGS['no_ocr_every'],
+                        help='One in this many objects has no OCR')
+    parser.add_argument('--fedora-latency', type=float, default=0.0, help='Seconds added to each Fedora response')
+    parser.add_argument('--activemq-latency', type=float, default=0.0, help='Seconds added to each ActiveMQ response')
+    parser.add_argument('--gatekeeper-latency', type=float, default=0.0,
+                        help='Seconds added to each gatekeeper response')
+    parser.add_argument('--drain-rate', type=float, help='Messages drained from the queue per second, unlimited if '
+                                                         'not set')
+    parser.add_argument('--messages-per-pid', type=int, default=1, help='Messages queued per regeneration')
+    parser.add_argument('--queue-backend', choices=['xml', 'stomp'], default=DEFAULT_SETTINGS['queue_backend'],
+                        help='Read queue statistics from the admin pages or over STOMP')
+    parser.add_argument('--log-level', type=str, default='INFO', help='The regenerator log level')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    args = parser.parse_args()
+    config = None
+    if args.config is not None:
+        with open(args.config, 'r') as f:
+            config = yaml.safe_load(f)
+    settings = {key: getattr(args, key) for key in DEFAULT_SETTINGS}
+    logging.getLogger().setLevel(args.log_level.upper())
+    results = run_benchmark(settings, config, args.workers, args.use_async)
+    print(json.dumps(results, indent=2) if args.json else format_results(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+import re
+import socket
+import socketserver
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+from local_activemq_api_client.stomp import STATISTICS_PREFIX, decode_frame, encode_frame
+
+APIA = 'http://www.fedora.info/definitions/1/0/access/'
+APIM = 'http://www.fedora.info/definitions/1/0/management/'
+
+STALE_DATE = '2000-01-01T00:00:00.000Z'
+FRESH_DATE = '2030-01-01T00:00:00.000Z'
+# Between STALE_DATE and FRESH_DATE, the date to run the benchmark's checks against
+CHECK_BEFORE = '2020-01-01'
+
+PROFILE_FIELDS = (
+    '<{prefix}dsLabel>{dsid} Record</{prefix}dsLabel>'
+    '<{prefix}dsVersionID>{dsid}.0</{prefix}dsVersionID>'
+    '<{prefix}dsCreateDate>{created}</{prefix}dsCreateDate>'
+    '<{prefix}dsState>A</{prefix}dsState>'
+    '<{prefix}dsMIME>text/plain</{prefix}dsMIME>'
+    '<{prefix}dsFormatURI></{prefix}dsFormatURI>'
+    '<{prefix}dsControlGroup>M</{prefix}dsControlGroup>'
+    '<{prefix}dsSize>{size}</{prefix}dsSize>'
+    '<{prefix}dsVersionable>true</{prefix}dsVersionable>'
+    '<{prefix}dsInfoType></{prefix}dsInfoType>'
+    '<{prefix}dsLocation>{pid}+{dsid}+{dsid}.0</{prefix}dsLocation>'
+    '<{prefix}dsLocationType>INTERNAL_ID</{prefix}dsLocationType>'
+    '<{prefix}dsChecksumType>DISABLED</{prefix}dsChecksumType>'
+    '<{prefix}dsChecksum>none</{prefix}dsChecksum>'
+)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled connections at the end of a run is expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StandInServer:
+    """ A threaded HTTP server on a free local port that sleeps latency seconds before each response """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self, address: str = '127.0.0.1', port: int = 0):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep connections open so pooled clients are measured as they run against the real services
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately, don't let them wait on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with stand_in._lock:
+                    stand_in.requests += 1
+                if stand_in.latency > 0:
+                    time.sleep(stand_in.latency)
+                parsed = urlparse(self.path)
+                status, body, content_type = stand_in.handle(unquote(parsed.path), parse_qs(parsed.query))
+                body = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _Server((address, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, path: str, query: dict):
+        """
+        Build the response to a GET request
+        :param path: The unquoted request path
+        :param query: The parsed query string
+        :return: A tuple of the status code, body and content type
+        """
+        raise NotImplementedError()
+
+
+class FedoraStandIn(StandInServer):
+    """
+    Serves datastream profiles and listings for the objects bench:0 to bench:{objects - 1}. Each object has
+    datastreams datastreams, and an OCR datastream unless its number is a multiple of no_ocr_every. OCR is stale for
+    one in every stale_every objects.
+    """
+
+    _datastreams_path = re.compile(r'/objects/([^/]+)/datastreams(?:/([^/]+))?$')
+
+    def __init__(self, objects: int, datastreams: int = 10, stale_every: int = 2, no_ocr_every: int = 10,
+                 latency: float = 0.0):
+        super().__init__(latency)
+        self.objects = objects
+        self.datastreams = max(1, datastreams)
+        self.stale_every = stale_every
+        self.no_ocr_every = no_ocr_every
+
+    def pids(self):
+        return (f'bench:{i}' for i in range(self.objects))
+
+    def _number(self, pid: str):
+        namespace, _, number = pid.partition(':')
+        if namespace != 'bench' or not number.isdigit() or int(number) >= self.objects:
+            return None
+        return int(number)
+
+    def _datastream_ids(self, number: int):
+        has_ocr = self.no_ocr_every <= 0 or number % self.no_ocr_every != 0
+        others = [f'DS{i}' for i in range(self.datastreams - 1 if has_ocr else self.datastreams)]
+        return others + ['OCR'] if has_ocr else others
+
+    def _created_date(self, number: int, dsid: str):
+        if dsid == 'OCR' and self.stale_every > 0 and number % self.stale_every == 0:
+            return STALE_DATE
+        return FRESH_DATE
+
+    def _profile_fields(self, pid: str, number: int, dsid: str, prefix: str):
+        return PROFILE_FIELDS.format(prefix=prefix, pid=pid, dsid=dsid, created=self._created_date(number, dsid),
+                                     size=1024 + number % 4096)
+
+    def handle(self, path: str, query: dict):
+        match = self._datastreams_path.search(path)
+        if match is None:
+            return 404, 'Not found', 'text/plain'
+        pid, dsid = match.groups()
+        number = self._number(pid)
+        if number is None:
+            return 404, f'Object not found in low-level storage: {pid}', 'text/plain'
+        dsids = self._datastream_ids(number)
+        if dsid is not None:
+            if dsid not in dsids:
+                return 404, f'No datastream {dsid} for {pid}', 'text/plain'
+            return 200, (f'<?xml version="1.0" encoding="UTF-8"?><datastreamProfile xmlns="{APIM}" pid="{pid}" '
+                         f'dsID="{dsid}">{self._profile_fields(pid, number, dsid, "")}</datastreamProfile>'), 'text/xml'
+        if query.get('profiles') == ['true']:
+            entries = ''.join(f'<datastreamProfile pid="{pid}" dsID="{ds}">'
+                              f'{self._profile_fields(pid, number, ds, "apim:")}</datastreamProfile>' for ds in dsids)
+        else:
+            entries = ''.join(f'<datastream dsid="{ds}" label="{ds} Record" mimeType="text/plain"/>' for ds in dsids)
+        return 200, (f'<?xml version="1.0" encoding="UTF-8"?><objectDatastreams xmlns="{APIA}" xmlns:apim="{APIM}" '
+                     f'pid="{pid}">{entries}</objectDatastreams>'), 'text/xml'
+
+
+class Broker:
+    """ The queue a gatekeeper adds messages to and the derivative workers drain at drain_rate per second """
+
+    def __init__(self, queue_name: str = 'fedora', messages_per_pid: int = 1, drain_rate: float = None):
+        self.queue_name = queue_name
+        self.messages_per_pid = messages_per_pid
+        self.drain_rate = drain_rate
+        self.enqueued = 0
+        self.dequeued = 0
+        self._drained_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def enqueue(self):
+        with self._lock:
+            self._drain()
+            self.enqueued += self.messages_per_pid
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._drain()
+            return {'enqueueCount': self.enqueued, 'dequeueCount': self.dequeued,
+                    'size': self.enqueued - self.dequeued, 'consumerCount': 1}
+
+    def _drain(self):
+        now = time.monotonic()
+        if self.drain_rate is None:
+            self.dequeued = self.enqueued
+        else:
+            drained = int((now - self._drained_at) * self.drain_rate)
+            if drained == 0:
+                return
+            self.dequeued = min(self.enqueued, self.dequeued + drained)
+        self._drained_at = now
+
+
+class ActiveMQStandIn(StandInServer):
+    """ Serves the broker's queue statistics from /admin/xml/queues.jsp """
+
+    def __init__(self, broker: Broker, latency: float = 0.0):
+        super().__init__(latency)
+        self.broker = broker
+
+    def handle(self, path: str, query: dict):
+        if not path.endswith('/admin/xml/queues.jsp'):
+            return 404, 'Not found', 'text/plain'
+        stats = ' '.join(f'{name}="{value}"' for name, value in self.broker.stats().items())
+        return 200, (f'<queues><queue name="{self.broker.queue_name}"><stats {stats}/></queue></queues>'), 'text/xml'
+
+
+class _StompServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StompStandIn:
+    """
+    Answers the statisticsBrokerPlugin's STOMP requests for the broker's queue, replying to the request's reply-to
+    destination with the statistics as a jms-map-xml message
+    """
+
+    def __init__(self, broker: Broker, latency: float = 0.0):
+        self.broker = broker
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._connections = set()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'stomp://{host}:{port}'
+
+    def start(self, address: str = '127.0.0.1', port: int = 0):
+        stand_in = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def setup(self):
+                with stand_in._lock:
+                    stand_in._connections.add(self.request)
+
+            def finish(self):
+                with stand_in._lock:
+                    stand_in._connections.discard(self.request)
+
+            def handle(self):
+                buffer = bytearray()
+                subscriptions = {}
+                while True:
+                    frame = decode_frame(buffer)
+                    if frame is None:
+                        data = self.request.recv(65536)
+                        if not data:
+                            return
+                        buffer.extend(data)
+                        continue
+                    command, headers, body = frame
+                    if command in ('CONNECT', 'STOMP'):
+                        self.request.sendall(encode_frame('CONNECTED', {'version': '1.2'}))
+                    elif command == 'SUBSCRIBE':
+                        subscriptions[headers['destination']] = headers['id']
+                    elif command == 'SEND':
+                        reply = stand_in.reply(headers, subscriptions)
+                        if reply is not None:
+                            self.request.sendall(reply)
+                    elif command == 'DISCONNECT':
+                        return
+
+        self._server = _StompServer((address, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def reply(self, headers: dict, subscriptions: dict):
+        """
+        Build the reply to a SEND frame
+        :param headers: The frame's headers
+        :param subscriptions: The connection's subscription ids by destination
+        :return: The MESSAGE frame, or None if nothing is subscribed to the reply-to destination
+        """
+        if headers.get('destination') != f'/queue/{STATISTICS_PREFIX}{self.broker.queue_name}':
+            return None
+        reply_to = headers.get('reply-to')
+        if reply_to not in subscriptions:
+            return None
+        with self._lock:
+            self.requests += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        stats = {'destinationName': f'queue://{self.broker.queue_name}', **self.broker.stats()}
+        entries = ''
+        for name, value in stats.items():
+            kind = 'string' if isinstance(value, str) else 'long'
+            entries += f'<entry><string>{name}</string><{kind}>{value}</{kind}></entry>'
+        return encode_frame('MESSAGE', {'subscription': subscriptions[reply_to], 'destination': reply_to,
+                                        'message-id': f'stats-{self.requests}', 'transformation': 'jms-map-xml'},
+                            f'<map>{entries}</map>'.encode('utf-8'))
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            # Unlike HTTP, the connections are long lived and would keep being served
+            with self._lock:
+                for connection in self._connections:
+                    connection.shutdown(socket.SHUT_RDWR)
+
+
+class GatekeeperStandIn(StandInServer):
+    """ Accepts a regeneration request for any pid, adding its messages to the broker """
+
+    def __init__(self, broker: Broker, latency: float = 0.0):
+        super().__init__(latency)
+        self.broker = broker
+
+    def handle(self, path: str, query: dict):
+        self.broker.enqueue()
+        return 200, 'OK', 'text/plain'
@@ -0,0 +1,56 @@
+from base64 import b64encode
+
+import aiohttp
+
+from .cache import ProfileCache
+from .client import FedoraClient, FETCH_SECONDS
+
+
+class AsyncFedoraClient(FedoraClient):
+    """ A FedoraClient whose requests are made with aiohttp, so many can be in flight on a single thread. """
+
+    def __init__(self, url, username=None, password=None, session: aiohttp.ClientSession = None,
+                 cache: ProfileCache = None):
+        super().__init__(url, username, password, session, cache)
+        self.headers = {}
+        if username is not None:
+            credentials = b64encode(f'{username}:{password or ""}'.encode()).decode()
+            self.headers['Authorization'] = f'Basic {credentials}'
+
+    async def list_datastreams(self, pid, profiles=False):
+        """
+        List the datastreams for a given pid
+        :param pid: The pid of the object
+        :param profiles: Whether to return the datastream profiles
+        :return: A list of datastream objects
+        """
+        with FETCH_SECONDS.labels(request='listing').time():
+            async with self.session.get(self._datastreams_url(pid, profiles), headers=self.headers) as response:
+                if self._is_error(response.status):
+                    response.raise_for_status()
+                content = await response.read() if response.status == 200 else None
+        if content is not None:
+            return self._parse_datastreams(content, profiles)
+        return []
+
+    async def get_datastream_profile(self, pid, dsid, trust_cached_from=None):
+        """
+        Get the profile of a single datastream
+        :param pid: The pid of the object
+        :param dsid: The id of the datastream
+        :param trust_cached_from: With a cache, a cached profile created at or after this date is returned without
+        asking Fedora
+        :return: A datastream object or None if the object or datastream does not exist
+        :raises aiohttp.ClientResponseError: If Fedora responds with any other error
+        """
+        cached = self._get_cached_profile(pid, dsid, trust_cached_from)
+        if cached is not None and self._is_trusted(cached, trust_cached_from):
+            return cached.datastream
+        headers = {**self.headers, **self._conditional(cached).get('headers', {})}
+        with FETCH_SECONDS.labels(request='profile').time():
+            async with self.session.get(self._datastream_profile_url(pid, dsid), headers=headers) as response:
+                if self._is_error(response.status):
+                    response.raise_for_status()
+                content = await response.read() if response.status == 200 else None
+        return self._handle_profile(pid, dsid, cached, response.status, content,
+                                    response.headers if self.cache is not None else None)
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from typing import Optional
+
+CachedProfile = namedtuple('CachedProfile', ['datastream', 'validator'])
+CachedProfile.__doc__ = """
+A cached datastream profile
+:param datastream: The Datastream, or None if the object did not have it
+:param validator: The HTTP date to send as If-Modified-Since when revalidating
+"""
+
+
+class ProfileCache:
+    """
+    A SQLite cache of datastream profiles keyed by pid and datastream id. Once it holds more than max_entries the
+    least recently used are evicted. Writes, including the last use of each entry, are buffered and written
+    batch_size at a time.
+    """
+
+    _columns = ('pid', 'dsid', 'found', 'label', 'version', 'state', 'mimetype', 'size', 'control_group', 'location',
+                'created', 'validator', 'used')
+
+    def __init__(self, path: str, max_entries: int = 1000000, batch_size: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS profiles (pid TEXT NOT NULL, dsid TEXT NOT NULL, found INTEGER NOT NULL, '
+            'label TEXT, version INTEGER, state TEXT, mimetype TEXT, size INTEGER, control_group TEXT, location TEXT, '
+            'created TEXT, validator TEXT, used REAL NOT NULL, PRIMARY KEY (pid, dsid))'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS profiles_used ON profiles (used)')
+        self._connection.commit()
+
+    def get(self, pid: str, dsid: str) -> Optional[CachedProfile]:
+        """
+        Get a cached profile, marking it as recently used
+        :param pid: The pid of the object
+        :param dsid: The id of the datastream
+        :return: The cached profile or None if it is not cached
+        """
+        with self._lock:
+            row = self._pending.get((pid, dsid))
+            if row is None:
+                row = self._connection.execute(
+                    f'SELECT {", ".join(self._columns)} FROM profiles WHERE pid = ? AND dsid = ?', (pid, dsid)
+                ).fetchone()
+                if row is None:
+                    return None
+            self._buffer(row[:-1] + (time.time(),))
+        return self._to_profile(row)
+
+    def put(self, pid: str, dsid: str, datastream, validator: str):
+        """
+        Cache a profile, replacing any earlier one
+        :param pid: The pid of the object
+        :param dsid: The id of the datastream
+        :param datastream: The Datastream or None if the object does not have it
+        :param validator: The HTTP date to revalidate the profile with
+        """
+        if datastream is None:
+            row = (pid, dsid, 0) + (None,) * 8 + (validator, time.time())
+        else:
+            row = (pid, dsid, 1, datastream.label, datastream.version, datastream.state, datastream.mimetype,
+                   datastream.size, datastream.control_group, datastream.location,
+                   datastream.created_date.isoformat(), validator, time.time())
+        with self._lock:
+            self._buffer(row)
+
+    def _buffer(self, row):
+        self._pending[row[:2]] = row
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+
+    @staticmethod
+    def _to_profile(row) -> CachedProfile:
+        # Imported here as the client module imports this one
+        from .client import Datastream
+        pid, dsid, found, label, version, state, mimetype, size, control_group, location, created = row[:11]
+        if not found:
+            return CachedProfile(None, row[11])
+        return CachedProfile(
+            Datastream(dsid, label, version, state, mimetype, size, control_group, location, created), row[11]
+        )
+
+    def __len__(self):
+        self.flush()
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM profiles').fetchone()[0]
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        self._connection.executemany(
+            f'INSERT OR REPLACE INTO profiles ({", ".join(self._columns)}) '
+            f'VALUES ({", ".join("?" * len(self._columns))})',
+            list(self._pending.values())
+        )
+        self._pending = {}
+        excess = self._connection.execute('SELECT COUNT(*) FROM profiles').fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._connection.execute(
+                'DELETE FROM profiles WHERE rowid IN (SELECT rowid FROM profiles ORDER BY used LIMIT ?)', (excess,)
+            )
+        self._connection.commit()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
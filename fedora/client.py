@@ -1,9 +1,25 @@
+import csv
+import time
 from datetime import datetime, timezone
+from email.utils import format_datetime
+from io import BytesIO, StringIO
+from typing import Optional
 from urllib.parse import urlparse
 
 import requests
 import lxml.etree as ET
 
+from metrics import REGISTRY
+from transport import create_session
+from .cache import ProfileCache
+
+FETCH_SECONDS = REGISTRY.histogram('ocr_regen_fedora_fetch_seconds', 'Time spent waiting on Fedora requests',
+                                   ('request',))
+PARSE_SECONDS = REGISTRY.histogram('ocr_regen_xml_parse_seconds', 'Time spent parsing Fedora XML responses',
+                                   ('document',))
+PROFILE_CACHE = REGISTRY.counter('ocr_regen_profile_cache_total', 'Datastream profile lookups by cache result',
+                                 ('result',))
+
 class FedoraClient(object):
     url = None
     username = None
@@ -11,14 +27,54 @@ class FedoraClient(object):
 
     namespaces = {
         'apim': 'http://www.fedora.info/definitions/1/0/management/',
-        'apia': 'http://www.fedora.info/definitions/1/0/access/'
+        'apia': 'http://www.fedora.info/definitions/1/0/access/',
+        'types': 'http://www.fedora.info/definitions/1/0/types/'
+    }
+
+    _profile_tag = '{' + namespaces['apia'] + '}datastreamProfile'
+    _datastream_tag = '{' + namespaces['apia'] + '}datastream'
+
+    # Compiled once, each reads the text of a direct child of a datastreamProfile element as a plain str
+    _profile_fields = {
+        'label': ET.XPath('string(apim:dsLabel)', namespaces=namespaces, smart_strings=False),
+        'version': ET.XPath('string(apim:dsVersionID)', namespaces=namespaces, smart_strings=False),
+        'state': ET.XPath('string(apim:dsState)', namespaces=namespaces, smart_strings=False),
+        'mimetype': ET.XPath('string(apim:dsMIME)', namespaces=namespaces, smart_strings=False),
+        'size': ET.XPath('string(apim:dsSize)', namespaces=namespaces, smart_strings=False),
+        'control_group': ET.XPath('string(apim:dsControlGroup)', namespaces=namespaces, smart_strings=False),
+        'location': ET.XPath('string(apim:dsLocation)', namespaces=namespaces, smart_strings=False),
+        'created_date': ET.XPath('string(apim:dsCreateDate)', namespaces=namespaces, smart_strings=False),
     }
 
-    def __init__(self, url, username=None, password=None):
+    _found_pids = ET.XPath('types:resultList/types:objectFields/types:pid/text()', namespaces=namespaces,
+                           smart_strings=False)
+    _session_token = ET.XPath('string(types:listSession/types:token)', namespaces=namespaces, smart_strings=False)
+
+    _stale_datastreams_query = (
+        'SELECT ?object ?modified FROM <#ri> WHERE {{ '
+        '?object <info:fedora/fedora-system:def/view#disseminates> ?datastream . '
+        '?datastream <info:fedora/fedora-system:def/view#disseminationType> <info:fedora/*/{dsid}> . '
+        '?datastream <info:fedora/fedora-system:def/view#lastModifiedDate> ?modified . '
+        'FILTER(?modified < "{before}"^^<http://www.w3.org/2001/XMLSchema#dateTime>) '
+        '{after}}} ORDER BY ?object'
+    )
+
+    # Book and newspaper pages are members of their parent, older content models only record isPageOf
+    _members_query = (
+        'SELECT DISTINCT ?object FROM <#ri> WHERE {{ '
+        '{{ ?object <info:fedora/fedora-system:def/relations-external#isMemberOf> <info:fedora/{pid}> }} UNION '
+        '{{ ?object <http://islandora.ca/ontology/relsext#isPageOf> <info:fedora/{pid}> }} '
+        '{after}}} ORDER BY ?object'
+    )
+
+    def __init__(self, url, username=None, password=None, session: requests.Session = None,
+                 cache: ProfileCache = None):
         parsed_url = urlparse(url)
         self.url = url.rstrip('/')
         self.username = username
         self.password = password
+        self.session = session if session is not None else create_session()
+        self.cache = cache
 
     def _resolve_pid(self, pid):
         return self.url + '/objects/' + pid
@@ -26,6 +82,93 @@ class FedoraClient(object):
     def _resolve_datastream(self, pid, dsid):
         return self._resolve_pid(pid) + '/datastreams/' + dsid
 
+    def _datastream_profile_url(self, pid, dsid):
+        return self._resolve_datastream(pid, dsid) + '?format=xml'
+
+    def get_datastream_profile(self, pid, dsid, trust_cached_from: datetime = None):
+        """
+        Get the profile of a single datastream
+        :param pid: The pid of the object
+        :param dsid: The id of the datastream
+        :param trust_cached_from: With a cache, a cached profile created at or after this date is returned without
+        asking Fedora. A datastream's created date only moves forward, so it is still at least this new.
+        :return: A datastream object or None if the object or datastream does not exist
+        :raises requests.HTTPError: If Fedora responds with any other error
+        """
+        cached = self._get_cached_profile(pid, dsid, trust_cached_from)
+        if cached is not None and self._is_trusted(cached, trust_cached_from):
+            return cached.datastream
+        with FETCH_SECONDS.labels(request='profile').time():
+            response = self.session.get(self._datastream_profile_url(pid, dsid), auth=(self.username, self.password),
+                                        **self._conditional(cached))
+        if self._is_error(response.status_code):
+            response.raise_for_status()
+        return self._handle_profile(pid, dsid, cached, response.status_code, response.content,
+                                    response.headers if self.cache is not None else None)
+
+    def _get_cached_profile(self, pid, dsid, trust_cached_from: datetime = None):
+        if self.cache is None:
+            return None
+        cached = self.cache.get(pid, dsid)
+        if cached is None:
+            PROFILE_CACHE.labels(result='miss').inc()
+        elif self._is_trusted(cached, trust_cached_from):
+            PROFILE_CACHE.labels(result='trusted').inc()
+        return cached
+
+    @staticmethod
+    def _is_trusted(cached, trust_cached_from: datetime = None) -> bool:
+        return (trust_cached_from is not None and cached.datastream is not None
+                and cached.datastream.created_date >= trust_cached_from)
+
+    @staticmethod
+    def _is_error(status: int) -> bool:
+        """ Whether a response failed, a 404 only means the object or datastream does not exist """
+        return status >= 400 and status != 404
+
+    @staticmethod
+    def _conditional(cached) -> dict:
+        """ The arguments to revalidate a cached profile with, if there is one """
+        if cached is None or cached.validator is None:
+            return {}
+        return {'headers': {'If-Modified-Since': cached.validator}}
+
+    def _handle_profile(self, pid, dsid, cached, status: int, content: bytes, headers=None):
+        """
+        Read a datastream profile response, caching the result
+        :param pid: The pid of the object
+        :param dsid: The id of the datastream
+        :param cached: The profile that was revalidated, if any
+        :param status: The response status
+        :param content: The response body
+        :param headers: The response headers, only needed with a cache
+        :return: A datastream object or None if the object or datastream does not exist
+        """
+        if status == 304 and cached is not None:
+            PROFILE_CACHE.labels(result='revalidated').inc()
+            return cached.datastream
+        datastream = None
+        if status == 200:
+            with PARSE_SECONDS.labels(document='profile').time():
+                datastream = self._parse_profile(ET.fromstring(content))
+        if self.cache is not None and status in (200, 404):
+            if cached is not None:
+                PROFILE_CACHE.labels(result='refreshed').inc()
+            # Without a Last-Modified header the profile is unchanged until a newer version is created
+            if datastream is not None:
+                modified = datastream.created_date.replace(tzinfo=timezone.utc)
+            else:
+                modified = datetime.now(tz=timezone.utc)
+            validator = headers.get('Last-Modified') or format_datetime(modified, usegmt=True)
+            self.cache.put(pid, dsid, datastream, validator)
+        return datastream
+
+    def _datastreams_url(self, pid, profiles=False):
+        url = self._resolve_pid(pid) + '/datastreams?format=xml'
+        if profiles:
+            url += '&profiles=true'
+        return url
+
     def list_datastreams(self, pid, profiles=False):
         """
         List the datastreams for a given pid
@@ -33,37 +176,183 @@ class FedoraClient(object):
         :param profiles: Whether to return the datastream profiles
         :return: A list of datastream objects
         """
-        url = self._resolve_pid(pid) + '/datastreams?format=xml'
-        if profiles:
-            url += '&profiles=true'
-        response = requests.get(url, auth=(self.username, self.password))
-        datastreams = []
+        return list(self.iter_datastreams(pid, profiles))
+
+    def iter_datastreams(self, pid, profiles=False, dsid=None):
+        """
+        Lazily parse the datastreams for a given pid, stopping as soon as the caller does
+        :param pid: The pid of the object
+        :param profiles: Whether to return the datastream profiles
+        :param dsid: Only return the datastream with this id, parsing stops once it is found
+        :return: An iterator of datastream objects
+        """
+        url = self._datastreams_url(pid, profiles)
+        with FETCH_SECONDS.labels(request='listing').time():
+            response = self.session.get(url, auth=(self.username, self.password))
+        if self._is_error(response.status_code):
+            response.raise_for_status()
         if response.status_code == 200:
-            root = ET.fromstring(response.content)
-            if profiles:
-                data = root.findall('.//apia:datastreamProfile', self.namespaces)
-                for ds in data:
-                    dsid = ds.attrib.get('dsID')
-                    label = ds.find('.//apim:dsLabel', self.namespaces).text
-                    version = int(ds.find('.//apim:dsVersionID', self.namespaces).text.replace(dsid + '.', ''))
-                    state = ds.find('.//apim:dsState', self.namespaces).text
-                    mimetype = ds.find('.//apim:dsMIME', self.namespaces).text
-                    size = int(ds.find('.//apim:dsSize', self.namespaces).text)
-                    control_group = ds.find('.//apim:dsControlGroup', self.namespaces).text
-                    location = ds.find('.//apim:dsLocation', self.namespaces).text
-                    created_date = ds.find('.//apim:dsCreateDate', self.namespaces).text
-                    datastreams.append(Datastream.create_from_profile(dsid, label, version, state, mimetype, size, control_group, location, created_date))
-            else:
-                data = root.findall('.//apia:datastream', self.namespaces)
-                for ds in data:
-                    dsid = ds.attrib.get('dsid')
-                    label = ds.attrib.get('label')
-                    mimetype = ds.attrib.get('mimeType')
-                    datastreams.append(Datastream.create_from_list(dsid, label, mimetype))
+            yield from self._timed(self._iter_parse_datastreams(response.content, profiles, dsid))
 
-        return datastreams
+    def find_datastream(self, pid, dsid, profiles=True):
+        """
+        Find a single datastream in an object's datastream listing
+        :param pid: The pid of the object
+        :param dsid: The id of the datastream
+        :param profiles: Whether to return the datastream profile
+        :return: The datastream object or None if the object does not have it
+        """
+        return next(self.iter_datastreams(pid, profiles, dsid), None)
+
+    def _parse_datastreams(self, content: bytes, profiles: bool):
+        """
+        Parse a datastream listing into Datastream objects
+        :param content: The body of a datastream listing response
+        :param profiles: Whether the listing includes the datastream profiles
+        :return: A list of datastream objects
+        """
+        with PARSE_SECONDS.labels(document='listing').time():
+            return list(self._iter_parse_datastreams(content, profiles))
+
+    @staticmethod
+    def _timed(datastreams):
+        """ Observe the time spent producing each datastream of a lazy parse, excluding the caller's time """
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    datastream = next(datastreams)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield datastream
+        finally:
+            PARSE_SECONDS.labels(document='listing').observe(elapsed)
+
+    def _iter_parse_datastreams(self, content: bytes, profiles: bool, dsid: str = None):
+        """
+        Incrementally parse a datastream listing, freeing each element once it has been read
+        :param content: The body of a datastream listing response
+        :param profiles: Whether the listing includes the datastream profiles
+        :param dsid: Only yield the datastream with this id and stop once it is found
+        :return: An iterator of datastream objects
+        """
+        if profiles:
+            tag, id_attribute = self._profile_tag, 'dsID'
+        else:
+            tag, id_attribute = self._datastream_tag, 'dsid'
+        for _, ds in ET.iterparse(BytesIO(content), events=('end',), tag=tag):
+            if dsid is None or ds.attrib.get(id_attribute) == dsid:
+                if profiles:
+                    yield self._parse_profile(ds)
+                else:
+                    yield Datastream.create_from_list(ds.attrib.get('dsid'), ds.attrib.get('label'),
+                                                      ds.attrib.get('mimeType'))
+                if dsid is not None:
+                    return
+            ds.clear(keep_tail=True)
+            while ds.getprevious() is not None:
+                del ds.getparent()[0]
+
+    def _parse_profile(self, ds):
+        """
+        Parse a datastreamProfile element into a Datastream
+        :param ds: The datastreamProfile element
+        :return: The datastream object
+        """
+        fields = self._profile_fields
+        dsid = ds.attrib.get('dsID')
+        return Datastream.create_from_profile(
+            dsid,
+            fields['label'](ds),
+            int(fields['version'](ds).replace(dsid + '.', '')),
+            fields['state'](ds),
+            fields['mimetype'](ds),
+            int(fields['size'](ds)),
+            fields['control_group'](ds),
+            fields['location'](ds),
+            fields['created_date'](ds)
+        )
+
+    def find_stale_datastreams(self, dsid, before: datetime, page_size=10000):
+        """
+        Find objects whose datastream was last changed before a date with paged Resource Index queries
+        :param dsid: The id of the datastream
+        :param before: Objects whose datastream is older than this are returned
+        :param page_size: The number of results to request per query
+        :return: An iterator of pids, each page is only requested once the previous one has been consumed
+        """
+        # The Resource Index records the date of the latest version, which is the dsCreateDate of the profile.
+        before = before.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+        yield from self._risearch_pids(self._stale_datastreams_query, page_size, dsid=dsid, before=before)
+
+    def find_members(self, pid, page_size=10000):
+        """
+        Find the children of a compound object, like the pages of a book or newspaper issue, with a Resource Index query
+        :param pid: The pid of the parent
+        :param page_size: The number of results to request per query, a parent with fewer children takes one query
+        :return: An iterator of pids, each page is only requested once the previous one has been consumed
+        """
+        yield from self._risearch_pids(self._members_query, page_size, pid=pid)
+
+    def find_objects(self, query, page_size=1000):
+        """
+        Find objects with the findObjects API, following its session token from page to page
+        :param query: The findObjects conditions, like 'pid~uofm:* mDate<2020-01-01'
+        :param page_size: The number of results to request per page
+        :return: An iterator of pids, each page is only requested once the previous one has been consumed
+        """
+        params = {'query': query, 'pid': 'true', 'resultFormat': 'xml', 'maxResults': page_size}
+        while True:
+            with FETCH_SECONDS.labels(request='find_objects').time():
+                response = self.session.get(self.url + '/objects', params=params, auth=(self.username, self.password))
+            response.raise_for_status()
+            with PARSE_SECONDS.labels(document='find_objects').time():
+                result = ET.fromstring(response.content)
+                pids = self._found_pids(result)
+                token = self._session_token(result)
+            yield from pids
+            if not token:
+                return
+            params = {**params, 'sessionToken': token}
+
+    def _risearch_pids(self, query, page_size, **params):
+        """
+        Page through the results of a SPARQL query whose first column is an object, ordered by that object. Each page
+        starts after the last object of the one before rather than at an offset, so objects that stop matching while
+        earlier pages are processed, like regenerated datastreams, do not shift later pages past unseen results.
+        :param query: The query, without LIMIT, with an {after} placeholder at the end of its WHERE clause
+        :param page_size: The number of results to request per query
+        :param params: The values of the query's other placeholders
+        :return: An iterator of pids
+        """
+        after = ''
+        while True:
+            rows = self._risearch(f'{query.format(after=after, **params)} LIMIT {page_size}')
+            for row in rows:
+                yield row[0].replace('info:fedora/', '', 1)
+            if len(rows) < page_size:
+                return
+            after = f'FILTER(STR(?object) > "{rows[-1][0]}") '
+
+    def _risearch(self, query):
+        """
+        Run a SPARQL tuple query against the Resource Index
+        :param query: The query
+        :return: A list of result rows, without the header
+        """
+        params = {'type': 'tuples', 'lang': 'sparql', 'format': 'CSV', 'query': query}
+        with FETCH_SECONDS.labels(request='risearch').time():
+            response = self.session.get(self.url + '/risearch', params=params, auth=(self.username, self.password))
+        response.raise_for_status()
+        rows = list(csv.reader(StringIO(response.content.decode('utf-8'))))
+        return [row for row in rows[1:] if row]
 
 class Object:
+    __slots__ = ('pid', 'datastreams')
+
     def __init__(self, pid: str):
         self.pid = pid
         self.datastreams = {}
@@ -79,6 +368,9 @@ class Object:
         return self.datastreams.get(dsid)
 
 class Datastream:
+    __slots__ = ('dsid', 'label', 'version', 'state', 'mimetype', 'size', 'control_group', 'location',
+                 '_created_date_text', '_created_date')
+
     def __init__(
             self,
             dsid: str,
@@ -89,7 +381,7 @@ class Datastream:
             size: int,
             control_group: str,
             location: str,
-            created_date: str
+            created_date: Optional[str]
     ):
         self.dsid = dsid
         self.label = label
@@ -99,7 +391,9 @@ class Datastream:
         self.size = int(size)
         self.control_group = control_group
         self.location = location
-        self.created_date = datetime.strptime(created_date, '%Y-%m-%dT%H:%M:%S.%fZ')
+        # Parsed on first use, most datastreams are never asked for their date
+        self._created_date_text = created_date
+        self._created_date = None
 
     @staticmethod
     def create_from_profile(
@@ -121,10 +415,32 @@ class Datastream:
             label: str,
             mimetype: str,
     ):
-        return Datastream(dsid, label, -9, '', mimetype, -9 , '', '', datetime.now(tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'))
+        # A listing has no created date, the current time is used when one is asked for
+        return Datastream(dsid, label, -9, '', mimetype, -9 , '', '', None)
 
     def __str__(self):
         return f"Datastream: {self.dsid} - {self.mimetype} - {self.size} bytes"
 
+    @property
+    def created_date(self) -> datetime:
+        if self._created_date is None:
+            self._created_date = self._parse_date(self._created_date_text)
+        return self._created_date
+
     def get_created_date(self):
         return self.created_date
+
+    @staticmethod
+    def _parse_date(text: Optional[str]) -> datetime:
+        """
+        Parse a Fedora date like 2014-10-10T01:11:02.792Z into a naive UTC datetime
+        :param text: The date, or None for the current time
+        :return: The datetime
+        """
+        if text is None:
+            return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        try:
+            # Much faster than strptime, but only accepts 3 or 6 digits of fractional seconds before Python 3.11
+            return datetime.fromisoformat(text[:-1] if text.endswith('Z') else text)
+        except ValueError:
+            return datetime.strptime(text, '%Y-%m-%dT%H:%M:%S.%fZ')
@@ -1,12 +1,13 @@
 import xml.etree.ElementTree as ET
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
 from .connector import Connector
 
 
 class ActiveMQClient:
-    def __init__(self, url: str, username: str, password: str, retries: int = 3, backoff_factor: float = 0.3):
-        self._connector = Connector(url, username, password, retries, backoff_factor)
+    def __init__(self, url: str, username: str, password: str, retries: int = 3, backoff_factor: float = 0.3,
+                 transport: Optional[dict] = None):
+        self._connector = Connector(url, username, password, retries, backoff_factor, transport)
 
     def get_connection_details(self, client_id: str) -> Union[dict, None]:
         connections = self.get_connections_details()
@@ -55,6 +56,25 @@ class ActiveMQClient:
             queues.append(details)
         return queues
 
+    def get_queues_snapshot(self) -> Dict[str, dict]:
+        """ Get the details of every queue from a single request, keyed by queue name """
+        return {queue['name']: queue for queue in self.get_queues_details()}
+
+    def consume_message(self, queue_name: str, timeout: float = 5) -> Union[str, None]:
+        """
+        Take one message from a queue with the REST API, waiting up to timeout seconds for one to arrive
+        :param queue_name: The queue
+        :param timeout: Seconds to wait for a message
+        :return: The message body or None if no message arrived
+        """
+        endpoint = f"/api/message/{queue_name}"
+        params = {'type': 'queue', 'oneShot': 'true', 'readTimeout': int(timeout * 1000)}
+        response = self._connector.send_request("GET", endpoint, params=params)
+        if response.status_code == 204 or not response.content:
+            return None
+        response.raise_for_status()
+        return response.content.decode('utf-8')
+
     def get_queue_details(self, queue_name: str) -> Union[dict, None]:
         endpoint = f"/admin/xml/queues.jsp?queueName={queue_name}"
         response = self._connector.send_request("GET", endpoint)
@@ -1,30 +1,25 @@
 import requests
 from requests.auth import HTTPBasicAuth
-from requests.adapters import HTTPAdapter
-from requests.adapters import Retry
 from typing import Optional
 
+from transport import create_session
+
 
 class Connector:
-    def __init__(self, url: str, username: str, password: str, retries: int = 3, backoff_factor: float = 0.3):
+    def __init__(self, url: str, username: str, password: str, retries: int = 3, backoff_factor: float = 0.3,
+                 transport: Optional[dict] = None):
         self._url = url
-        self._session = requests.Session()
+        # Configure pooling, timeouts and retries
+        transport_config = {'retries': retries, 'backoff_factor': backoff_factor}
+        transport_config.update(transport or {})
+        self._session = create_session(transport_config)
         self._session.auth = HTTPBasicAuth(username, password)
         self._session.headers.update({"Content-Type": "text/plain"})
 
-        # Configure retries
-        retry = Retry(
-            total=retries,
-            backoff_factor=backoff_factor,
-            status_forcelist=[500, 502, 503, 504],
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        self._session.mount("http://", adapter)
-        self._session.mount("https://", adapter)
-
-    def send_request(self, method: str, endpoint: str, data: Optional[str] = None, params: Optional[dict] = None) -> requests.Response:
+    def send_request(self, method: str, endpoint: str, data: Optional[str] = None, params: Optional[dict] = None,
+                     headers: Optional[dict] = None) -> requests.Response:
         url = f"{self._url}{endpoint}"
-        response = self._session.request(method, url, data=data, params=params)
+        response = self._session.request(method, url, data=data, params=params, headers=headers)
         return response
 
     def close(self):
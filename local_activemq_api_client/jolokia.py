@@ -0,0 +1,141 @@
+import json
+from typing import List, Optional, Union
+
+from .client import ActiveMQClient
+
+
+class JolokiaActiveMQClient(ActiveMQClient):
+    """
+    An ActiveMQClient that reads broker statistics through the Jolokia REST API instead of the admin XML pages.
+    Only the named destinations are read, so requests stay small however many destinations the broker has.
+    """
+
+    endpoint = "/api/jolokia"
+
+    queue_attributes = ['Name', 'QueueSize', 'EnqueueCount', 'DequeueCount', 'ConsumerCount']
+    topic_attributes = ['Name', 'EnqueueCount', 'ConsumerCount']
+
+    def __init__(self, url: str, username: str, password: str, retries: int = 3, backoff_factor: float = 0.3,
+                 transport: Optional[dict] = None, broker_name: str = 'localhost', queue_names: List[str] = None):
+        """
+        :param broker_name: The brokerName of the broker's MBeans
+        :param queue_names: Limit get_queues_details to these queues, all queues are read if not set
+        """
+        self._url = url.rstrip('/')
+        super().__init__(self._url, username, password, retries, backoff_factor, transport)
+        self.broker_name = broker_name
+        self.queue_names = queue_names
+
+    def _mbean(self, **properties) -> str:
+        return ','.join(
+            ['org.apache.activemq:type=Broker', f'brokerName={self.broker_name}'] +
+            [f'{key}={value}' for key, value in properties.items()]
+        )
+
+    def _read(self, reads: List[dict]) -> List[dict]:
+        """
+        Send a bulk read request
+        :param reads: The Jolokia read requests
+        :return: The value of each request, None where the MBean does not exist
+        """
+        response = self._connector.send_request(
+            "POST", self.endpoint, data=json.dumps(reads),
+            headers={"Content-Type": "application/json", "Origin": self._url}
+        )
+        response.raise_for_status()
+        return [result.get('value') if result.get('status') == 200 else None for result in response.json()]
+
+    def _read_destinations(self, destination_type: str, names: Optional[List[str]],
+                           attributes: List[str]) -> List[dict]:
+        """
+        Read the attributes of the named destinations, or every destination of the type if names is None
+        """
+        if names is None:
+            request = {'type': 'read', 'attribute': attributes,
+                       'mbean': self._mbean(destinationType=destination_type, destinationName='*')}
+            values = self._read([request])[0] or {}
+            return list(values.values())
+        reads = [
+            {'type': 'read', 'attribute': attributes,
+             'mbean': self._mbean(destinationType=destination_type, destinationName=name)}
+            for name in names
+        ]
+        return [value for value in self._read(reads) if value is not None]
+
+    @staticmethod
+    def _queue_details(value: dict) -> dict:
+        return {
+            'name': value['Name'],
+            'consumerCount': int(value['ConsumerCount']),
+            'enqueueCount': int(value['EnqueueCount']),
+            'dequeueCount': int(value['DequeueCount']),
+            'size': int(value['QueueSize'])
+        }
+
+    @staticmethod
+    def _topic_details(value: dict) -> dict:
+        return {
+            'name': value['Name'],
+            'consumerCount': int(value['ConsumerCount']),
+            'enqueueCount': int(value['EnqueueCount']),
+        }
+
+    def get_broker_details(self) -> Union[dict, None]:
+        value = self._read([{'type': 'read', 'mbean': self._mbean(), 'attribute': ['BrokerName']}])[0]
+        if value:
+            return {'name': value['BrokerName']}
+        return None
+
+    def get_queues_details(self) -> List[dict]:
+        values = self._read_destinations('Queue', self.queue_names, self.queue_attributes)
+        return [self._queue_details(value) for value in values]
+
+    def get_queue_details(self, queue_name: str) -> Union[dict, None]:
+        values = self._read_destinations('Queue', [queue_name], self.queue_attributes)
+        return self._queue_details(values[0]) if values else None
+
+    def get_queue_consumer_count(self, queue_name: str) -> Union[int, None]:
+        details = self.get_queue_details(queue_name)
+        return details['consumerCount'] if details is not None else None
+
+    def get_queue_enqueue_count(self, queue_name: str) -> Union[int, None]:
+        details = self.get_queue_details(queue_name)
+        return details['enqueueCount'] if details is not None else None
+
+    def get_queue_dequeue_count(self, queue_name: str) -> Union[int, None]:
+        details = self.get_queue_details(queue_name)
+        return details['dequeueCount'] if details is not None else None
+
+    def get_queue_size(self, queue_name: str) -> Union[int, None]:
+        details = self.get_queue_details(queue_name)
+        return details['size'] if details is not None else None
+
+    def get_connections_details(self) -> List[dict]:
+        request = {'type': 'read', 'attribute': ['ClientId', 'RemoteAddress'],
+                   'mbean': self._mbean(connector='clientConnectors', connectorName='*',
+                                        connectionViewType='clientId', connectionName='*')}
+        values = self._read([request])[0] or {}
+        return [{'clientId': value['ClientId'], 'remoteAddress': value['RemoteAddress']}
+                for value in values.values()]
+
+    def get_topics_details(self) -> List[dict]:
+        values = self._read_destinations('Topic', None, self.topic_attributes)
+        return [self._topic_details(value) for value in values]
+
+    def get_topic_details(self, topic_name: str) -> Union[dict, None]:
+        values = self._read_destinations('Topic', [topic_name], self.topic_attributes)
+        return self._topic_details(values[0]) if values else None
+
+    def get_subscribers_details(self) -> List[dict]:
+        request = {'type': 'read', 'attribute': ['ClientId', 'SubscriptionName', 'DestinationName'],
+                   'mbean': self._mbean(destinationType='Topic', destinationName='*', endpoint='Consumer',
+                                        clientId='*', consumerId='*')}
+        values = self._read([request])[0] or {}
+        return [
+            {
+                'clientId': value['ClientId'],
+                'subscriptionName': value['SubscriptionName'],
+                'destinationName': value['DestinationName'],
+            }
+            for value in values.values()
+        ]
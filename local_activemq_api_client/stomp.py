@@ -0,0 +1,253 @@
+import logging
+import socket
+import threading
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+STATISTICS_PREFIX = 'ActiveMQ.Statistics.Destination.'
+
+Frame = Tuple[str, Dict[str, str], bytes]
+
+
+def encode_frame(command: str, headers: Dict[str, str] = None, body: bytes = b'') -> bytes:
+    """ Encode a STOMP 1.2 frame """
+    lines = [command] + [f'{_escape(key)}:{_escape(str(value))}' for key, value in (headers or {}).items()]
+    if body:
+        lines.append(f'content-length:{len(body)}')
+    return ('\n'.join(lines) + '\n\n').encode('utf-8') + body + b'\x00'
+
+
+def decode_frame(buffer: bytearray) -> Optional[Frame]:
+    """
+    Take the first complete frame off a buffer
+    :param buffer: Bytes read from the connection, the frame is removed from it
+    :return: The command, headers and body, or None if the buffer does not hold a complete frame yet
+    """
+    # Heart beats are bare newlines between frames
+    while buffer[:1] in (b'\n', b'\r'):
+        del buffer[0]
+    header_end = buffer.find(b'\n\n')
+    if header_end < 0:
+        return None
+    lines = buffer[:header_end].decode('utf-8', 'replace').replace('\r\n', '\n').split('\n')
+    headers = {}
+    for line in lines[1:]:
+        key, _, value = line.partition(':')
+        # The first occurrence of a repeated header wins
+        headers.setdefault(_unescape(key), _unescape(value))
+    body_start = header_end + 2
+    length = headers.get('content-length', '')
+    # Without a usable content-length the body runs to the first NUL
+    if length.isdigit():
+        body_end = body_start + int(length)
+        if len(buffer) <= body_end:
+            return None
+    else:
+        body_end = buffer.find(b'\x00', body_start)
+        if body_end < 0:
+            return None
+    body = bytes(buffer[body_start:body_end])
+    del buffer[:body_end + 1]
+    return lines[0], headers, body
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace(':', '\\c').replace('\r', '\\r')
+
+
+def _unescape(value: str) -> str:
+    return value.replace('\\n', '\n').replace('\\c', ':').replace('\\r', '\r').replace('\\\\', '\\')
+
+
+def parse_statistics(body: bytes) -> dict:
+    """
+    Read a statisticsBrokerPlugin reply converted with the jms-map-xml transformation
+    :param body: The <map><entry><string>name</string><long>1</long></entry>...</map> message body
+    :return: The entries, with numbers converted
+    """
+    values = {}
+    for entry in ET.fromstring(body).findall('entry'):
+        children = list(entry)
+        if len(children) != 2:
+            continue
+        key, value = children
+        text = value.text or ''
+        if value.tag in ('long', 'int', 'short'):
+            values[key.text] = int(text)
+        elif value.tag in ('double', 'float'):
+            values[key.text] = float(text)
+        else:
+            values[key.text] = text
+    return values
+
+
+class StompActiveMQClient:
+    """
+    Keeps live statistics for a set of queues from ActiveMQ's statisticsBrokerPlugin over STOMP. A background thread
+    asks for each queue's statistics every interval seconds and another applies the replies as they arrive, so
+    reading the statistics never waits on the broker. The connection is re-established if it drops.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str, queue_names: List[str],
+                 interval: float = 1.0, max_age: float = None, connect_timeout: float = 10.0):
+        """
+        :param host: The broker host
+        :param port: The broker's STOMP port
+        :param username: The STOMP login
+        :param password: The STOMP passcode
+        :param queue_names: The queues to follow
+        :param interval: Seconds between statistics requests
+        :param max_age: Statistics older than this many seconds are an error, default 10 intervals
+        :param connect_timeout: Seconds to wait for the connection and the first statistics
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.queue_names = list(queue_names)
+        self.interval = interval
+        self.max_age = max_age if max_age is not None else interval * 10
+        self.connect_timeout = connect_timeout
+        self.reply_to = f'/temp-queue/ocr-regenerator-{uuid.uuid4().hex}'
+        self.logger = logging.getLogger(__name__)
+        self._statistics = {}
+        self._updated = None
+        self._changed = threading.Condition()
+        self._socket = None
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._connect()
+        for target, name in [(self._read_loop, 'stomp-reader'), (self._request_loop, 'stomp-requests')]:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+        sock.sendall(encode_frame('CONNECT', {'accept-version': '1.2', 'host': self.host, 'login': self.username,
+                                              'passcode': self.password, 'heart-beat': '0,0'}))
+        buffer = bytearray()
+        frame = None
+        while frame is None:
+            data = sock.recv(65536)
+            if not data:
+                raise ConnectionError('The broker closed the STOMP connection')
+            buffer.extend(data)
+            frame = decode_frame(buffer)
+        command, headers, body = frame
+        if command != 'CONNECTED':
+            sock.close()
+            raise ConnectionError(f'STOMP connection refused: {headers.get("message", body.decode("utf-8"))}')
+        # Map messages can't be read over STOMP without converting them
+        sock.sendall(encode_frame('SUBSCRIBE', {'id': '0', 'destination': self.reply_to, 'ack': 'auto',
+                                                'transformation': 'jms-map-xml'}))
+        sock.settimeout(None)
+        self._buffer = buffer
+        self._socket = sock
+        self._request_statistics()
+
+    def _request_statistics(self):
+        with self._send_lock:
+            for queue in self.queue_names:
+                self._socket.sendall(encode_frame('SEND', {'destination': f'/queue/{STATISTICS_PREFIX}{queue}',
+                                                           'reply-to': self.reply_to}))
+
+    def _request_loop(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self._request_statistics()
+            except OSError:
+                # The reader reconnects
+                pass
+
+    def _read_loop(self):
+        while not self._stopped.is_set():
+            try:
+                frame = decode_frame(self._buffer)
+                if frame is None:
+                    data = self._socket.recv(65536)
+                    if not data:
+                        raise ConnectionError('The broker closed the STOMP connection')
+                    self._buffer.extend(data)
+                    continue
+                self._handle(*frame)
+            except OSError as e:
+                if self._stopped.is_set():
+                    return
+                self.logger.warning(f'Lost STOMP connection to {self.host}:{self.port}: {e}')
+                self._reconnect()
+
+    def _reconnect(self):
+        delay = self.interval
+        while not self._stopped.wait(delay):
+            try:
+                self._socket.close()
+                self._connect()
+                return
+            except OSError as e:
+                self.logger.warning(f'Reconnecting to STOMP on {self.host}:{self.port} failed: {e}')
+                delay = min(delay * 2, 30)
+
+    def _handle(self, command: str, headers: Dict[str, str], body: bytes):
+        if command == 'ERROR':
+            self.logger.error(f'STOMP error: {headers.get("message", "")} {body.decode("utf-8", "replace")}')
+            return
+        if command != 'MESSAGE':
+            return
+        try:
+            values = parse_statistics(body)
+        except (ET.ParseError, ValueError) as e:
+            # Skip the message rather than losing the reader thread
+            self.logger.warning(f'Skipping unreadable STOMP statistics message: {e}')
+            return
+        name = values.get('destinationName', '').replace('queue://', '', 1)
+        if name not in self.queue_names:
+            return
+        with self._changed:
+            self._statistics[name] = {
+                'name': name,
+                'consumerCount': values.get('consumerCount', 0),
+                'enqueueCount': values.get('enqueueCount', 0),
+                'dequeueCount': values.get('dequeueCount', 0),
+                'size': values.get('size', 0),
+            }
+            self._updated = time.monotonic()
+            self._changed.notify_all()
+
+    def get_queues_snapshot(self) -> Dict[str, dict]:
+        """
+        Get the latest statistics of the followed queues, keyed by queue name. Only waits if none have arrived yet.
+        :raises ConnectionError: If there are no statistics newer than max_age
+        """
+        with self._changed:
+            if self._updated is None:
+                self._changed.wait_for(lambda: self._updated is not None, self.connect_timeout)
+            if self._updated is None or time.monotonic() - self._updated > self.max_age:
+                raise ConnectionError(f'No queue statistics from {self.host}:{self.port} in {self.max_age} seconds')
+            return {name: dict(details) for name, details in self._statistics.items()}
+
+    def wait_for_update(self, timeout: float):
+        """ Block until new statistics arrive or timeout seconds pass """
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def close(self):
+        self._stopped.set()
+        if self._socket is not None:
+            try:
+                with self._send_lock:
+                    self._socket.sendall(encode_frame('DISCONNECT'))
+            except OSError:
+                pass
+            try:
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+        for thread in self._threads:
+            thread.join(timeout=self.interval + 1)
@@ -0,0 +1 @@
+from .registry import REGISTRY, Counter, Gauge, Histogram, Registry, TextfileWriter, start_http_server
\ No newline at end of file
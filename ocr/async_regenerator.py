@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import Iterable
+
+import aiohttp
+
+from fedora.async_client import AsyncFedoraClient
+from queue_monitor.activemq_client import BACKPRESSURE_SECONDS
+from transport import RetryingSession
+from . import outcomes
+from .regenerator import OcrRegenerator, REGENERATION_SECONDS
+
+
+class AsyncOcrRegenerator(OcrRegenerator):
+    """
+    An OcrRegenerator that checks pids with asyncio, keeping up to self.workers Fedora lookups in flight on a single
+    thread. Regenerations run as their own tasks, up to max_in_flight (or self.workers) at once, so a slow
+    regeneration endpoint only holds up the checks once that window is full.
+    """
+
+    def _check_pids(self, pids: Iterable[str]):
+        try:
+            if self.priority is not None and self.plan is None:
+                self._check_prioritized(self._select(pids),
+                                        lambda selected: asyncio.run(self._check_pids_async(selected, False)))
+            else:
+                asyncio.run(self._check_pids_async(self._select(pids), self.plan is None))
+        finally:
+            self._finish()
+
+    async def _check_pids_async(self, pids: Iterable[str], backpressure: bool = True):
+        fedora_config = self.config['fedora']
+        regeneration_slots = self.max_in_flight or self.workers
+        self._regeneration_slots = asyncio.Semaphore(regeneration_slots)
+        self._regenerations = set()
+        connector = aiohttp.TCPConnector(limit=self.workers + regeneration_slots,
+                                         force_close=not self.transport.get('keep_alive', True))
+        async with aiohttp.ClientSession(connector=connector, timeout=self._client_timeout()) as client_session:
+            session = RetryingSession(client_session, self.transport.get('retries', 3),
+                                      self.transport.get('backoff_factor', 0.3))
+            client = AsyncFedoraClient(fedora_config['url'], fedora_config['username'], fedora_config['password'],
+                                       session, self.client.cache)
+            in_flight = set()
+            try:
+                for i, pid in enumerate(pids):
+                    if backpressure:
+                        await self._wait_to_submit_async(i)
+                    while len(in_flight) >= self._concurrency():
+                        done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                        self._collect_results(done)
+                    in_flight.add(asyncio.ensure_future(self._process_pid_async(client, session, pid)))
+                if in_flight:
+                    done, in_flight = await asyncio.wait(in_flight)
+                    self._collect_results(done)
+                if self._regenerations:
+                    done, _ = await asyncio.wait(set(self._regenerations))
+                    self._collect_results(done)
+            except asyncio.CancelledError:
+                self.logger.warning(f'Interrupted, cancelling {len(in_flight)} pending checks and '
+                                    f'{len(self._regenerations)} regenerations')
+                for task in in_flight | self._regenerations:
+                    task.cancel()
+                raise
+
+    async def _process_pid_async(self, client: AsyncFedoraClient, session: RetryingSession, pid: str):
+        pid = pid.strip()
+        try:
+            outcome = await self._check_for_ocr_async(client, session, pid)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # Record the pid as failed, so the run goes on and resuming retries it
+            self.logger.exception(f'Error checking {pid}')
+            outcome = outcomes.FAILED
+        self._record_result(pid, outcome)
+
+    async def _check_for_ocr_async(self, client: AsyncFedoraClient, session: RetryingSession, pid: str):
+        pid = pid.strip()
+        if self._validate_pid(pid):
+            if len(self.targets) == 1:
+                target = next(iter(self.targets.values()))
+                datastream = await client.get_datastream_profile(pid, target.dsid, self._cutoff(target))
+                found = {target.dsid: datastream} if datastream is not None else {}
+            else:
+                found = {datastream.dsid: datastream for datastream in await client.list_datastreams(pid, True)
+                         if datastream.dsid in self.targets}
+            stale = self._stale_datastreams(pid, found)
+            if stale:
+                if self.plan is not None or self.scheduler is not None:
+                    return self._regenerate(pid, stale)
+                dsids = [datastream.dsid for datastream in stale]
+                self.logger.debug(f'Regenerating {", ".join(dsids)} for {pid}')
+                # Like RegenerationDispatcher.submit, wait only for a free slot in the window
+                await self._regeneration_slots.acquire()
+                task = asyncio.ensure_future(self._run_regeneration_async(session, pid, dsids))
+                self._regenerations.add(task)
+                task.add_done_callback(self._regenerations.discard)
+                return None
+            return outcomes.UP_TO_DATE if found else outcomes.NO_OCR
+
+    async def _run_regeneration_async(self, session: RetryingSession, pid: str, dsids):
+        """ Regenerate a pid holding one of the slots, recording its outcome once the requests complete """
+        try:
+            if self.dispatcher is not None and self.dispatcher.bucket is not None:
+                await asyncio.sleep(self.dispatcher.bucket.reserve())
+            try:
+                result = await self._regenerate_ocr_async(session, pid, dsids)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.logger.exception(f'Error regenerating {", ".join(dsids)} for {pid}')
+                result = False
+        finally:
+            self._regeneration_slots.release()
+        self._record_result(pid, self._log_regeneration(pid, result, dsids))
+
+    async def _regenerate_ocr_async(self, session: RetryingSession, pid: str, dsids=('OCR',)) -> bool:
+        succeeded = True
+        for dsid in dsids:
+            with REGENERATION_SECONDS.time():
+                async with session.get(f'{self._regeneration_url(dsid)}/{pid}') as res:
+                    self.logger.debug(f'Regenerate {dsid} response: {res.status}')
+                    succeeded = succeeded and 200 <= res.status < 400
+        return succeeded
+
+    def _client_timeout(self) -> aiohttp.ClientTimeout:
+        timeout = self.transport.get('timeout', 30)
+        if isinstance(timeout, (list, tuple)):
+            return aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        return aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+
+    async def _wait_to_submit_async(self, i: int):
+        if self.throttle is not None:
+            delay = await asyncio.to_thread(self.throttle.reserve)
+            while delay is None:
+                BACKPRESSURE_SECONDS.labels(reason='queue_full').inc(self.throttle.interval)
+                await asyncio.sleep(self.throttle.interval)
+                delay = await asyncio.to_thread(self.throttle.reserve)
+            BACKPRESSURE_SECONDS.labels(reason='paced').inc(delay)
+            await asyncio.sleep(delay)
+        elif i % self.batch_size == 0:
+            await self._wait_for_queue_async()
+
+    async def _wait_for_queue_async(self):
+        self.logger.debug(f'Checking queue size')
+        while await asyncio.to_thread(self.queue_monitor.queue_size_too_large):
+            self.logger.info(f'Queue size is too large, waiting up to {self.delay_seconds} seconds')
+            start = time.monotonic()
+            await asyncio.to_thread(self.queue_monitor.wait_for_change, self.delay_seconds)
+            BACKPRESSURE_SECONDS.labels(reason='queue_full').inc(time.monotonic() - start)
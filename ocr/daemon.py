@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable, Iterator, Optional
+
+from local_activemq_api_client.client import ActiveMQClient
+from .sources import read_pids
+
+
+class PidFeed:
+    """
+    A bounded queue of pids from any number of producers. Iterating it blocks while it is empty and only ends once it
+    is closed and drained, so it can be checked like any other pid source.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self._queue = queue.Queue(maxsize=max_size)
+        self._closed = threading.Event()
+
+    def put(self, pids: Iterable[str]) -> int:
+        """
+        Add pids, blocking while the feed is full
+        :param pids: The pids
+        :return: The number of pids added, fewer than given if the feed was closed
+        """
+        count = 0
+        for pid in pids:
+            pid = pid.strip()
+            if not pid:
+                continue
+            while True:
+                if self._closed.is_set():
+                    return count
+                try:
+                    self._queue.put(pid, timeout=0.5)
+                    break
+                except queue.Full:
+                    pass
+            count += 1
+        return count
+
+    def close(self):
+        """ Stop accepting pids, iteration ends once those already added are taken """
+        self._closed.set()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            try:
+                yield self._queue.get(timeout=0.5)
+            except queue.Empty:
+                if self._closed.is_set():
+                    return
+
+
+class HttpSource:
+    """
+    Accepts pids POSTed to / as text, one or more per line or whitespace separated, and answers 202 with the number
+    accepted. GET /status returns the status as JSON.
+    """
+
+    def __init__(self, feed: PidFeed, address: str = '127.0.0.1', port: int = 8765,
+                 status: Optional[Callable[[], dict]] = None):
+        self.feed = feed
+        self.address = address
+        self.port = port
+        self.status = status or (lambda: {})
+        self._server = None
+
+    def start(self):
+        source = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length).decode('utf-8')
+                self._reply(202, {'accepted': source.feed.put(body.split())})
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/status':
+                    self.send_error(404)
+                    return
+                self._reply(200, {'queued': len(source.feed), **source.status()})
+
+            def _reply(self, status: int, content: dict):
+                body = json.dumps(content).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.address, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name='daemon-http', daemon=True).start()
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class _PollingSource:
+    """ Runs poll on its own thread until stopped """
+
+    def __init__(self, feed: PidFeed, interval: float):
+        self.feed = feed
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                found = self.poll()
+            except Exception:
+                self.logger.exception(f'Error reading pids in {type(self).__name__}')
+                found = False
+            if not found:
+                self._stopped.wait(self.interval)
+
+    def poll(self) -> bool:
+        """
+        Feed any pids that have arrived
+        :return: Whether any arrived, if not the next poll is after interval seconds
+        """
+        raise NotImplementedError()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class SpoolSource(_PollingSource):
+    """
+    Feeds the pids in each file written to a directory, oldest first, then moves the file to a processed
+    subdirectory. Files starting with . are skipped, so a file can be written under a hidden name and renamed once
+    complete.
+    """
+
+    def __init__(self, feed: PidFeed, directory: str, interval: float = 5):
+        super().__init__(feed, interval)
+        self.directory = directory
+        self.processed = os.path.join(directory, 'processed')
+        os.makedirs(self.processed, exist_ok=True)
+
+    def poll(self) -> bool:
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and not entry.name.startswith('.')]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if self._stopped.is_set():
+                break
+            count = self.feed.put(read_pids(entry.path))
+            if self.feed.closed:
+                # Possibly only partly queued, leave it to be read again on the next start
+                break
+            os.replace(entry.path, os.path.join(self.processed, entry.name))
+            self.logger.info(f'Queued {count} pids from {entry.path}')
+        return bool(entries)
+
+
+class QueueSource(_PollingSource):
+    """ Feeds the pids in each message consumed from an ActiveMQ queue, one or more per message """
+
+    def __init__(self, feed: PidFeed, client: ActiveMQClient, queue_name: str, timeout: float = 5):
+        super().__init__(feed, timeout)
+        self.client = client
+        self.queue_name = queue_name
+
+    def poll(self) -> bool:
+        # The request itself waits up to interval seconds for a message
+        message = self.client.consume_message(self.queue_name, self.interval)
+        if message is not None:
+            self.feed.put(message.split())
+        return True
+
+
+class RegenerationDaemon:
+    """
+    Keeps a regenerator running, checking pids as they arrive from an HTTP endpoint, a spool directory or an
+    ActiveMQ queue with the same staleness check and backpressure as a one off run
+    """
+
+    def __init__(self, regenerator, config: dict):
+        """
+        :param regenerator: The OcrRegenerator to check pids with
+        :param config: The daemon settings, at least one source is required:
+            listen: The address and port to accept pids on, like 127.0.0.1:8765
+            spool: A directory to read files of pids from
+            spool_interval: Seconds between looking for new files (default 5)
+            queue_name: A queue on the queue monitor's broker to consume pids from
+            queue_timeout: Seconds each request for a message waits (default 5)
+            max_queued: The most pids waiting to be checked before sources are blocked (default 10000)
+        """
+        self.regenerator = regenerator
+        self.feed = PidFeed(config.get('max_queued', 10000))
+        self.logger = logging.getLogger(__name__)
+        self.sources = []
+        if config.get('listen') is not None:
+            address, _, port = str(config['listen']).rpartition(':')
+            self.sources.append(HttpSource(self.feed, address or '127.0.0.1', int(port), self.status))
+        if config.get('spool') is not None:
+            self.sources.append(SpoolSource(self.feed, config['spool'], config.get('spool_interval', 5)))
+        if config.get('queue_name') is not None:
+            queue_config = regenerator.config['queue_monitor']
+            client = ActiveMQClient(queue_config['host'], queue_config['username'], queue_config['password'],
+                                    transport=regenerator.transport)
+            self.sources.append(QueueSource(self.feed, client, config['queue_name'], config.get('queue_timeout', 5)))
+        if not self.sources:
+            raise ValueError('The daemon configuration needs at least one of listen, spool or queue_name')
+
+    def status(self) -> dict:
+        return dict(self.regenerator.stats)
+
+    def run(self):
+        """ Check pids as they arrive until stop is called """
+        for source in self.sources:
+            source.start()
+        self.logger.info(f'Waiting for pids from {", ".join(type(source).__name__ for source in self.sources)}')
+        try:
+            self.regenerator.check_stream(self.feed)
+        finally:
+            self.feed.close()
+            for source in self.sources:
+                source.stop()
+
+    def stop(self):
+        """ Stop taking new pids, run returns once those already queued are checked """
+        self.feed.close()
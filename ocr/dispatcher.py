@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class TokenBucket:
+    """ A thread safe token bucket allowing rate requests per second with bursts of up to capacity """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError('Rate must be greater than 0')
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Take a token, going into debt if there is none
+        :return: Seconds to wait before using the token
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        """ Block until a token is available """
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RegenerationDispatcher:
+    """
+    Sends regeneration requests from their own thread pool, with at most max_in_flight outstanding and, if a rate is
+    given, no more than rate requests per second. submit blocks while the window is full, so the checks feeding it
+    slow down to what the regeneration endpoint can take.
+    """
+
+    def __init__(self, regenerate: Callable[..., bool], on_complete: Callable[..., None],
+                 max_in_flight: int = 10, rate: Optional[float] = None):
+        """
+        :param regenerate: Sends the request for a pid and any arguments it was submitted with and returns whether it
+        succeeded
+        :param on_complete: Called with each pid, whether its regeneration succeeded and any arguments it was
+        submitted with
+        :param max_in_flight: The most requests outstanding at once
+        :param rate: The most requests started per second, unlimited if None
+        """
+        self.regenerate = regenerate
+        self.on_complete = on_complete
+        self.max_in_flight = max_in_flight
+        self.bucket = TokenBucket(rate) if rate else None
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='ocr-regenerate')
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self, pid: str, *args):
+        """ Queue a pid for regeneration, waiting for a free slot in the window """
+        self._slots.acquire()
+        try:
+            self._executor.submit(self._run, pid, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _run(self, pid: str, *args):
+        try:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                result = self.regenerate(pid, *args)
+            except Exception:
+                self.logger.exception(f'Error regenerating OCR for {pid}')
+                result = False
+            self.on_complete(pid, result, *args)
+        finally:
+            self._slots.release()
+
+    def join(self):
+        """ Wait for every submitted regeneration to complete """
+        for _ in range(self.max_in_flight):
+            self._slots.acquire()
+        for _ in range(self.max_in_flight):
+            self._slots.release()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,73 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from . import outcomes
+
+
+class ProgressJournal:
+    """
+    A SQLite record of the outcome of each pid, so an interrupted run can be resumed. Outcomes are buffered and
+    written batch_size at a time.
+    """
+
+    def __init__(self, path: str, batch_size: int = 1000):
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS progress (pid TEXT PRIMARY KEY, outcome TEXT NOT NULL, updated TEXT NOT NULL)'
+        )
+        self._connection.commit()
+
+    def record(self, pid: str, outcome: str):
+        """
+        Record the outcome for a pid, replacing any earlier outcome
+        :param pid: The pid
+        :param outcome: One of the ocr.outcomes values
+        """
+        with self._lock:
+            self._pending[pid] = (outcome, datetime.now(tz=timezone.utc).isoformat())
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    def is_finished(self, pid: str, finished=outcomes.FINISHED) -> bool:
+        """
+        Whether the journal has an outcome for this pid that needs no more work
+        :param pid: The pid
+        :param finished: The outcomes that need no more work
+        """
+        return self.get_outcome(pid) in finished
+
+    def get_outcome(self, pid: str):
+        """
+        Get the latest outcome recorded for a pid
+        :param pid: The pid
+        :return: The outcome or None if the pid has not been recorded
+        """
+        with self._lock:
+            if pid in self._pending:
+                return self._pending[pid][0]
+            row = self._connection.execute('SELECT outcome FROM progress WHERE pid = ?', (pid,)).fetchone()
+        return row[0] if row is not None else None
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO progress (pid, outcome, updated) VALUES (?, ?, ?)',
+                [(pid, outcome, updated) for pid, (outcome, updated) in self._pending.items()]
+            )
+            self._connection.commit()
+            self._pending = {}
+
+    def close(self):
+        self.flush()
+        self._connection.close()
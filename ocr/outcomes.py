@@ -0,0 +1,16 @@
+""" The outcomes recorded for each checked pid """
+
+REGENERATED = 'regenerated'
+FAILED = 'failed'
+UP_TO_DATE = 'up_to_date'
+NO_OCR = 'no_ocr'
+PLANNED = 'planned'
+
+# Outcomes that need no more work when a run is resumed, a planned pid still needs regenerating
+FINISHED = frozenset([REGENERATED, UP_TO_DATE, NO_OCR])
+
+# Outcomes that need no more work when a scan is resumed, a planned pid is already in the plan
+SCANNED = FINISHED | {PLANNED}
+
+# Outcomes that need no more work when a dispatch is resumed
+DISPATCHED = frozenset([REGENERATED])
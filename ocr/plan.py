@@ -0,0 +1,110 @@
+import threading
+from collections import namedtuple
+from datetime import datetime
+from itertools import groupby
+from typing import Iterator
+
+from .sources import open_text
+from .targets import Regeneration
+
+PlanEntry = namedtuple('PlanEntry', ['pid', 'dsid', 'created_date', 'size'])
+
+
+class PlanWriter:
+    """
+    Writes the datastreams a scan found to need regeneration as tab separated lines of pid, dsid, created date and
+    size. The summary is appended as comment lines when the plan is closed. Files ending in .gz, .bz2 or .xz are
+    compressed.
+    """
+
+    header = '# pid\tdsid\tcreated_date\tsize\n'
+
+    def __init__(self, path: str, append: bool = False):
+        """
+        :param path: The plan file
+        :param append: Add to an existing plan, when resuming a scan
+        """
+        self.path = path
+        self.count = 0
+        self.total_size = 0
+        self.oldest = None
+        self.newest = None
+        self._lock = threading.Lock()
+        self._file = open_text(path, 'at' if append else 'wt')
+        self._file.write(self.header)
+
+    def add(self, pid: str, *datastreams):
+        """
+        Add an object's datastreams to the plan, on consecutive lines
+        :param pid: The pid of the object
+        :param datastreams: The fedora.client.Datastream objects to regenerate
+        """
+        with self._lock:
+            for datastream in datastreams:
+                created = datastream.get_created_date()
+                self._file.write(f'{pid}\t{datastream.dsid}\t{created.isoformat()}\t{datastream.size}\n')
+                self.count += 1
+                self.total_size += max(datastream.size, 0)
+                if self.oldest is None or created < self.oldest:
+                    self.oldest = created
+                if self.newest is None or created > self.newest:
+                    self.newest = created
+
+    def close(self, stats: dict = None):
+        """
+        Write the summary and close the plan
+        :param stats: Extra counts from the scan to include in the summary
+        """
+        summary = {
+            'entries': self.count,
+            'total_size': self.total_size,
+            'oldest': self.oldest.isoformat() if self.oldest is not None else '',
+            'newest': self.newest.isoformat() if self.newest is not None else '',
+        }
+        summary.update(stats or {})
+        with self._lock:
+            for key, value in summary.items():
+                self._file.write(f'# {key}: {value}\n')
+            self._file.close()
+
+
+def read_plan(path: str) -> Iterator[PlanEntry]:
+    """
+    Lazily read the entries of a plan
+    :param path: The plan file, '-' is not supported
+    :return: An iterator of PlanEntry
+    """
+    with open_text(path) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            pid, dsid, created_date, size = line.rstrip('\n').split('\t')
+            yield PlanEntry(pid, dsid, created_date, int(size))
+
+
+def read_regenerations(path: str) -> Iterator[Regeneration]:
+    """
+    Lazily read a plan as one regeneration per object
+    :param path: The plan file
+    :return: An iterator of Regeneration
+    """
+    for pid, entries in groupby(read_plan(path), key=lambda entry: entry.pid):
+        entries = list(entries)
+        yield Regeneration(pid, tuple(entry.dsid for entry in entries),
+                           min(datetime.fromisoformat(entry.created_date) for entry in entries),
+                           sum(max(entry.size, 0) for entry in entries))
+
+
+def read_plan_summary(path: str) -> dict:
+    """
+    Read the summary lines of a plan
+    :param path: The plan file
+    :return: The summary values as strings, from the last summary if the plan was appended to
+    """
+    summary = {}
+    with open_text(path) as f:
+        for line in f:
+            if line.startswith('# ') and ': ' in line:
+                key, value = line[2:].rstrip('\n').split(': ', 1)
+                summary[key] = value
+    return summary
@@ -0,0 +1,141 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from collections import defaultdict
+from typing import Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where time and memory outside this repository goes, checked in order against the file and function name
+CATEGORIES = (
+    ('xml', ('lxml', 'xml/etree', 'pyexpat', 'ElementTree')),
+    ('strptime', ('_strptime', 'strptime', 'fromisoformat')),
+    ('logging', ('logging',)),
+    ('sleep', ('time.sleep', 'asyncio/tasks.py')),
+    ('waiting', ('acquire', 'threading.py', 'concurrent/futures', 'selectors', 'select.', 'epoll')),
+    ('http', ('requests', 'urllib', 'aiohttp', 'http/client', 'socket', 'ssl', 'yarl', 'multidict')),
+    ('sqlite', ('sqlite3',)),
+    ('filesystem', ('posix.stat', 'genericpath', 'posixpath', 'io.open', 'TextIOWrapper')),
+    ('environment', ('<frozen os>', '_collections_abc')),
+)
+
+
+def categorize(filename: str, function: str = '') -> str:
+    """
+    Name the module or kind of work a function belongs to
+    :param filename: The function's file, ~ for builtins
+    :param function: The function's name
+    :return: The dotted module name for this repository's code, otherwise a category from CATEGORIES or other
+    """
+    if filename.startswith(ROOT + os.sep) and 'site-packages' not in filename:
+        module = os.path.relpath(filename, ROOT)[:-len('.py')].replace(os.sep, '.')
+        return module[:-len('.__init__')] if module.endswith('.__init__') else module
+    name = f'{filename} {function}'
+    for category, markers in CATEGORIES:
+        if any(marker in name for marker in markers):
+            return category
+    return 'other'
+
+
+class RunProfiler:
+    """
+    Profiles a run with cProfile in every thread it starts and tracemalloc, writing PATH.prof for pstats or
+    snakeviz and a PATH.txt report of where the time and memory went by module once stopped.
+    """
+
+    def __init__(self, path: str, top: int = 30, memory_frames: int = 1):
+        """
+        :param path: The path to write the reports to, without an extension
+        :param top: The number of functions and allocation sites to list in the report
+        :param memory_frames: The number of frames tracemalloc keeps per allocation
+        """
+        self.path = path
+        self.top = top
+        self.memory_frames = memory_frames
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._start_snapshot = None
+
+    def start(self):
+        tracemalloc.start(self.memory_frames)
+        self._start_snapshot = tracemalloc.take_snapshot()
+        if sys.version_info < (3, 12):
+            # Threads started from now on install their own profiler on their first call, from 3.12 a profiler
+            # already sees every thread
+            threading.setprofile(self._profile_thread)
+        self._profile_thread()
+
+    def _profile_thread(self, *args):
+        profile = cProfile.Profile()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        """ Stop profiling and write the reports """
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        self._profiles[0].disable()
+        end_snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = pstats.Stats(*profiles)
+        stats.dump_stats(self.path + '.prof')
+        with open(self.path + '.txt', 'w') as f:
+            f.write(self.report(stats, end_snapshot, peak))
+
+    def report(self, stats: pstats.Stats, snapshot: tracemalloc.Snapshot, peak: int) -> str:
+        """
+        :param stats: The merged profiles
+        :param snapshot: The memory snapshot at the end of the run
+        :param peak: The peak traced memory in bytes
+        :return: The text report
+        """
+        out = io.StringIO()
+        total = sum(entry[2] for entry in stats.stats.values())
+        out.write(f'CPU by module (own time, {total:.2f}s total)\n')
+        for category, seconds in sorted(self.time_by_category(stats).items(), key=lambda item: -item[1]):
+            out.write(f'  {category:<40} {seconds:10.3f}s {self._percent(seconds, total):6.1f}%\n')
+
+        out.write(f'\nTop {self.top} functions by own time\n')
+        stats.stream = out
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        out.write(f'Top {self.top} functions by cumulative time\n')
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+
+        statistics = snapshot.compare_to(self._start_snapshot, 'lineno')
+        growth = sum(stat.size_diff for stat in statistics)
+        out.write(f'Memory by module (peak {peak / 1024 / 1024:.1f}MB traced, {growth / 1024 / 1024:+.1f}MB over '
+                  f'the run)\n')
+        for category, size in sorted(self.memory_by_category(statistics).items(), key=lambda item: -item[1]):
+            out.write(f'  {category:<40} {size / 1024:+12.1f}KB\n')
+        out.write(f'\nTop {self.top} allocation sites by growth\n')
+        for stat in statistics[:self.top]:
+            out.write(f'  {stat}\n')
+        return out.getvalue()
+
+    @staticmethod
+    def time_by_category(stats: pstats.Stats) -> Dict[str, float]:
+        """ Sum each function's own time by the module it belongs to """
+        times = defaultdict(float)
+        for (filename, _, function), (_, _, own_time, _, _) in stats.stats.items():
+            times[categorize(filename, function)] += own_time
+        return dict(times)
+
+    @staticmethod
+    def memory_by_category(statistics) -> Dict[str, int]:
+        """ Sum the change in allocated memory by the module that allocated it """
+        sizes = defaultdict(int)
+        for stat in statistics:
+            sizes[categorize(stat.traceback[0].filename)] += stat.size_diff
+        return dict(sizes)
+
+    @staticmethod
+    def _percent(part: float, total: float) -> float:
+        return 100 * part / total if total > 0 else 0.0
@@ -1,13 +1,37 @@
+import heapq
 import logging
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-import requests
+from itertools import groupby
+from operator import itemgetter
+from typing import Iterable, Iterator, Sequence
 import time
 from urllib.parse import urlparse
 
+import requests
+
 from fedora import FedoraClient
-from queue_monitor import QueueMonitor
+from fedora.cache import ProfileCache
+from metrics import REGISTRY
+from queue_monitor import QueueMonitor, ThroughputController
+from queue_monitor.activemq_client import BACKPRESSURE_SECONDS
+from . import outcomes
+from .dispatcher import RegenerationDispatcher
+from .journal import ProgressJournal
+from .plan import PlanWriter, read_regenerations
+from .scheduler import RegenerationScheduler
+from .sharding import Shard
+from .sources import prefetch, read_pids
+from .targets import Regeneration, Target, read_targets
+from transport import create_session
+
+PIDS = REGISTRY.counter('ocr_regen_pids_total', 'Pids processed by outcome', ('outcome',))
+DECISION_SECONDS = REGISTRY.histogram('ocr_regen_decision_seconds', 'Time spent deciding whether OCR is stale')
+REGENERATION_SECONDS = REGISTRY.histogram('ocr_regen_regeneration_seconds',
+                                          'Time spent waiting on regeneration requests')
 
 
 class OcrRegenerator:
@@ -15,20 +39,56 @@ class OcrRegenerator:
     def __init__(self, config: dict, check_before: datetime):
         self.config = config
         fedora_config = config['fedora']
-        self.client = FedoraClient(fedora_config['url'], fedora_config['username'], fedora_config['password'])
         regen = config['regenerator']
         self.ocr_gen_url = regen['url'].strip().rstrip('/')
+        # The datastreams to check, with more than one they are all checked from a single datastream listing
+        self.targets = read_targets(regen)
         self.batch_size = regen.get('batch_size', 10)
         self.delay_seconds = regen.get('delay_seconds', 30)
+        self.workers = regen.get('workers', 1)
+        # Regeneration requests per second and outstanding at once, requests are sent inline if neither is set
+        self.rate_limit = regen.get('rate_limit')
+        self.max_in_flight = regen.get('max_in_flight')
+        # Regenerate the oldest OCR first instead of in input order
+        self.priority = regen.get('priority')
+        self.transport = config.get('http', {})
+        self.session = self._create_session()
+        cache_config = fedora_config.get('cache')
+        cache = None
+        if cache_config is not None:
+            cache = ProfileCache(cache_config['path'], cache_config.get('max_entries', 1000000),
+                                 cache_config.get('batch_size', 1000))
+        self.client = FedoraClient(fedora_config['url'], fedora_config['username'], fedora_config['password'],
+                                   self.session, cache)
         urlparse(self.ocr_gen_url)
         self.logger = self._setup_logging()
         self.check_before = check_before
         queue_config = config['queue_monitor']
-        self.queue_monitor = QueueMonitor(queue_config)
+        self.queue_monitor = QueueMonitor(queue_config, self.transport)
+        self.throttle = None
+        if queue_config.get('adaptive') is not None:
+            self.throttle = ThroughputController(self.queue_monitor, queue_config['adaptive'], self.workers)
+        self.stats = dict.fromkeys(['checked', 'skipped', outcomes.REGENERATED, outcomes.FAILED, outcomes.UP_TO_DATE,
+                                    outcomes.NO_OCR, outcomes.PLANNED], 0)
+        self._stats_lock = threading.Lock()
+        self.journal = None
+        self.resume = False
+        self.shard = None
+        self.plan = None
+        self.scheduler = None
+        self.dispatcher = None
+        if self.rate_limit is not None or self.max_in_flight is not None:
+            self.dispatcher = RegenerationDispatcher(self._regenerate_ocr, self._regeneration_complete,
+                                                     self.max_in_flight or 10, self.rate_limit)
 
     def __del__(self):
         try:
+            if self.dispatcher is not None:
+                self.dispatcher.close()
+            if self.client.cache is not None:
+                self.client.cache.close()
             self.queue_monitor.close()
+            self.session.close()
         except AttributeError:
             pass
 
@@ -41,53 +101,464 @@ class OcrRegenerator:
         else:
             raise ValueError('Check before must be a datetime in the past')
 
+    def set_workers(self, workers: int):
+        if workers is not None and workers > 0:
+            self.workers = workers
+            if self.throttle is not None:
+                self.throttle.max_concurrency = workers
+            if workers + (self.max_in_flight or 0) > self.transport.get('pool_size', 10):
+                # Keep a pooled connection per worker and regeneration request
+                self.session.close()
+                self.session = self._create_session()
+                self.client.session = self.session
+        else:
+            raise ValueError('Workers must be a positive integer')
+
+    def set_journal(self, journal: ProgressJournal, resume: bool = False):
+        """
+        Record the outcome of each pid in a journal
+        :param journal: The journal to record to
+        :param resume: Whether to skip pids the journal already has a finished outcome for
+        """
+        self.journal = journal
+        self.resume = resume
+
+    def set_shard(self, shard: Shard):
+        """
+        Only process the pids in one shard. The queue is shared with the other shards, so this node's share of the
+        backpressure is scaled down: it checks the queue every batch_size / count pids, or an adaptive throttle
+        submits at 1 / count of the rate the queue can take.
+        :param shard: The shard to process
+        """
+        self.shard = shard
+        self.batch_size = max(1, self.batch_size // shard.count)
+        if self.throttle is not None:
+            self.throttle.share = 1 / shard.count
+
     def check(self, path):
-        if os.path.exists(path):
+        """
+        Check a pid or file of pids
+        :param path: A pid, a file of pids or - for stdin
+        """
+        if self._is_pid_file(path):
             self._check_file(path)
         else:
-            self._check_for_ocr(path)
+            self._check_pids([path])
+
+    def check_stream(self, pids: Iterable[str]):
+        """
+        Check pids as an iterable produces them, it may block waiting for more and need never end
+        :param pids: An iterable of pids
+        """
+        self._check_pids(pids)
 
     def _check_file(self, file_path):
-        if os.path.exists(file_path):
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
-                for i, line in enumerate(lines):
-                    if i % self.batch_size == 0:
-                        self.logger.debug(f'Checking queue size')
-                        while self.queue_monitor.queue_size_too_large():
-                            self.logger.info(f'Queue size is too large, waiting {self.delay_seconds} seconds')
-                            time.sleep(self.delay_seconds)
-                    self._check_for_ocr(line)
-
-    def _check_for_ocr(self, pid: str) -> bool:
+        if self._is_pid_file(file_path):
+            self._check_pids(read_pids(file_path))
+
+    def check_members(self, path, page_size: int = 10000):
+        """
+        Check the children of compound objects, like the pages of books or newspaper issues, instead of the objects
+        themselves. Each parent's children are found with a Resource Index query while those of the parents before it
+        are being checked, and a child of more than one parent is only checked once.
+        :param path: A parent pid, a file of parent pids or - for stdin
+        :param page_size: The number of children to request per query, and to find ahead of the checks
+        """
+        parents = read_pids(path) if self._is_pid_file(path) else [path]
+        self._check_pids(prefetch(self._members(parents, page_size), page_size))
+
+    def _members(self, parents: Iterable[str], page_size: int) -> Iterator[str]:
+        expanded = set()
+        seen = set()
+        for parent in parents:
+            parent = parent.strip()
+            if parent in expanded:
+                continue
+            expanded.add(parent)
+            if not self._validate_pid(parent):
+                self.logger.warning(f'Skipping invalid parent pid {parent}')
+                continue
+            count = 0
+            for pid in self.client.find_members(parent, page_size):
+                count += 1
+                if pid not in seen:
+                    seen.add(pid)
+                    yield pid
+            self.logger.debug(f'Found {count} members of {parent}')
+
+    def scan(self, path, plan: PlanWriter, members: bool = False, page_size: int = 10000):
+        """
+        Check a pid or file of pids and write the ones that need regeneration to a plan instead of regenerating them
+        :param path: A pid, a file of pids or - for stdin
+        :param plan: The plan to write to, it is closed with the scan's counts once the scan completes
+        :param members: Check the children of the pids instead, like check_members
+        :param page_size: With members, the number of children to request per query
+        """
+        self.plan = plan
+        try:
+            if members:
+                self.check_members(path, page_size)
+            else:
+                self.check(path)
+        finally:
+            self.plan = None
+            plan.close({key: self.stats[key] for key in ['checked', outcomes.UP_TO_DATE, outcomes.NO_OCR]})
+
+    def dispatch(self, plan_path: str):
+        """
+        Regenerate every entry of a plan written by scan, without checking them again. With a priority configured the
+        whole plan is read first and regenerated oldest first.
+        :param plan_path: The plan file
+        """
+        regenerations = (regeneration for regeneration in read_regenerations(plan_path)
+                         if self._is_selected(regeneration.pid, outcomes.DISPATCHED))
+        try:
+            if self.priority is not None:
+                scheduler = self._create_scheduler()
+                for regeneration in regenerations:
+                    scheduler.push(regeneration)
+                scheduler.close()
+                regenerations = scheduler
+            self._submit(regenerations, self._process_regeneration)
+        finally:
+            self._finish()
+
+    def regenerate_stale(self, page_size: int = 10000):
+        """
+        Regenerate every target datastream the Resource Index reports as older than its cutoff, without checking
+        each object's profile. Each target is queried separately and the results, all ordered by pid, are merged so
+        an object with several stale targets is regenerated once.
+        :param page_size: The number of pids to request per Resource Index query
+        """
+        stale = heapq.merge(*[self._stale_pids(target, page_size) for target in self.targets.values()],
+                            key=itemgetter(0))
+        regenerations = (Regeneration(pid, tuple(dsid for _, dsid in found), None, 0)
+                         for pid, found in groupby(stale, key=itemgetter(0)))
+        try:
+            self._submit((regeneration for regeneration in regenerations if self._is_selected(regeneration.pid)),
+                         self._process_regeneration)
+        finally:
+            self._finish()
+
+    def _stale_pids(self, target: Target, page_size: int) -> Iterator[tuple]:
+        """ The pids whose datastream for a target is older than its cutoff, each paired with the datastream id """
+        for pid in self.client.find_stale_datastreams(target.dsid, self._cutoff(target), page_size):
+            yield pid, target.dsid
+
+    def check_objects(self, pid_pattern: str, modified_before: datetime = None, modified_after: datetime = None,
+                      page_size: int = 1000):
+        """
+        Check every object findObjects returns, the next page is fetched while the current one is being checked
+        :param pid_pattern: The pids to find, * and ? are wildcards, like uofm:*
+        :param modified_before: Only find objects last modified before this date
+        :param modified_after: Only find objects last modified at or after this date
+        :param page_size: The number of pids to request per page
+        """
+        conditions = [f'pid~{pid_pattern}']
+        if modified_before is not None:
+            conditions.append(f'mDate<{self._fedora_date(modified_before)}')
+        if modified_after is not None:
+            conditions.append(f'mDate>={self._fedora_date(modified_after)}')
+        self._check_pids(prefetch(self.client.find_objects(' '.join(conditions), page_size), page_size))
+
+    def _check_pids(self, pids: Iterable[str]):
+        """
+        Check each pid, waiting on the queue monitor every batch_size pids
+        :param pids: An iterable of pids
+        """
+        pids = self._select(pids)
+        try:
+            if self.priority is not None and self.plan is None:
+                self._check_prioritized(pids, lambda selected: self._submit(selected, self._process_pid, False))
+            else:
+                # A scan only writes a plan, so it need not wait on the queue
+                self._submit(pids, self._process_pid, self.plan is None)
+        finally:
+            self._finish()
+
+    def _finish(self):
+        """ Wait for outstanding regenerations and write everything buffered once a run ends """
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+        if self.journal is not None:
+            self.journal.flush()
+        if self.client.cache is not None:
+            self.client.cache.flush()
+        self._log_stats()
+
+    def _submit(self, items: Iterable, process, backpressure: bool = True):
+        """
+        Process each item, on self.workers threads if there is more than one
+        :param items: An iterable of pids or regenerations
+        :param process: Called with each item
+        :param backpressure: Whether to wait on the queue monitor, not needed when nothing is regenerated
+        """
+        if self.workers > 1:
+            self._check_pids_concurrently(items, process, backpressure)
+        else:
+            for i, item in enumerate(items):
+                if backpressure:
+                    self._wait_to_submit(i)
+                process(item)
+
+    def _check_prioritized(self, pids: Iterable[str], check):
+        """
+        Check pids without waiting on the queue, scheduling the stale ones, while another thread regenerates the
+        scheduled pids oldest first with the usual backpressure. The checks run ahead of the regenerations, so
+        whenever the queue has room the oldest OCR found so far is regenerated next.
+        :param pids: An iterable of pids
+        :param check: Checks an iterable of pids, regenerations go to self.scheduler
+        """
+        self.scheduler = self._create_scheduler()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix='ocr-schedule') as executor:
+            regenerating = executor.submit(self._submit, self.scheduler, self._process_regeneration)
+            try:
+                check(pids)
+            except BaseException:
+                self.logger.warning(f'Checks stopped, dropping {len(self.scheduler)} scheduled regenerations')
+                self.scheduler.close(discard=True)
+                raise
+            finally:
+                self.scheduler.close()
+                regenerating.result()
+                self.scheduler = None
+
+    def _create_scheduler(self) -> RegenerationScheduler:
+        return RegenerationScheduler(self.priority.get('size_weight', 0), self.priority.get('namespaces'),
+                                     self.priority.get('max_in_memory', 100000), self.priority.get('spill_directory'))
+
+    def _check_pids_concurrently(self, items: Iterable, process, backpressure: bool = True):
+        """
+        Process pids or regenerations on a pool of self.workers threads. At most two per worker are pending at any
+        time so the queue monitor is still consulted every batch_size items. With an adaptive throttle the number
+        pending follows its concurrency.
+        :param items: An iterable of pids or regenerations
+        :param process: Called with each item
+        :param backpressure: Whether to wait on the queue monitor
+        """
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr-check') as executor:
+            try:
+                for i, item in enumerate(items):
+                    if backpressure:
+                        self._wait_to_submit(i)
+                    while len(in_flight) >= self._concurrency() * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        self._collect_results(done)
+                    in_flight.add(executor.submit(process, item))
+                done, in_flight = wait(in_flight)
+                self._collect_results(done)
+            except KeyboardInterrupt:
+                self.logger.warning(f'Interrupted, cancelling {len(in_flight)} pending checks')
+                for future in in_flight:
+                    future.cancel()
+                raise
+
+    @staticmethod
+    def _collect_results(futures):
+        for future in futures:
+            # Raise any error from the check
+            future.result()
+
+    def _select(self, pids: Iterable[str]) -> Iterable[str]:
+        """ Keep the pids in this node's shard that are not already finished, or already planned when scanning """
+        finished = outcomes.SCANNED if self.plan is not None else outcomes.FINISHED
+        return (pid for pid in pids if self._is_selected(pid.strip(), finished))
+
+    def _is_selected(self, pid: str, finished=outcomes.FINISHED) -> bool:
+        """
+        Whether a pid is in this node's shard, and not already finished by the journal when resuming
+        :param pid: The pid
+        :param finished: The outcomes that need no more work
+        """
+        if self.shard is not None and not self.shard.contains(pid):
+            return False
+        if self.resume and self.journal.is_finished(pid, finished):
+            self.logger.debug(f'Skipping {pid}, already finished')
+            with self._stats_lock:
+                self.stats['skipped'] += 1
+            return False
+        return True
+
+    def _process_pid(self, pid: str):
+        pid = pid.strip()
+        try:
+            outcome = self._check_for_ocr(pid)
+        except requests.RequestException:
+            # Record the pid as failed, so the run goes on and resuming retries it
+            self.logger.exception(f'Error checking {pid}')
+            outcome = outcomes.FAILED
+        self._record_result(pid, outcome)
+
+    def _process_regeneration(self, regeneration: Regeneration):
+        try:
+            outcome = self._regenerate_pid(regeneration.pid, regeneration.dsids)
+        except requests.RequestException:
+            self.logger.exception(f'Error regenerating {", ".join(regeneration.dsids)} for {regeneration.pid}')
+            outcome = outcomes.FAILED
+        self._record_result(regeneration.pid, outcome)
+
+    def _record_result(self, pid: str, outcome):
+        if outcome is None:
+            return
+        with self._stats_lock:
+            self.stats['checked'] += 1
+            self.stats[outcome] += 1
+        PIDS.labels(outcome=outcome).inc()
+        if self.journal is not None:
+            self.journal.record(pid, outcome)
+
+    def _log_stats(self):
+        prefix = f'Shard {self.shard}: ' if self.shard is not None else ''
+        self.logger.info(prefix + 'Checked {checked} pids, regenerated {regenerated}, failed {failed}, up to date {up_to_date}, '
+                         'no OCR {no_ocr}, planned {planned}, skipped {skipped}'.format(**self.stats))
+
+    def _concurrency(self) -> int:
+        return self.throttle.concurrency if self.throttle is not None else self.workers
+
+    def _wait_to_submit(self, i: int):
+        """
+        Apply backpressure before submitting the i'th pid
+        :param i: The index of the pid
+        """
+        if self.throttle is not None:
+            self.throttle.acquire()
+        elif i % self.batch_size == 0:
+            self._wait_for_queue()
+
+    def _wait_for_queue(self):
+        self.logger.debug(f'Checking queue size')
+        while self.queue_monitor.queue_size_too_large():
+            self.logger.info(f'Queue size is too large, waiting up to {self.delay_seconds} seconds')
+            start = time.monotonic()
+            self.queue_monitor.wait_for_change(self.delay_seconds)
+            BACKPRESSURE_SECONDS.labels(reason='queue_full').inc(time.monotonic() - start)
+
+    def _check_for_ocr(self, pid: str) -> str:
+        """
+        Check a pid's target datastreams and regenerate those older than their cutoff. A single target is read with
+        a profile request, several from one datastream listing.
+        :param pid: The pid to check
+        :return: The outcome from ocr.outcomes, or None if the pid is invalid
+        """
         pid = pid.strip()
         if self._validate_pid(pid):
-            datastreams = self.client.list_datastreams(pid, profiles=True)
-            ocr = None
-            for ds in datastreams:
-                if ds.dsid == 'OCR':
-                    ocr = ds
-                    break
-            if ocr is not None:
-                self.logger.debug(f'OCR for {pid} is {ocr.created_date}')
-                if ocr.get_created_date() < self.check_before:
-                    self.logger.debug(f'Regenerating OCR for {pid}')
-                    result = self._regenerate_ocr(pid)
-                    if result:
-                        self.logger.info(f'Regenerated OCR for {pid}')
-                        return True
-                    else:
-                        self.logger.error(f'Failed to regenerate OCR for {pid}')
-                else:
-                    self.logger.info(f'OCR for {pid} is up to date')
+            if len(self.targets) == 1:
+                target = next(iter(self.targets.values()))
+                datastream = self.client.get_datastream_profile(pid, target.dsid, self._cutoff(target))
+                found = {target.dsid: datastream} if datastream is not None else {}
             else:
-                self.logger.info(f'No OCR datastream for {pid}')
-            return False
+                found = {datastream.dsid: datastream for datastream in self.client.list_datastreams(pid, True)
+                         if datastream.dsid in self.targets}
+            stale = self._stale_datastreams(pid, found)
+            if stale:
+                return self._regenerate(pid, stale)
+            return outcomes.UP_TO_DATE if found else outcomes.NO_OCR
+
+    def _stale_datastreams(self, pid: str, found: dict) -> list:
+        """
+        :param pid: The pid
+        :param found: The object's target datastreams keyed by id
+        :return: The datastreams older than their target's cutoff
+        """
+        return [found[target.dsid] for target in self.targets.values()
+                if self._needs_regeneration(pid, found.get(target.dsid), target)]
 
-    def _regenerate_ocr(self, pid: str) -> bool:
-        res = requests.get(f'{self.ocr_gen_url}/{pid}')
-        self.logger.debug(f'Regenerate OCR response: {res.status_code}')
-        return 200 <= res.status_code < 400
+    def _regenerate_pid(self, pid: str, dsids: Sequence[str] = ('OCR',)) -> str:
+        """
+        Regenerate a pid's datastreams without checking them
+        :param pid: The pid to regenerate
+        :param dsids: The datastreams to regenerate
+        :return: The outcome from ocr.outcomes, or None if the pid is invalid
+        """
+        pid = pid.strip()
+        if self._validate_pid(pid):
+            return self._regenerate(pid, dsids=dsids)
+
+    def _needs_regeneration(self, pid: str, ocr, target: Target = None) -> bool:
+        with DECISION_SECONDS.time():
+            return self._is_stale(pid, ocr, target)
+
+    def _is_stale(self, pid: str, ocr, target: Target = None) -> bool:
+        dsid = target.dsid if target is not None else 'OCR'
+        if ocr is not None:
+            self.logger.debug(f'{dsid} for {pid} is {ocr.created_date}')
+            if ocr.get_created_date() < self._cutoff(target):
+                return True
+            self.logger.info(f'{dsid} for {pid} is up to date')
+        else:
+            self.logger.info(f'No {dsid} datastream for {pid}')
+        return False
+
+    def _cutoff(self, target: Target = None) -> datetime:
+        """ The date a target's datastream must be created after to be up to date """
+        if target is not None and target.check_before is not None:
+            return target.check_before
+        return self.check_before
+
+    def _regenerate(self, pid: str, datastreams: list = None, dsids: Sequence[str] = None):
+        """
+        Regenerate a pid's datastreams, through the scheduler or dispatcher if there is one, or add them to the plan
+        when scanning
+        :param pid: The pid to regenerate
+        :param datastreams: The stale datastreams, if they were checked
+        :param dsids: The ids of the datastreams to regenerate if they were not checked
+        :return: The outcome, or None if the dispatcher will record it once the request completes
+        """
+        if datastreams:
+            dsids = tuple(datastream.dsid for datastream in datastreams)
+        dsids = tuple(dsids or ('OCR',))
+        if self.plan is not None and datastreams:
+            self.logger.info(f'Planning {", ".join(dsids)} regeneration for {pid}')
+            self.plan.add(pid, *datastreams)
+            return outcomes.PLANNED
+        if self.scheduler is not None and datastreams:
+            self.logger.debug(f'Scheduling {", ".join(dsids)} regeneration for {pid}')
+            self.scheduler.push(Regeneration(pid, dsids, min(ds.get_created_date() for ds in datastreams),
+                                             sum(max(ds.size, 0) for ds in datastreams)))
+            return None
+        self.logger.debug(f'Regenerating {", ".join(dsids)} for {pid}')
+        if self.dispatcher is not None:
+            self.dispatcher.submit(pid, dsids)
+            return None
+        return self._log_regeneration(pid, self._regenerate_ocr(pid, dsids), dsids)
+
+    def _regeneration_complete(self, pid: str, result: bool, dsids: Sequence[str] = ('OCR',)):
+        self._record_result(pid, self._log_regeneration(pid, result, dsids))
+
+    def _log_regeneration(self, pid: str, result: bool, dsids: Sequence[str] = ('OCR',)) -> str:
+        if result:
+            self.logger.info(f'Regenerated {", ".join(dsids)} for {pid}')
+            return outcomes.REGENERATED
+        self.logger.error(f'Failed to regenerate {", ".join(dsids)} for {pid}')
+        return outcomes.FAILED
+
+    def _regenerate_ocr(self, pid: str, dsids: Sequence[str] = ('OCR',)) -> bool:
+        """ Request each datastream's regeneration, returning whether they all succeeded """
+        succeeded = True
+        for dsid in dsids:
+            with REGENERATION_SECONDS.time():
+                res = self.session.get(f'{self._regeneration_url(dsid)}/{pid}')
+            self.logger.debug(f'Regenerate {dsid} response: {res.status_code}')
+            succeeded = succeeded and 200 <= res.status_code < 400
+        return succeeded
+
+    def _regeneration_url(self, dsid: str) -> str:
+        target = self.targets.get(dsid)
+        return target.url if target is not None else self.ocr_gen_url
+
+    def _create_session(self):
+        transport = dict(self.transport)
+        transport['pool_size'] = max(transport.get('pool_size', 10), self.workers + (self.max_in_flight or 0))
+        return create_session(transport)
+
+    @staticmethod
+    def _fedora_date(date: datetime) -> str:
+        return date.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    @staticmethod
+    def _is_pid_file(path: str) -> bool:
+        return path == '-' or os.path.exists(path)
 
     @staticmethod
     def _validate_pid(pid: str) -> bool:
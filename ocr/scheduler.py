@@ -0,0 +1,158 @@
+import heapq
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+from .targets import Regeneration
+
+EPOCH = datetime(1970, 1, 1)
+DAY = 86400
+MEGABYTE = 1024 * 1024
+
+
+class RegenerationScheduler:
+    """
+    Orders pending regenerations by the age of their oldest datastream, oldest first. Each megabyte to regenerate
+    counts as size_weight days older, and objects in a prioritised namespace as that namespace's days older. Up to
+    max_in_memory entries are kept in a heap, beyond that the lowest priority half is spilled to a temporary SQLite
+    file.
+
+    Iterating the scheduler takes the highest priority entry each time, blocking while it is empty until it is
+    closed, so checks can keep adding entries while another thread regenerates them.
+    """
+
+    def __init__(self, size_weight: float = 0, namespaces: Optional[Dict[str, float]] = None,
+                 max_in_memory: int = 100000, spill_directory: Optional[str] = None):
+        """
+        :param size_weight: Days of extra age per megabyte to regenerate, negative to regenerate small datastreams first
+        :param namespaces: Days of extra age for objects in each pid namespace
+        :param max_in_memory: The most entries kept in memory before spilling to disk
+        :param spill_directory: Where to create the spill file, the system temporary directory if not set
+        """
+        self.size_weight = size_weight
+        self.namespaces = namespaces or {}
+        self.max_in_memory = max(2, max_in_memory)
+        self.spill_directory = spill_directory
+        self._heap = []
+        self._sequence = 0
+        self._spilled = 0
+        self._spilled_best = None
+        self._spill = None
+        self._spill_path = None
+        self._closed = False
+        self._abandoned = False
+        self._changed = threading.Condition()
+
+    def priority(self, regeneration: Regeneration) -> float:
+        """
+        The sort key of a regeneration, lower goes first
+        :param regeneration: The regeneration
+        :return: Its oldest datastream's creation time in seconds, moved earlier by the size and namespace weights
+        """
+        days = (self.size_weight * max(regeneration.size, 0) / MEGABYTE +
+                self.namespaces.get(regeneration.pid.split(':', 1)[0], 0))
+        return (regeneration.created_date - EPOCH).total_seconds() - days * DAY
+
+    def push(self, regeneration: Regeneration):
+        """ Add a pending regeneration """
+        with self._changed:
+            self._sequence += 1
+            heapq.heappush(self._heap, (self.priority(regeneration), self._sequence, regeneration))
+            if len(self._heap) > self.max_in_memory:
+                self._spill_half()
+            self._changed.notify()
+
+    def pop(self) -> Optional[Regeneration]:
+        """ Take the highest priority regeneration, or None if there are none """
+        with self._changed:
+            return self._pop()
+
+    def _pop(self) -> Optional[Regeneration]:
+        if self._spilled and (not self._heap or self._spilled_best < self._heap[0][:2]):
+            self._load_best()
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[2]
+
+    def _spill_half(self):
+        self._heap.sort()
+        keep = len(self._heap) // 2
+        spilled = self._heap[keep:]
+        self._heap = self._heap[:keep]
+        # A sorted list is already a heap
+        if self._spill is None:
+            handle, self._spill_path = tempfile.mkstemp(prefix='ocr-schedule-', suffix='.sqlite',
+                                                        dir=self.spill_directory)
+            os.close(handle)
+            self._spill = sqlite3.connect(self._spill_path, check_same_thread=False)
+            self._spill.execute('PRAGMA journal_mode=OFF')
+            self._spill.execute('PRAGMA synchronous=OFF')
+            self._spill.execute('CREATE TABLE pending (priority REAL NOT NULL, sequence INTEGER NOT NULL, pid TEXT, '
+                                'dsids TEXT, created TEXT, size INTEGER)')
+            self._spill.execute('CREATE INDEX pending_order ON pending (priority, sequence)')
+        self._spill.executemany(
+            'INSERT INTO pending VALUES (?, ?, ?, ?, ?, ?)',
+            [(priority, sequence, regeneration.pid, ','.join(regeneration.dsids),
+              regeneration.created_date.isoformat(), regeneration.size)
+             for priority, sequence, regeneration in spilled]
+        )
+        self._spill.commit()
+        self._spilled += len(spilled)
+        if self._spilled_best is None or spilled[0][:2] < self._spilled_best:
+            self._spilled_best = spilled[0][:2]
+
+    def _load_best(self):
+        """ Move the best spilled entries back into memory, enough to fill half of it """
+        rows = self._spill.execute(
+            'SELECT rowid, priority, sequence, pid, dsids, created, size FROM pending '
+            'ORDER BY priority, sequence LIMIT ?',
+            (max(1, self.max_in_memory // 2),)
+        ).fetchall()
+        self._spill.executemany('DELETE FROM pending WHERE rowid = ?', [(row[0],) for row in rows])
+        self._spill.commit()
+        self._spilled -= len(rows)
+        for _, priority, sequence, pid, dsids, created, size in rows:
+            regeneration = Regeneration(pid, tuple(dsids.split(',')), datetime.fromisoformat(created), size)
+            heapq.heappush(self._heap, (priority, sequence, regeneration))
+        best = self._spill.execute(
+            'SELECT priority, sequence FROM pending ORDER BY priority, sequence LIMIT 1'
+        ).fetchone()
+        self._spilled_best = tuple(best) if best is not None else None
+        if len(self._heap) > self.max_in_memory:
+            self._spill_half()
+
+    def __len__(self):
+        with self._changed:
+            return len(self._heap) + self._spilled
+
+    def close(self, discard: bool = False):
+        """
+        Stop accepting entries, iteration ends once those already added are taken
+        :param discard: End iteration straight away, leaving any pending entries
+        """
+        with self._changed:
+            self._closed = True
+            self._abandoned = self._abandoned or discard
+            self._changed.notify_all()
+
+    def __iter__(self) -> Iterator[Regeneration]:
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: self._heap or self._spilled or self._closed)
+                if self._abandoned:
+                    return
+                regeneration = self._pop()
+            if regeneration is None:
+                return
+            yield regeneration
+
+    def __del__(self):
+        try:
+            if self._spill is not None:
+                self._spill.close()
+                os.unlink(self._spill_path)
+        except (AttributeError, OSError):
+            pass
@@ -0,0 +1,51 @@
+import os
+import re
+import zlib
+from typing import Iterable, Iterator
+
+
+class Shard:
+    """
+    One of count stable partitions of the pid space. A pid always hashes to the same shard, so every node can read
+    the same input and process only its share.
+    """
+
+    def __init__(self, number: int, count: int):
+        """
+        :param number: The shard to keep, from 1 to count
+        :param count: The number of shards
+        """
+        if count < 1 or not 1 <= number <= count:
+            raise ValueError(f'Shard must be between 1 and the shard count, got {number}/{count}')
+        self.number = number
+        self.count = count
+
+    @staticmethod
+    def parse(text: str) -> 'Shard':
+        """
+        :param text: A shard as K/N, like 2/4
+        :return: The shard
+        """
+        match = re.match(r'^\s*(\d+)\s*/\s*(\d+)\s*$', text)
+        if match is None:
+            raise ValueError(f'Shard must look like K/N, got {text}')
+        return Shard(int(match.group(1)), int(match.group(2)))
+
+    def __str__(self):
+        return f'{self.number}/{self.count}'
+
+    def contains(self, pid: str) -> bool:
+        return zlib.crc32(pid.strip().encode('utf-8')) % self.count == self.number - 1
+
+    def filter(self, pids: Iterable[str]) -> Iterator[str]:
+        """ Lazily keep the pids in this shard """
+        return (pid for pid in pids if self.contains(pid))
+
+    def path(self, path: str) -> str:
+        """
+        Name a file for this shard, so shards sharing a directory don't share a journal or plan
+        :param path: The file, like progress.sqlite
+        :return: The shard's file, like progress.2-of-4.sqlite
+        """
+        root, extension = os.path.splitext(path)
+        return f'{root}.{self.number}-of-{self.count}{extension}'
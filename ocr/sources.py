@@ -0,0 +1,91 @@
+import bz2
+import gzip
+import lzma
+import queue
+import sys
+import threading
+from typing import Iterable, Iterator
+
+OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+
+def read_pids(path: str) -> Iterator[str]:
+    """
+    Lazily read pids from a file, one per line
+    :param path: The file to read, '-' for stdin. Files ending in .gz, .bz2 or .xz are decompressed as they are read
+    :return: An iterator of pids, blank lines are skipped
+    """
+    if path == '-':
+        yield from _strip_lines(sys.stdin)
+        return
+    with open_text(path) as f:
+        yield from _strip_lines(f)
+
+
+def open_text(path: str, mode: str = 'rt'):
+    """
+    Open a text file, compressing or decompressing it if it ends in .gz, .bz2 or .xz
+    :param path: The file
+    :param mode: The mode to open it in, rt, wt or at
+    :return: The file object
+    """
+    return OPENERS.get(_suffix(path), open)(path, mode)
+
+
+def prefetch(items: Iterable, size: int = 1000) -> Iterator:
+    """
+    Read items on a background thread, up to size ahead of the consumer, so a slow source like a paged query
+    overlaps with the work done on what it has already returned
+    :param items: The items, they are read from another thread
+    :param size: The most items to read ahead
+    :return: An iterator of the items, raising any error reading them once the items before it are consumed
+    """
+    buffer = queue.Queue(maxsize=size)
+    stopped = threading.Event()
+    end = object()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fill():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((end, e))
+
+    threading.Thread(target=fill, name='prefetch', daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is end:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stopped.set()
+
+
+def _strip_lines(lines) -> Iterator[str]:
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _suffix(path: str) -> str:
+    dot = path.rfind('.')
+    return path[dot:].lower() if dot >= 0 else ''
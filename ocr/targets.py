@@ -0,0 +1,49 @@
+from collections import namedtuple
+from datetime import date, datetime
+from typing import Dict, Optional
+
+Target = namedtuple('Target', ['dsid', 'url', 'check_before'])
+Target.__doc__ = """
+A derivative datastream to keep fresh
+:param dsid: The id of the datastream, like OCR or HOCR
+:param url: The endpoint its regeneration is requested from, with the pid appended
+:param check_before: Regenerate it if it was created before this date, None to use the run's date
+"""
+
+Regeneration = namedtuple('Regeneration', ['pid', 'dsids', 'created_date', 'size'])
+Regeneration.__doc__ = """
+The stale datastreams of one object
+:param pid: The pid of the object
+:param dsids: The ids of the datastreams to regenerate
+:param created_date: When the oldest of them was created, None if they were found without checking them
+:param size: Their total size in bytes
+"""
+
+
+def read_targets(config: dict) -> Dict[str, Target]:
+    """
+    Read the datastreams to check from the regenerator configuration. Without a targets list only OCR is checked,
+    regenerated from the regenerator url.
+    :param config: The regenerator configuration
+    :return: The targets keyed by datastream id, in the configured order
+    """
+    url = config['url'].strip().rstrip('/')
+    targets = config.get('targets')
+    if targets is None:
+        return {'OCR': Target('OCR', url, None)}
+    if not targets:
+        raise ValueError('At least one target datastream is required')
+    return {
+        target['dsid']: Target(target['dsid'], target.get('url', url).strip().rstrip('/'),
+                               _parse_date(target.get('check_before')))
+        for target in targets
+    }
+
+
+def _parse_date(value) -> Optional[datetime]:
+    # YAML reads unquoted dates as dates
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value))
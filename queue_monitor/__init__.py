@@ -1 +1,2 @@
-from .activemq_client import QueueMonitor
\ No newline at end of file
+from .activemq_client import QueueMonitor
+from .throughput import ThroughputController
\ No newline at end of file
@@ -1,19 +1,89 @@
+import threading
+import time
+from typing import Dict, Union
+from urllib.parse import urlparse
+
 from local_activemq_api_client.client import ActiveMQClient
+from local_activemq_api_client.jolokia import JolokiaActiveMQClient
+from local_activemq_api_client.stomp import StompActiveMQClient
+from metrics import REGISTRY
+
+QUEUE_CHECK_SECONDS = REGISTRY.histogram('ocr_regen_queue_check_seconds',
+                                         'Time spent fetching queue statistics from the broker')
+QUEUE_CHECKS = REGISTRY.counter('ocr_regen_queue_checks_total', 'Queue statistics lookups', ('cached',))
+BACKPRESSURE_SECONDS = REGISTRY.counter('ocr_regen_backpressure_sleep_seconds_total',
+                                        'Time spent sleeping on queue backpressure', ('reason',))
 
 class QueueMonitor:
-    def __init__(self, config: dict):
+    def __init__(self, config: dict, transport: dict = None):
         self.config = config
         self.max_queue_size = config.get('max_queue_size', 100)
         self.queues = config.get('queue_name', [])
-        # Create an ActiveMQClient instance
-        self.client = ActiveMQClient(config['host'], config['username'], config['password'])
+        if isinstance(self.queues, str):
+            self.queues = [self.queues]
+        # Seconds a snapshot of the queue statistics is reused for
+        self.cache_ttl = config.get('cache_ttl', 0)
+        self._snapshot = None
+        self._snapshot_time = 0
+        self._snapshot_lock = threading.Lock()
+        # Create an ActiveMQClient instance for the configured backend
+        self.client = self._create_client(config, transport)
+        if isinstance(self.client, StompActiveMQClient):
+            # The statistics are already held locally, reusing them would only delay seeing new ones
+            self.cache_ttl = 0
+
+    def _create_client(self, config: dict, transport: dict = None) -> ActiveMQClient:
+        backend = config.get('backend', 'xml')
+        if backend == 'xml':
+            return ActiveMQClient(config['host'], config['username'], config['password'], transport=transport)
+        if backend == 'jolokia':
+            return JolokiaActiveMQClient(config['host'], config['username'], config['password'], transport=transport,
+                                         broker_name=config.get('broker_name', 'localhost'),
+                                         queue_names=self.queues or None)
+        if backend == 'stomp':
+            client = StompActiveMQClient(config.get('stomp_host', urlparse(config['host']).hostname or config['host']),
+                                         config.get('stomp_port', 61613), config['username'], config['password'],
+                                         self.queues, interval=config.get('stats_interval', 1.0))
+            client.start()
+            return client
+        raise ValueError(f'Unknown queue monitor backend {backend}')
+
+    def get_snapshot(self) -> Dict[str, dict]:
+        """ Get the statistics of every queue, fetched at most once per cache_ttl seconds """
+        with self._snapshot_lock:
+            now = time.monotonic()
+            if self._snapshot is None or now - self._snapshot_time >= self.cache_ttl:
+                QUEUE_CHECKS.labels(cached='false').inc()
+                with QUEUE_CHECK_SECONDS.time():
+                    self._snapshot = self.client.get_queues_snapshot()
+                self._snapshot_time = now
+            else:
+                QUEUE_CHECKS.labels(cached='true').inc()
+            return self._snapshot
+
+    def get_queue_size(self, queue: str) -> Union[int, None]:
+        details = self.get_snapshot().get(queue)
+        return details['size'] if details is not None else None
 
     def queue_size_too_large(self):
         """ Get the number of messages in the queue and if too large return True """
+        snapshot = self.get_snapshot()
         for queue in self.queues:
-            if self.client.get_queue_size(queue) > self.max_queue_size:
+            details = snapshot.get(queue)
+            if details is not None and details['size'] > self.max_queue_size:
                 return True
         return False
 
+    def wait_for_change(self, timeout: float):
+        """
+        Wait for the queue statistics to change, for at most timeout seconds. Backends that are pushed statistics
+        return as soon as new ones arrive, others sleep the whole timeout.
+        """
+        wait_for_update = getattr(self.client, 'wait_for_update', None)
+        if wait_for_update is None:
+            time.sleep(timeout)
+        else:
+            wait_for_update(timeout)
+
     def close(self):
         self.client.close()
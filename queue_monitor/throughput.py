@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+
+from metrics import REGISTRY
+from .activemq_client import QueueMonitor, BACKPRESSURE_SECONDS
+
+
+class ThroughputController:
+    """
+    Paces pid submission to keep the monitored queues near a target depth.
+
+    Each reading of the queues' enqueue and dequeue counts gives the rate the derivative workers are draining them
+    and the number of messages each submitted pid produces. The submit rate is set so that the expected inflow
+    matches the drain rate plus whatever closes the gap to target_depth over horizon seconds. Submission stops while
+    any queue is over the monitor's max_queue_size.
+
+    When several nodes feed the same queues each is given a share of the rate. Its own submissions are taken to be
+    that share of everyone's when estimating the messages each pid produces.
+    """
+
+    def __init__(self, monitor: QueueMonitor, config: dict, max_concurrency: int = 1):
+        """
+        :param monitor: The monitor to read queue statistics from
+        :param config: The adaptive settings, all optional:
+            target_depth: The combined queue depth to aim for (default half of max_queue_size)
+            min_rate: The lowest submit rate in pids per second while under max_queue_size (default 0.1)
+            max_rate: The highest submit rate in pids per second (default 100)
+            initial_rate: The submit rate before the first drain estimate (default min_rate)
+            interval: Seconds between queue readings (default 5)
+            horizon: Seconds over which to close the gap to target_depth (default 30)
+            smoothing: Weight of the newest reading in the moving averages, 0 to 1 (default 0.5)
+        :param max_concurrency: The most pids to check at once, the concurrency is scaled with the rate
+        """
+        self.monitor = monitor
+        self.target_depth = config.get('target_depth', monitor.max_queue_size / 2)
+        self.min_rate = config.get('min_rate', 0.1)
+        self.max_rate = config.get('max_rate', 100)
+        self.interval = config.get('interval', 5)
+        self.horizon = config.get('horizon', 30)
+        self.smoothing = config.get('smoothing', 0.5)
+        self.max_concurrency = max_concurrency
+        # The fraction of the submit rate this node takes when others feed the same queues
+        self.share = 1.0
+        self.drain_rate = None
+        self.messages_per_pid = 1.0
+        self.depth = None
+        self._rate = config.get('initial_rate', self.min_rate)
+        self._last_reading = None
+        self._submitted = 0
+        self._next_submit = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        REGISTRY.gauge('ocr_regen_submit_rate', 'The adaptive submit rate in pids per second',
+                       function=lambda: self.rate)
+        REGISTRY.gauge('ocr_regen_submit_concurrency', 'The adaptive number of pids checked at once',
+                       function=lambda: self.concurrency)
+
+    @property
+    def rate(self) -> float:
+        """ The current submit rate in pids per second, 0 while the queues are over max_queue_size """
+        return self._rate
+
+    @property
+    def concurrency(self) -> int:
+        """ The number of pids to check at once at the current rate """
+        if self.max_rate <= 0:
+            return self.max_concurrency
+        return max(1, min(self.max_concurrency, round(self.max_concurrency * self._rate / self.max_rate)))
+
+    def acquire(self):
+        """ Block until the next pid may be submitted """
+        delay = self.reserve()
+        while delay is None:
+            BACKPRESSURE_SECONDS.labels(reason='queue_full').inc(self.interval)
+            time.sleep(self.interval)
+            delay = self.reserve()
+        if delay > 0:
+            BACKPRESSURE_SECONDS.labels(reason='paced').inc(delay)
+            time.sleep(delay)
+
+    def reserve(self):
+        """
+        Reserve the next submission slot without sleeping
+        :return: Seconds to wait before submitting, or None if nothing may be submitted now and the caller should
+        try again after interval seconds
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._last_reading is None or now - self._last_reading[0] >= self.interval:
+                self._update(now)
+            if self._rate <= 0:
+                return None
+            submit_at = max(now, self._next_submit)
+            self._next_submit = submit_at + 1 / self._rate
+            self._submitted += 1
+            return submit_at - now
+
+    def _update(self, now: float):
+        snapshot = self.monitor.get_snapshot()
+        queues = [snapshot[queue] for queue in self.monitor.queues if queue in snapshot]
+        depth = sum(queue['size'] for queue in queues)
+        enqueued = sum(queue['enqueueCount'] for queue in queues)
+        dequeued = sum(queue['dequeueCount'] for queue in queues)
+        if self._last_reading is not None:
+            last_time, last_enqueued, last_dequeued, last_submitted = self._last_reading
+            elapsed = now - last_time
+            if elapsed > 0:
+                self.drain_rate = self._average(self.drain_rate, max(0, dequeued - last_dequeued) / elapsed)
+            submitted = (self._submitted - last_submitted) / self.share
+            if submitted > 0:
+                self.messages_per_pid = self._average(self.messages_per_pid, max(0, enqueued - last_enqueued) / submitted)
+        self._last_reading = (now, enqueued, dequeued, self._submitted)
+        self.depth = depth
+
+        if any(queue['size'] > self.monitor.max_queue_size for queue in queues):
+            self._rate = 0
+        elif self.drain_rate is not None:
+            wanted_inflow = self.drain_rate + (self.target_depth - depth) / self.horizon
+            rate = wanted_inflow / max(self.messages_per_pid, 0.01) * self.share
+            self._rate = min(self.max_rate, max(self.min_rate, rate))
+        else:
+            self._rate = max(self._rate, self.min_rate)
+        self.logger.info(f'Queue depth {depth}, drain rate {self.drain_rate or 0:.2f}/s, submit rate {self._rate:.2f}/s, '
+                         f'concurrency {self.concurrency}')
+
+    def _average(self, current, reading):
+        if current is None:
+            return reading
+        return self.smoothing * reading + (1 - self.smoothing) * current
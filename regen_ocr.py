@@ -2,26 +2,166 @@
 
 import argparse
 import logging
+import signal
+import sys
 from datetime import datetime
 import yaml
 
+from metrics import TextfileWriter, start_http_server
 from ocr import OcrRegenerator
+from ocr.journal import ProgressJournal
+from ocr.plan import PlanWriter
+from ocr.profiling import RunProfiler
+from ocr.sharding import Shard
+
+
+def parse_date(date):
+    return datetime.strptime(date, '%Y-%m-%d') if date is not None else None
+
+
+def serve(daemon):
+    # Finish the PIDs already queued before exiting
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    daemon.run()
 
 
 def main():
     parser = argparse.ArgumentParser(description='Check OCR and regen if older than specified date')
     parser.add_argument('-c', '--config', type=str, help='The configuration file to use', required=True)
-    parser.add_argument('-d', '--date', type=str, help='The date to check against', required=True)
+    parser.add_argument('-d', '--date', type=str, help='The date to check against, required unless using --dispatch')
     parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose logging')
-    parser.add_argument('pid_or_file', type=str, help='The PID or file of PIDs to check')
+    parser.add_argument('-w', '--workers', type=int, help='Number of PIDs to check concurrently')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='Check PIDs with asyncio on a single thread, --workers sets the number in flight')
+    parser.add_argument('-j', '--journal', type=str, help='SQLite file to record the outcome of each PID in')
+    parser.add_argument('--resume', action='store_true', help='Skip PIDs the journal has already finished')
+    parser.add_argument('--discover', action='store_true',
+                        help='Find objects whose target datastreams are older than --date, or their own check_before, '
+                             'with the Resource Index and regenerate them without checking each one')
+    parser.add_argument('--find-objects', type=str, metavar='PATTERN',
+                        help='Check every object whose PID matches this findObjects pattern, like uofm:*')
+    parser.add_argument('--modified-before', type=str, metavar='DATE',
+                        help='With --find-objects, only check objects last modified before this date')
+    parser.add_argument('--modified-after', type=str, metavar='DATE',
+                        help='With --find-objects, only check objects last modified on or after this date')
+    parser.add_argument('--serve', action='store_true',
+                        help='Keep running and check PIDs as they arrive from the sources in the daemon configuration')
+    parser.add_argument('--members', action='store_true',
+                        help='Treat the PIDs given as books, newspaper issues or other compound objects and check their '
+                             'pages and other members instead')
+    parser.add_argument('--page-size', type=int, default=10000,
+                        help='Results per Resource Index or findObjects query')
+    parser.add_argument('--scan-only', type=str, metavar='PLAN',
+                        help='Check the PIDs and write the ones needing regeneration to this plan file instead of '
+                             'regenerating them')
+    parser.add_argument('--dispatch', type=str, metavar='PLAN',
+                        help='Regenerate every PID in a plan file written by --scan-only without checking them again')
+    parser.add_argument('--shard', type=str, metavar='K/N',
+                        help='Only process the PIDs that hash to shard K of N, so N nodes can share one input. The '
+                             'journal and plan file names get a .K-of-N suffix')
+    parser.add_argument('--metrics-file', type=str, metavar='PATH',
+                        help='Write Prometheus metrics to this file for the node_exporter textfile collector')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='Serve Prometheus metrics at http://127.0.0.1:PORT/metrics while running')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile CPU and memory use, writing a .prof file and a .txt report by module at exit')
+    parser.add_argument('--profile-output', type=str, default='ocr_regen_profile', metavar='PATH',
+                        help='With --profile, write PATH.prof and PATH.txt (default ocr_regen_profile)')
+    parser.add_argument('pid_or_file', type=str, nargs='?',
+                        help='The PID or file of PIDs to check, - to read from stdin. .gz, .bz2 and .xz files are '
+                             'decompressed')
     args = parser.parse_args()
+    if args.resume and args.journal is None:
+        parser.error('--resume requires --journal')
+    sources = [args.pid_or_file is not None, args.discover, args.dispatch is not None, args.find_objects is not None,
+               args.serve]
+    if sources.count(True) != 1:
+        parser.error('Provide either a PID or file of PIDs, --discover, --dispatch, --find-objects or --serve')
+    if args.serve and args.use_async:
+        parser.error('--serve checks PIDs with threads, use --workers instead of --async')
+    if args.scan_only is not None and args.pid_or_file is None:
+        parser.error('--scan-only requires a PID or file of PIDs')
+    if args.members and args.pid_or_file is None:
+        parser.error('--members requires a PID or file of PIDs')
+    if args.find_objects is None and (args.modified_before is not None or args.modified_after is not None):
+        parser.error('--modified-before and --modified-after require --find-objects')
+    if args.date is None and args.dispatch is None:
+        parser.error('--date is required')
+    if args.workers is not None and args.workers < 1:
+        parser.error('--workers must be a positive integer')
+    shard = None
+    if args.shard is not None:
+        try:
+            shard = Shard.parse(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
     with open(args.config, 'r') as f:
         config = yaml.safe_load(f)
-    check_before = datetime.strptime(args.date, '%Y-%m-%d')
-    regen = OcrRegenerator(config, check_before)
+    check_before = parse_date(args.date) or datetime.now()
+    if args.use_async:
+        from ocr.async_regenerator import AsyncOcrRegenerator
+        regen = AsyncOcrRegenerator(config, check_before)
+    else:
+        regen = OcrRegenerator(config, check_before)
     if args.verbose:
         regen.set_logging_level(logging.DEBUG)
-    regen.check(args.pid_or_file)
+    if args.workers is not None:
+        regen.set_workers(args.workers)
+    if shard is not None:
+        regen.set_shard(shard)
+    daemon = None
+    if args.serve:
+        from ocr.daemon import RegenerationDaemon
+        try:
+            daemon = RegenerationDaemon(regen, config.get('daemon') or {})
+        except ValueError as e:
+            parser.error(str(e))
+    journal = None
+    if args.journal is not None:
+        journal_path = shard.path(args.journal) if shard is not None else args.journal
+        journal = ProgressJournal(journal_path, config['regenerator'].get('journal_batch_size', 1000))
+        regen.set_journal(journal, args.resume)
+    metrics_writer = None
+    if args.metrics_file is not None:
+        metrics_writer = TextfileWriter(args.metrics_file)
+        metrics_writer.start()
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = start_http_server(args.metrics_port)
+    profiler = None
+    if args.profile:
+        profiler = RunProfiler(args.profile_output)
+        profiler.start()
+    try:
+        if args.serve:
+            serve(daemon)
+        elif args.discover:
+            regen.regenerate_stale(args.page_size)
+        elif args.find_objects is not None:
+            regen.check_objects(args.find_objects, parse_date(args.modified_before), parse_date(args.modified_after),
+                                args.page_size)
+        elif args.dispatch is not None:
+            regen.dispatch(args.dispatch)
+        elif args.scan_only is not None:
+            plan_path = shard.path(args.scan_only) if shard is not None else args.scan_only
+            regen.scan(args.pid_or_file, PlanWriter(plan_path, append=args.resume), args.members, args.page_size)
+        elif args.members:
+            regen.check_members(args.pid_or_file, args.page_size)
+        else:
+            regen.check(args.pid_or_file)
+    except KeyboardInterrupt:
+        print('Interrupted, exiting')
+        sys.exit(130)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            print(f'Wrote profile to {args.profile_output}.prof and {args.profile_output}.txt')
+        if journal is not None:
+            journal.close()
+        if metrics_writer is not None:
+            metrics_writer.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,165 @@
+import asyncio
+import copy
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from os.path import dirname
+from unittest import mock
+
+import aiohttp
+
+from ocr.async_regenerator import AsyncOcrRegenerator
+
+
+class MockResponse:
+    def __init__(self, content, status):
+        self.content = content
+        self.status = status
+
+    async def read(self):
+        return self.content
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(mock.Mock(), (), status=self.status)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+# This method will be used by the mock to replace aiohttp.ClientSession.get
+def mocked_get(*args, **kwargs):
+    if args[0] == 'http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml':
+        with open(dirname(__file__) + '/resources/datastream_profile.xml', 'rb') as f:
+            return MockResponse(f.read(), 200)
+    elif args[0] == 'http://localhost:8080/ocr/test:pid':
+        return MockResponse(None, 204)
+
+    return MockResponse(None, 404)
+
+
+class AsyncRegeneratorTest(unittest.TestCase):
+
+    config = {
+        'fedora': {
+            'url': 'http://localhost:8080/fcrepo/',
+            'username': 'user',
+            'password': 'pass'
+        },
+        'regenerator': {
+            'url': 'http://localhost:8080/ocr',
+            'batch_size': 2,
+            'workers': 4
+        },
+        'queue_monitor': {
+            'host': 'localhost',
+            'username': 'user',
+            'password': 'pass',
+            'queue_name': 'queue'
+        }
+    }
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('aiohttp.ClientSession.get', side_effect=mocked_get)
+    def test_single_pid(self, mock_get, mock_queue):
+        regen = AsyncOcrRegenerator(self.config, datetime.now())
+        regen.check('test:pid')
+        self.assertEqual(
+            'http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml',
+            mock_get.call_args_list[0].args[0]
+        )
+        self.assertEqual('http://localhost:8080/ocr/test:pid', mock_get.call_args_list[1].args[0])
+        self.assertEqual(1, regen.stats['checked'])
+        self.assertEqual(1, regen.stats['regenerated'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('aiohttp.ClientSession.get', side_effect=mocked_get)
+    def test_file_old(self, mock_get, mock_queue):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('test:pid\n' * 5)
+            f.write('other:pid\n')
+        try:
+            regen = AsyncOcrRegenerator(self.config, datetime.strptime('2010-01-01', '%Y-%m-%d'))
+            regen.check(f.name)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(6, regen.stats['checked'])
+        self.assertEqual(5, regen.stats['up_to_date'])
+        self.assertEqual(1, regen.stats['no_ocr'])
+        self.assertEqual(0, regen.stats['regenerated'])
+        self.assertEqual(6, len(mock_get.call_args_list))
+        self.assertEqual(3, len(mock_queue.call_args_list))
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('aiohttp.ClientSession.get')
+    def test_fedora_error(self, mock_get, mock_queue):
+        def get(url, **kwargs):
+            if url == 'http://localhost:8080/fcrepo/objects/locked:pid/datastreams/OCR?format=xml':
+                return MockResponse(None, 401)
+            return mocked_get(url, **kwargs)
+
+        mock_get.side_effect = get
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('locked:pid\ntest:pid\nother:pid\n')
+        try:
+            regen = AsyncOcrRegenerator(self.config, datetime.now())
+            regen.check(f.name)
+        finally:
+            os.unlink(f.name)
+        # Only a 404 means the object has no OCR, the error fails that pid and the others are still checked
+        self.assertEqual(3, regen.stats['checked'])
+        self.assertEqual(1, regen.stats['failed'])
+        self.assertEqual(1, regen.stats['regenerated'])
+        self.assertEqual(1, regen.stats['no_ocr'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('aiohttp.ClientSession.get')
+    def test_retries_server_errors(self, mock_get, mock_queue):
+        mock_get.side_effect = [MockResponse(None, 503)] + [mocked_get(url) for url in [
+            'http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml',
+            'http://localhost:8080/ocr/test:pid'
+        ]]
+        regen = AsyncOcrRegenerator(self.config, datetime.now())
+        regen.check('test:pid')
+        self.assertEqual(3, len(mock_get.call_args_list))
+        self.assertEqual(1, regen.stats['regenerated'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('aiohttp.ClientSession.get')
+    def test_slow_regeneration_does_not_hold_checks(self, mock_get, mock_queue):
+        events = []
+
+        class SlowResponse(MockResponse):
+            async def __aenter__(self):
+                await asyncio.sleep(0.05)
+                events.append('regenerated')
+                return self
+
+        def get(url, **kwargs):
+            if url.startswith('http://localhost:8080/ocr/'):
+                return SlowResponse(None, 204)
+            events.append('checked')
+            return mocked_get('http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml')
+
+        mock_get.side_effect = get
+        config = copy.deepcopy(self.config)
+        config['regenerator'].update({'workers': 1, 'max_in_flight': 4})
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write(''.join(f'test:{n}\n' for n in range(4)))
+        try:
+            regen = AsyncOcrRegenerator(config, datetime.now())
+            regen.check(f.name)
+        finally:
+            os.unlink(f.name)
+        # Every check finishes before the first regeneration does
+        self.assertEqual(['checked'] * 4 + ['regenerated'] * 4, events)
+        self.assertEqual(4, regen.stats['regenerated'])
+        self.assertEqual(4, regen.stats['checked'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from benchmarks.run import percentile, run_benchmark
+from benchmarks.standins import ActiveMQStandIn, Broker, FedoraStandIn
+from fedora import FedoraClient
+from local_activemq_api_client.client import ActiveMQClient
+
+
+class StandInTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fedora = FedoraStandIn(10, datastreams=5, stale_every=2, no_ocr_every=5).start()
+        self.addCleanup(self.fedora.stop)
+        self.client = FedoraClient(self.fedora.url + '/fedora', 'user', 'pass')
+
+    def test_profile(self):
+        stale = self.client.get_datastream_profile('bench:2', 'OCR')
+        self.assertEqual('OCR', stale.dsid)
+        self.assertEqual(2000, stale.created_date.year)
+        self.assertEqual(2030, self.client.get_datastream_profile('bench:3', 'OCR').created_date.year)
+        self.assertIsNone(self.client.get_datastream_profile('bench:5', 'OCR'))
+        self.assertIsNone(self.client.get_datastream_profile('bench:10', 'OCR'))
+
+    def test_listing(self):
+        self.assertEqual(['DS0', 'DS1', 'DS2', 'DS3', 'OCR'], [ds.dsid for ds in self.client.list_datastreams('bench:1')])
+        self.assertEqual(5, len(self.client.list_datastreams('bench:5', profiles=True)))
+        self.assertIsNone(self.client.find_datastream('bench:5', 'OCR'))
+
+    def test_queue(self):
+        broker = Broker('fedora', messages_per_pid=3, drain_rate=0)
+        activemq = ActiveMQStandIn(broker).start()
+        self.addCleanup(activemq.stop)
+        broker.enqueue()
+        queues = ActiveMQClient(activemq.url, 'admin', 'admin').get_queues_snapshot()
+        self.assertEqual(3, queues['fedora']['size'])
+
+
+class BenchmarkTest(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(50, percentile(values, 50))
+        self.assertEqual(99, percentile(values, 99))
+        self.assertEqual(0, percentile([], 50))
+
+    def test_run(self):
+        results = run_benchmark({'objects': 40}, workers=4)
+        self.assertEqual(40, results['pids'])
+        self.assertEqual({'checked': 40, 'skipped': 0, 'regenerated': 16, 'failed': 0, 'up_to_date': 20, 'no_ocr': 4,
+                          'planned': 0}, results['stats'])
+        self.assertEqual(16, results['requests']['gatekeeper'])
+        self.assertGreater(results['pids_per_second'], 0)
+        self.assertLessEqual(results['p50_ms'], results['p99_ms'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.request
+from unittest import mock
+
+from local_activemq_api_client.client import ActiveMQClient
+from ocr.daemon import HttpSource, PidFeed, QueueSource, RegenerationDaemon, SpoolSource
+
+
+def post(port, body):
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/', data=body.encode('utf-8'), method='POST')
+    with urllib.request.urlopen(request) as response:
+        return response.status, json.loads(response.read())
+
+
+class PidFeedTest(unittest.TestCase):
+
+    def test_iterates_until_closed(self):
+        feed = PidFeed()
+        self.assertEqual(2, feed.put(['test:1', ' test:2\n', '']))
+        feed.close()
+        self.assertEqual(['test:1', 'test:2'], list(feed))
+        self.assertEqual(0, feed.put(['test:3']))
+
+    def test_blocks_for_more(self):
+        feed = PidFeed()
+        pids = iter(feed)
+        threading.Timer(0.1, feed.put, (['test:1'],)).start()
+        self.assertEqual('test:1', next(pids))
+        feed.close()
+        self.assertEqual([], list(pids))
+
+
+class SourcesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.feed = PidFeed()
+
+    def test_http(self):
+        source = HttpSource(self.feed, port=0, status=lambda: {'checked': 3})
+        source.start()
+        try:
+            self.assertEqual((202, {'accepted': 3}), post(source.port, 'test:1\ntest:2 test:3\n'))
+            with urllib.request.urlopen(f'http://127.0.0.1:{source.port}/status') as response:
+                self.assertEqual({'queued': 3, 'checked': 3}, json.loads(response.read()))
+        finally:
+            source.stop()
+        self.feed.close()
+        self.assertEqual(['test:1', 'test:2', 'test:3'], list(self.feed))
+
+    def test_spool(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'batch.txt'), 'w') as f:
+                f.write('test:1\ntest:2\n')
+            with open(os.path.join(directory, '.partial.txt'), 'w') as f:
+                f.write('test:3\n')
+            source = SpoolSource(self.feed, directory)
+            self.assertTrue(source.poll())
+            self.assertFalse(source.poll())
+            self.assertTrue(os.path.exists(os.path.join(directory, 'processed', 'batch.txt')))
+            self.assertTrue(os.path.exists(os.path.join(directory, '.partial.txt')))
+        self.feed.close()
+        self.assertEqual(['test:1', 'test:2'], list(self.feed))
+
+    def test_queue(self):
+        client = mock.Mock()
+        client.consume_message.side_effect = ['test:1\ntest:2', None]
+        source = QueueSource(self.feed, client, 'ocr', timeout=2)
+        self.assertTrue(source.poll())
+        self.assertTrue(source.poll())
+        client.consume_message.assert_called_with('ocr', 2)
+        self.feed.close()
+        self.assertEqual(['test:1', 'test:2'], list(self.feed))
+
+
+class ConsumeMessageTest(unittest.TestCase):
+
+    @mock.patch('requests.Session.request')
+    def test_consume_message(self, mock_request):
+        mock_request.side_effect = [mock.Mock(status_code=200, content=b'test:1\n'),
+                                    mock.Mock(status_code=204, content=b'')]
+        client = ActiveMQClient('http://localhost:8161', 'admin', 'admin')
+        self.assertEqual('test:1\n', client.consume_message('ocr', 2))
+        self.assertIsNone(client.consume_message('ocr', 2))
+        self.assertEqual('http://localhost:8161/api/message/ocr', mock_request.call_args.args[1])
+        self.assertEqual({'type': 'queue', 'oneShot': 'true', 'readTimeout': 2000},
+                         mock_request.call_args.kwargs['params'])
+
+
+class RegenerationDaemonTest(unittest.TestCase):
+
+    def test_run(self):
+        checked = []
+        regenerator = mock.Mock(stats={'checked': 0})
+        regenerator.check_stream.side_effect = lambda pids: checked.extend(pids)
+        daemon = RegenerationDaemon(regenerator, {'listen': '127.0.0.1:0'})
+        runner = threading.Thread(target=daemon.run)
+        runner.start()
+        source = daemon.sources[0]
+        while source._server is None:
+            threading.Event().wait(0.01)
+        post(source.port, 'test:1 test:2')
+        daemon.stop()
+        runner.join(5)
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(['test:1', 'test:2'], checked)
+
+    def test_needs_source(self):
+        with self.assertRaises(ValueError):
+            RegenerationDaemon(mock.Mock(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import threading
+import unittest
+from unittest import mock
+
+from ocr.dispatcher import RegenerationDispatcher, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    @mock.patch('ocr.dispatcher.time.monotonic', return_value=100)
+    def test_reserve(self, mock_time):
+        bucket = TokenBucket(2, capacity=2)
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0.5, bucket.reserve())
+        self.assertEqual(1, bucket.reserve())
+        mock_time.return_value = 102
+        # Two seconds refill four tokens, paying off the debt of two
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0, bucket.reserve())
+        self.assertEqual(0.5, bucket.reserve())
+
+    def test_bad_rate(self):
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+
+class DispatcherTest(unittest.TestCase):
+
+    def test_window(self):
+        release = threading.Event()
+        running = []
+        results = {}
+        lock = threading.Lock()
+
+        def regenerate(pid):
+            with lock:
+                running.append(pid)
+            release.wait(5)
+            if pid == 'test:error':
+                raise ConnectionError()
+            return pid != 'test:fail'
+
+        def on_complete(pid, result):
+            with lock:
+                results[pid] = result
+
+        dispatcher = RegenerationDispatcher(regenerate, on_complete, max_in_flight=2)
+        dispatcher.submit('test:ok')
+        dispatcher.submit('test:fail')
+        blocked = threading.Thread(target=dispatcher.submit, args=('test:error',))
+        blocked.start()
+        blocked.join(0.2)
+        # The third submit waits for a slot
+        self.assertTrue(blocked.is_alive())
+        release.set()
+        blocked.join(5)
+        dispatcher.join()
+        self.assertEqual({'test:ok': True, 'test:fail': False, 'test:error': False}, results)
+        dispatcher.close()
+
+    def test_rate(self):
+        results = []
+        dispatcher = RegenerationDispatcher(lambda pid: True, lambda pid, result: results.append(pid),
+                                            max_in_flight=4, rate=1000)
+        with mock.patch.object(dispatcher.bucket, 'acquire') as mock_acquire:
+            for i in range(5):
+                dispatcher.submit(f'test:{i}')
+            dispatcher.join()
+        self.assertEqual(5, len(mock_acquire.call_args_list))
+        self.assertEqual(5, len(results))
+        dispatcher.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
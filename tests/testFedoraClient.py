@@ -1,10 +1,14 @@
 import unittest
+from datetime import datetime, timezone
 from os.path import dirname
 from unittest import mock
 
+import requests
+
 from fedora import FedoraClient
+from fedora.client import Datastream
 
-# This method will be used by the mock to replace requests.get
+# This method will be used by the mock to replace requests.Session.get
 def mocked_requests_get(*args, **kwargs):
     class MockResponse:
         def __init__(self, content, status_code):
@@ -17,6 +21,9 @@ def mocked_requests_get(*args, **kwargs):
     elif args[0] == 'http://localhost:8080/fcrepo/objects/test:pid/datastreams?format=xml&profiles=true':
         with open(dirname(__file__) + '/resources/list_datastreams_profile.xml', 'rb') as f:
             return MockResponse(f.read(), 200)
+    elif args[0] == 'http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml':
+        with open(dirname(__file__) + '/resources/datastream_profile.xml', 'rb') as f:
+            return MockResponse(f.read(), 200)
 
     return MockResponse(None, 404)
 
@@ -30,18 +37,162 @@ class FedoraClientTest(unittest.TestCase):
         client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
         self.assertIsNotNone(client)
 
-    @mock.patch('fedora.client.requests.get', side_effect=mocked_requests_get)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests_get)
     def test_list_datastreams(self, mock_get):
         client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
         datastreams = client.list_datastreams('test:pid')
         self.assertEqual(15, len(datastreams))
 
-    @mock.patch('fedora.client.requests.get', side_effect=mocked_requests_get)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests_get)
     def test_list_datastreams_profile(self, mock_get):
         client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
         datastreams = client.list_datastreams('test:pid', profiles=True)
         self.assertEqual(15, len(datastreams))
 
+    @mock.patch('requests.Session.get', side_effect=mocked_requests_get)
+    def test_list_datastreams_profile_fields(self, mock_get):
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        datastreams = {ds.dsid: ds for ds in client.list_datastreams('test:pid', profiles=True)}
+        mods = datastreams['MODS']
+        self.assertEqual('MODS Record', mods.label)
+        self.assertEqual(2, mods.version)
+        self.assertEqual('A', mods.state)
+        self.assertEqual('text/xml', mods.mimetype)
+        self.assertEqual(1096, mods.size)
+        self.assertEqual('M', mods.control_group)
+        self.assertEqual('uofm:1612084+MODS+MODS.2', mods.location)
+        self.assertEqual(datetime(2021, 6, 29, 16, 3, 30, 510000), mods.get_created_date())
+        self.assertIs(str, type(mods.label))
+
+    @mock.patch('requests.Session.get', side_effect=mocked_requests_get)
+    def test_find_datastream(self, mock_get):
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        ocr = client.find_datastream('test:pid', 'OCR')
+        self.assertEqual('OCR', ocr.dsid)
+        self.assertEqual(28444, ocr.size)
+        self.assertEqual('OCR', client.find_datastream('test:pid', 'OCR', profiles=False).dsid)
+        self.assertIsNone(client.find_datastream('test:pid', 'FULL_TEXT'))
+        self.assertIsNone(client.find_datastream('test:missing', 'OCR'))
+
+    @mock.patch('requests.Session.get', side_effect=mocked_requests_get)
+    def test_iter_datastreams(self, mock_get):
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        datastreams = client.iter_datastreams('test:pid', profiles=True)
+        self.assertEqual('RELS-EXT', next(datastreams).dsid)
+        self.assertEqual('MODS', next(datastreams).dsid)
+
+    @mock.patch('requests.Session.get', side_effect=mocked_requests_get)
+    def test_get_datastream_profile(self, mock_get):
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        datastream = client.get_datastream_profile('test:pid', 'OCR')
+        self.assertEqual('OCR', datastream.dsid)
+        self.assertEqual('OCR Record', datastream.label)
+        self.assertEqual(0, datastream.version)
+        self.assertEqual(28444, datastream.size)
+        self.assertEqual(datetime(2014, 10, 10, 1, 11, 2, 792000), datastream.get_created_date())
+        mock_get.assert_called_once_with('http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml',
+                                         auth=('user', 'pass'))
+
+    @mock.patch('requests.Session.get', side_effect=mocked_requests_get)
+    def test_get_datastream_profile_missing(self, mock_get):
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        self.assertIsNone(client.get_datastream_profile('test:pid', 'HOCR'))
+
+    @mock.patch('requests.Session.get')
+    def test_get_datastream_profile_error(self, mock_get):
+        mock_get.return_value = mock.Mock(content=b'', status_code=401,
+                                          raise_for_status=mock.Mock(side_effect=requests.HTTPError('401')))
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        # Only a 404 means the datastream is missing
+        self.assertRaises(requests.HTTPError, client.get_datastream_profile, 'test:pid', 'OCR')
+        self.assertRaises(requests.HTTPError, client.list_datastreams, 'test:pid', True)
+
+    @mock.patch('requests.Session.get')
+    def test_find_stale_datastreams(self, mock_get):
+        pages = [
+            b'"object","modified"\ninfo:fedora/test:1,2014-10-10T01:11:02.792Z\ninfo:fedora/test:2,2014-10-10T01:11:02.792Z\n',
+            b'"object","modified"\ninfo:fedora/test:3,2015-01-01T00:00:00.000Z\n',
+        ]
+        mock_get.side_effect = [mock.Mock(content=page, status_code=200) for page in pages]
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        pids = client.find_stale_datastreams('OCR', datetime(2016, 1, 1), page_size=2)
+        self.assertEqual('test:1', next(pids))
+        self.assertEqual(1, len(mock_get.call_args_list))
+        self.assertEqual(['test:2', 'test:3'], list(pids))
+        self.assertEqual(2, len(mock_get.call_args_list))
+        self.assertEqual('http://localhost:8080/fcrepo/risearch', mock_get.call_args_list[0].args[0])
+        first, second = [call.kwargs['params']['query'] for call in mock_get.call_args_list]
+        self.assertIn('<info:fedora/*/OCR>', first)
+        self.assertIn('"2016-01-01T00:00:00.000Z"', first)
+        self.assertTrue(first.endswith('} ORDER BY ?object LIMIT 2'))
+        self.assertNotIn('STR(?object)', first)
+        # The next page starts after the last object returned, not at an offset
+        self.assertIn('FILTER(STR(?object) > "info:fedora/test:2") }', second)
+        self.assertTrue(second.endswith('LIMIT 2'))
+
+    @mock.patch('requests.Session.get')
+    def test_find_members(self, mock_get):
+        mock_get.return_value = mock.Mock(content=b'"object"\ninfo:fedora/test:2\ninfo:fedora/test:3\n',
+                                          status_code=200)
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        self.assertEqual(['test:2', 'test:3'], list(client.find_members('test:1', page_size=10)))
+        self.assertEqual(1, len(mock_get.call_args_list))
+        query = mock_get.call_args.kwargs['params']['query']
+        self.assertIn('#isMemberOf> <info:fedora/test:1>', query)
+        self.assertIn('#isPageOf> <info:fedora/test:1>', query)
+        self.assertTrue(query.endswith('} ORDER BY ?object LIMIT 10'))
+
+    @mock.patch('requests.Session.get')
+    def test_find_objects(self, mock_get):
+        page = ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<result xmlns="http://www.fedora.info/definitions/1/0/types/">{session}<resultList>{pids}</resultList>'
+                '</result>')
+        pages = [
+            page.format(session='<listSession><token>abc</token><cursor>0</cursor></listSession>',
+                        pids='<objectFields><pid>test:1</pid></objectFields><objectFields><pid>test:2</pid></objectFields>'),
+            page.format(session='', pids='<objectFields><pid>test:3</pid></objectFields>'),
+        ]
+        mock_get.side_effect = [mock.Mock(content=page.encode(), status_code=200) for page in pages]
+        client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass')
+        pids = client.find_objects('pid~test:*', page_size=2)
+        self.assertEqual('test:1', next(pids))
+        self.assertEqual(1, len(mock_get.call_args_list))
+        self.assertEqual(['test:2', 'test:3'], list(pids))
+        first, second = mock_get.call_args_list
+        self.assertEqual('http://localhost:8080/fcrepo/objects', first.args[0])
+        self.assertEqual({'query': 'pid~test:*', 'pid': 'true', 'resultFormat': 'xml', 'maxResults': 2},
+                         first.kwargs['params'])
+        self.assertEqual('abc', second.kwargs['params']['sessionToken'])
+        self.assertEqual('pid~test:*', second.kwargs['params']['query'])
+
+
+class DatastreamTest(unittest.TestCase):
+
+    def test_lazy_created_date(self):
+        ds = Datastream.create_from_profile('OCR', 'OCR Record', 0, 'A', 'text/plain', 28444, 'M',
+                                            'uofm:1612084+OCR+OCR.0', '2014-10-10T01:11:02.792Z')
+        self.assertIsNone(ds._created_date)
+        self.assertEqual(datetime(2014, 10, 10, 1, 11, 2, 792000), ds.get_created_date())
+        self.assertIs(ds.created_date, ds.get_created_date())
+
+    def test_created_date_formats(self):
+        for text, expected in [
+            ('2014-10-10T01:11:02.7Z', datetime(2014, 10, 10, 1, 11, 2, 700000)),
+            ('2014-10-10T01:11:02.123456Z', datetime(2014, 10, 10, 1, 11, 2, 123456)),
+        ]:
+            ds = Datastream('OCR', 'OCR Record', 0, 'A', 'text/plain', 1, 'M', '', text)
+            self.assertEqual(expected, ds.get_created_date())
+
+    def test_list_created_date(self):
+        before = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        ds = Datastream.create_from_list('OCR', 'OCR Record', 'text/plain')
+        self.assertLessEqual(before, ds.get_created_date())
+        self.assertIsNone(ds.get_created_date().tzinfo)
+
+    def test_slots(self):
+        ds = Datastream.create_from_list('OCR', 'OCR Record', 'text/plain')
+        self.assertFalse(hasattr(ds, '__dict__'))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,91 @@
+import json
+import unittest
+from unittest import mock
+
+from local_activemq_api_client.jolokia import JolokiaActiveMQClient
+from queue_monitor import QueueMonitor
+
+
+def mock_response(results):
+    response = mock.Mock(status_code=200)
+    response.json.return_value = results
+    return response
+
+
+def queue_value(name, size, enqueued, dequeued):
+    return {'Name': name, 'QueueSize': size, 'EnqueueCount': enqueued, 'DequeueCount': dequeued, 'ConsumerCount': 2}
+
+
+class JolokiaClientTest(unittest.TestCase):
+
+    @mock.patch('requests.Session.request')
+    def test_named_queues(self, mock_request):
+        mock_request.return_value = mock_response([
+            {'status': 200, 'value': queue_value('fedora', 5, 20, 15)},
+            {'status': 404, 'error': 'javax.management.InstanceNotFoundException'},
+        ])
+        client = JolokiaActiveMQClient('http://localhost:8161/', 'admin', 'admin', queue_names=['fedora', 'missing'])
+        self.assertEqual(
+            [{'name': 'fedora', 'consumerCount': 2, 'enqueueCount': 20, 'dequeueCount': 15, 'size': 5}],
+            client.get_queues_details()
+        )
+        args, kwargs = mock_request.call_args
+        self.assertEqual(('POST', 'http://localhost:8161/api/jolokia'), args)
+        reads = json.loads(kwargs['data'])
+        self.assertEqual(2, len(reads))
+        self.assertEqual(
+            'org.apache.activemq:type=Broker,brokerName=localhost,destinationType=Queue,destinationName=fedora',
+            reads[0]['mbean']
+        )
+        self.assertIn('QueueSize', reads[0]['attribute'])
+        self.assertEqual('http://localhost:8161', kwargs['headers']['Origin'])
+        client.close()
+
+    @mock.patch('requests.Session.request')
+    def test_all_queues(self, mock_request):
+        prefix = 'org.apache.activemq:brokerName=localhost,destinationType=Queue,type=Broker,destinationName='
+        mock_request.return_value = mock_response([{'status': 200, 'value': {
+            prefix + 'fedora': queue_value('fedora', 5, 20, 15),
+            prefix + 'derivatives': queue_value('derivatives', 1, 2, 1),
+        }}])
+        client = JolokiaActiveMQClient('http://localhost:8161', 'admin', 'admin', broker_name='broker')
+        self.assertEqual({'fedora': 5, 'derivatives': 1},
+                         {name: queue['size'] for name, queue in client.get_queues_snapshot().items()})
+        reads = json.loads(mock_request.call_args.kwargs['data'])
+        self.assertEqual(
+            'org.apache.activemq:type=Broker,brokerName=broker,destinationType=Queue,destinationName=*',
+            reads[0]['mbean']
+        )
+        client.close()
+
+    @mock.patch('requests.Session.request')
+    def test_queue_size(self, mock_request):
+        mock_request.return_value = mock_response([{'status': 200, 'value': queue_value('fedora', 7, 20, 13)}])
+        client = JolokiaActiveMQClient('http://localhost:8161', 'admin', 'admin')
+        self.assertEqual(7, client.get_queue_size('fedora'))
+        self.assertEqual(13, client.get_queue_dequeue_count('fedora'))
+        mock_request.return_value = mock_response([{'status': 404}])
+        self.assertIsNone(client.get_queue_size('missing'))
+        client.close()
+
+    def test_queue_monitor_backend(self):
+        config = {
+            'username': 'user',
+            'password': 'pass',
+            'host': 'localhost',
+            'backend': 'jolokia',
+            'broker_name': 'broker',
+            'queue_name': ['fedora']
+        }
+        monitor = QueueMonitor(config)
+        self.assertIsInstance(monitor.client, JolokiaActiveMQClient)
+        self.assertEqual('broker', monitor.client.broker_name)
+        self.assertEqual(['fedora'], monitor.client.queue_names)
+        monitor.close()
+        config['backend'] = 'other'
+        with self.assertRaises(ValueError):
+            QueueMonitor(config)
+
+
+if __name__ == "__main__":
+    unittest.main()
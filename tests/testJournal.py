@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from ocr import outcomes
+from ocr.journal import ProgressJournal
+
+
+class JournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'journal.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_batched_writes(self):
+        journal = ProgressJournal(self.path, batch_size=2)
+        journal.record('test:1', outcomes.REGENERATED)
+        other = ProgressJournal(self.path)
+        self.assertFalse(other.is_finished('test:1'))
+        journal.record('test:2', outcomes.FAILED)
+        self.assertTrue(other.is_finished('test:1'))
+        self.assertFalse(other.is_finished('test:2'))
+        other.close()
+        journal.close()
+
+    def test_reopen(self):
+        journal = ProgressJournal(self.path)
+        journal.record('test:1', outcomes.UP_TO_DATE)
+        journal.record('test:2', outcomes.NO_OCR)
+        journal.record('test:3', outcomes.FAILED)
+        journal.record('test:3', outcomes.REGENERATED)
+        journal.close()
+        journal = ProgressJournal(self.path)
+        self.assertTrue(journal.is_finished('test:1'))
+        self.assertTrue(journal.is_finished('test:2'))
+        self.assertTrue(journal.is_finished('test:3'))
+        self.assertFalse(journal.is_finished('test:4'))
+        self.assertEqual(outcomes.REGENERATED, journal.get_outcome('test:3'))
+        journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
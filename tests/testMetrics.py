@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+import urllib.request
+from datetime import datetime
+from unittest import mock
+
+from metrics import Registry, start_http_server
+from ocr import OcrRegenerator, outcomes
+
+
+class RegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_labels(self):
+        counter = self.registry.counter('test_total', 'A test counter', ('outcome',))
+        counter.labels(outcome='ok').inc()
+        counter.labels(outcome='ok').inc(2)
+        counter.labels(outcome='failed').inc()
+        self.assertEqual(
+            '# HELP test_total A test counter\n'
+            '# TYPE test_total counter\n'
+            'test_total{outcome="ok"} 3\n'
+            'test_total{outcome="failed"} 1\n',
+            self.registry.render()
+        )
+
+    def test_labels_required(self):
+        counter = self.registry.counter('test_total', 'A test counter', ('outcome',))
+        with self.assertRaises(ValueError):
+            counter.inc()
+
+    def test_register_is_idempotent(self):
+        counter = self.registry.counter('test_total', 'A test counter')
+        self.assertIs(counter, self.registry.counter('test_total', 'A test counter'))
+        with self.assertRaises(ValueError):
+            self.registry.histogram('test_total', 'A test histogram')
+
+    def test_gauge_function(self):
+        value = [5]
+        self.registry.gauge('test_rate', 'A test gauge', function=lambda: value[0])
+        value[0] = 2.5
+        self.assertIn('test_rate 2.5\n', self.registry.render())
+
+    def test_histogram_buckets(self):
+        histogram = self.registry.histogram('test_seconds', 'A test histogram', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        rendered = self.registry.render()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1\n', rendered)
+        self.assertIn('test_seconds_bucket{le="1"} 2\n', rendered)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3\n', rendered)
+        self.assertIn('test_seconds_sum 5.55\n', rendered)
+        self.assertIn('test_seconds_count 3\n', rendered)
+
+    def test_histogram_time(self):
+        histogram = self.registry.histogram('test_seconds', 'A test histogram', ('stage',))
+        with histogram.labels(stage='parse').time():
+            pass
+        self.assertIn('test_seconds_count{stage="parse"} 1\n', self.registry.render())
+
+    def test_write_textfile(self):
+        self.registry.counter('test_total', 'A test counter').inc()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ocr_regen.prom')
+            self.registry.write_textfile(path)
+            with open(path) as f:
+                self.assertEqual(self.registry.render(), f.read())
+            self.assertEqual(['ocr_regen.prom'], os.listdir(directory))
+
+    def test_http_server(self):
+        self.registry.counter('test_total', 'A test counter').inc()
+        server = start_http_server(0, registry=self.registry)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics') as response:
+                self.assertEqual(200, response.status)
+                self.assertIn('test_total 1', response.read().decode('utf-8'))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class RegeneratorMetricsTest(unittest.TestCase):
+
+    config = {
+        'fedora': {'url': 'http://localhost:8080/fcrepo/', 'username': 'user', 'password': 'pass'},
+        'regenerator': {'url': 'http://localhost:8080/ocr'},
+        'queue_monitor': {'host': 'localhost', 'username': 'user', 'password': 'pass', 'queue_name': 'queue'},
+    }
+
+    def test_outcomes_counted(self):
+        regenerator = OcrRegenerator(self.config, datetime(2020, 1, 1))
+        with mock.patch('ocr.regenerator.PIDS') as pids:
+            regenerator._record_result('test:1', outcomes.NO_OCR)
+            pids.labels.assert_called_once_with(outcome=outcomes.NO_OCR)
+            pids.labels.return_value.inc.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from os.path import dirname
+from unittest import mock
+
+from fedora.client import Datastream
+from ocr import OcrRegenerator
+from ocr.journal import ProgressJournal
+from ocr.plan import PlanEntry, PlanWriter, read_plan, read_plan_summary, read_regenerations
+from ocr.targets import Regeneration
+
+
+def datastream(created_date, size):
+    return Datastream.create_from_profile('OCR', 'OCR Record', 0, 'A', 'text/plain', size, 'M', '', created_date)
+
+
+class MockResponse:
+    def __init__(self, content, status_code):
+        self.content = content
+        self.status_code = status_code
+
+
+# This method will be used by the mock to replace requests.Session.get
+def mocked_requests(*args, **kwargs):
+    if args[0] == 'http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml':
+        with open(dirname(__file__) + '/resources/datastream_profile.xml', 'rb') as f:
+            return MockResponse(f.read(), 200)
+    elif args[0] == 'http://localhost:8080/ocr/test:pid':
+        return MockResponse(None, 204)
+
+    return MockResponse(None, 404)
+
+
+class PlanTest(unittest.TestCase):
+
+    config = {
+        'fedora': {
+            'url': 'http://localhost:8080/fcrepo/',
+            'username': 'user',
+            'password': 'pass'
+        },
+        'regenerator': {
+            'url': 'http://localhost:8080/ocr',
+        },
+        'queue_monitor': {
+            'host': 'localhost',
+            'username': 'user',
+            'password': 'pass',
+            'queue_name': 'queue'
+        }
+    }
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        for name in ['plan.tsv', 'plan.tsv.gz']:
+            path = os.path.join(self.directory.name, name)
+            plan = PlanWriter(path)
+            plan.add('test:1', datastream('2014-10-10T01:11:02.792Z', 100))
+            plan.add('test:2', datastream('2012-01-01T00:00:00.000Z', 50))
+            plan.close({'checked': 3})
+            self.assertEqual([
+                PlanEntry('test:1', 'OCR', '2014-10-10T01:11:02.792000', 100),
+                PlanEntry('test:2', 'OCR', '2012-01-01T00:00:00', 50),
+            ], list(read_plan(path)))
+            summary = read_plan_summary(path)
+            self.assertEqual('2', summary['entries'])
+            self.assertEqual('150', summary['total_size'])
+            self.assertEqual('2012-01-01T00:00:00', summary['oldest'])
+            self.assertEqual('2014-10-10T01:11:02.792000', summary['newest'])
+            self.assertEqual('3', summary['checked'])
+
+    def test_append(self):
+        path = os.path.join(self.directory.name, 'plan.tsv')
+        plan = PlanWriter(path)
+        plan.add('test:1', datastream('2014-10-10T01:11:02.792Z', 100))
+        plan.close()
+        plan = PlanWriter(path, append=True)
+        plan.add('test:2', datastream('2014-10-10T01:11:02.792Z', 100))
+        plan.close()
+        self.assertEqual(['test:1', 'test:2'], [entry.pid for entry in read_plan(path)])
+
+    def test_read_regenerations(self):
+        path = os.path.join(self.directory.name, 'plan.tsv')
+        plan = PlanWriter(path)
+        hocr = datastream('2012-01-01T00:00:00.000Z', 50)
+        hocr.dsid = 'HOCR'
+        plan.add('test:1', datastream('2014-10-10T01:11:02.792Z', 100), hocr)
+        plan.add('test:2', datastream('2014-10-10T01:11:02.792Z', 100))
+        plan.close()
+        self.assertEqual([
+            Regeneration('test:1', ('OCR', 'HOCR'), datetime(2012, 1, 1), 150),
+            Regeneration('test:2', ('OCR',), datetime(2014, 10, 10, 1, 11, 2, 792000), 100),
+        ], list(read_regenerations(path)))
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_scan_then_dispatch(self, mock_get, mock_queue):
+        pid_file = os.path.join(self.directory.name, 'pids.txt')
+        plan_file = os.path.join(self.directory.name, 'plan.tsv')
+        with open(pid_file, 'w') as f:
+            f.write('test:pid\nother:pid\n')
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.scan(pid_file, PlanWriter(plan_file))
+        self.assertEqual(1, regen.stats['planned'])
+        self.assertEqual(1, regen.stats['no_ocr'])
+        self.assertEqual(2, len(mock_get.call_args_list))
+        self.assertEqual([PlanEntry('test:pid', 'OCR', '2014-10-10T01:11:02.792000', 28444)],
+                         list(read_plan(plan_file)))
+        self.assertEqual('2', read_plan_summary(plan_file)['checked'])
+        # Nothing is regenerated, so the scan does not wait on the queue
+        mock_queue.assert_not_called()
+
+        mock_get.reset_mock()
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.dispatch(plan_file)
+        self.assertEqual([mock.call('http://localhost:8080/ocr/test:pid')], mock_get.call_args_list)
+        self.assertEqual(1, regen.stats['regenerated'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_dispatch_resumes_with_scan_journal(self, mock_get, mock_queue):
+        pid_file = os.path.join(self.directory.name, 'pids.txt')
+        plan_file = os.path.join(self.directory.name, 'plan.tsv')
+        with open(pid_file, 'w') as f:
+            f.write('test:pid\nother:pid\n')
+        journal = ProgressJournal(os.path.join(self.directory.name, 'journal.sqlite'))
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.set_journal(journal)
+        regen.scan(pid_file, PlanWriter(plan_file))
+
+        # Planned pids still need regenerating
+        mock_get.reset_mock()
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.set_journal(journal, resume=True)
+        regen.dispatch(plan_file)
+        self.assertEqual([mock.call('http://localhost:8080/ocr/test:pid')], mock_get.call_args_list)
+        self.assertEqual(1, regen.stats['regenerated'])
+        self.assertEqual(0, regen.stats['skipped'])
+
+        # Regenerated ones do not
+        mock_get.reset_mock()
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.set_journal(journal, resume=True)
+        regen.dispatch(plan_file)
+        mock_get.assert_not_called()
+        self.assertEqual(1, regen.stats['skipped'])
+        journal.close()
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_check_resumes_with_scan_journal(self, mock_get, mock_queue):
+        pid_file = os.path.join(self.directory.name, 'pids.txt')
+        plan_file = os.path.join(self.directory.name, 'plan.tsv')
+        with open(pid_file, 'w') as f:
+            f.write('test:pid\nother:pid\n')
+        journal = ProgressJournal(os.path.join(self.directory.name, 'journal.sqlite'))
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.set_journal(journal)
+        regen.scan(pid_file, PlanWriter(plan_file))
+
+        # A resumed scan skips the planned pid as well as the finished one
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.set_journal(journal, resume=True)
+        regen.scan(pid_file, PlanWriter(plan_file, append=True))
+        self.assertEqual(2, regen.stats['skipped'])
+
+        # A resumed check still regenerates the planned pid
+        mock_get.reset_mock()
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.set_journal(journal, resume=True)
+        regen.check(pid_file)
+        self.assertIn(mock.call('http://localhost:8080/ocr/test:pid'), mock_get.call_args_list)
+        self.assertEqual(1, regen.stats['regenerated'])
+        self.assertEqual(1, regen.stats['skipped'])
+        journal.close()
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_scan_single_pid(self, mock_get, mock_queue):
+        plan_file = os.path.join(self.directory.name, 'plan.tsv')
+        journal = ProgressJournal(os.path.join(self.directory.name, 'journal.sqlite'))
+        regen = OcrRegenerator(self.config, datetime.now())
+        regen.set_journal(journal)
+        regen.scan('test:pid', PlanWriter(plan_file))
+        summary = read_plan_summary(plan_file)
+        self.assertEqual('1', summary['checked'])
+        self.assertEqual('1', summary['entries'])
+        self.assertEqual('planned', journal.get_outcome('test:pid'))
+        journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
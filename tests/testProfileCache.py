@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from os.path import dirname
+from unittest import mock
+
+import requests
+
+from fedora import FedoraClient
+from fedora.cache import ProfileCache
+from fedora.client import Datastream
+
+PROFILE_URL = 'http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml'
+
+
+class MockResponse:
+    def __init__(self, content, status_code, headers=None):
+        self.content = content
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
+
+def profile_response(*args, **kwargs):
+    with open(dirname(__file__) + '/resources/datastream_profile.xml', 'rb') as f:
+        return MockResponse(f.read(), 200)
+
+
+def datastream(created='2014-10-10T01:11:02.792Z'):
+    return Datastream('OCR', 'OCR Record', 0, 'A', 'text/plain', 28444, 'M', 'uofm:1612084+OCR+OCR.0', created)
+
+
+class ProfileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache.sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        cache = ProfileCache(self.path, batch_size=10)
+        cache.put('test:pid', 'OCR', datastream(), 'Fri, 10 Oct 2014 01:11:02 GMT')
+        cache.put('test:none', 'OCR', None, 'Sat, 01 Jan 2022 00:00:00 GMT')
+        self.assertIsNone(cache.get('test:other', 'OCR'))
+        cache.close()
+
+        cache = ProfileCache(self.path)
+        cached = cache.get('test:pid', 'OCR')
+        self.assertEqual('Fri, 10 Oct 2014 01:11:02 GMT', cached.validator)
+        self.assertEqual(datetime(2014, 10, 10, 1, 11, 2, 792000), cached.datastream.created_date)
+        self.assertEqual(28444, cached.datastream.size)
+        self.assertEqual('uofm:1612084+OCR+OCR.0', cached.datastream.location)
+        missing = cache.get('test:none', 'OCR')
+        self.assertIsNotNone(missing)
+        self.assertIsNone(missing.datastream)
+        cache.close()
+
+    @mock.patch('fedora.cache.time.time')
+    def test_evicts_least_recently_used(self, mock_time):
+        cache = ProfileCache(self.path, max_entries=2, batch_size=1)
+        for i, pid in enumerate(['test:1', 'test:2']):
+            mock_time.return_value = i
+            cache.put(pid, 'OCR', datastream(), None)
+        mock_time.return_value = 2
+        cache.get('test:1', 'OCR')
+        mock_time.return_value = 3
+        cache.put('test:3', 'OCR', datastream(), None)
+        self.assertEqual(2, len(cache))
+        self.assertIsNone(cache.get('test:2', 'OCR'))
+        self.assertIsNotNone(cache.get('test:1', 'OCR'))
+        self.assertIsNotNone(cache.get('test:3', 'OCR'))
+        cache.close()
+
+
+class CachingClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ProfileCache(os.path.join(self.directory.name, 'cache.sqlite'))
+        self.client = FedoraClient('http://localhost:8080/fcrepo/', 'user', 'pass', cache=self.cache)
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    @mock.patch('requests.Session.get', side_effect=profile_response)
+    def test_trusted_without_request(self, mock_get):
+        self.client.get_datastream_profile('test:pid', 'OCR', datetime(2014, 1, 1))
+        self.assertEqual([mock.call(PROFILE_URL, auth=('user', 'pass'))], mock_get.call_args_list)
+        # Created after the cutoff, so still at least that new
+        ocr = self.client.get_datastream_profile('test:pid', 'OCR', datetime(2014, 1, 1))
+        self.assertEqual(datetime(2014, 10, 10, 1, 11, 2, 792000), ocr.created_date)
+        self.assertEqual(1, len(mock_get.call_args_list))
+
+    @mock.patch('requests.Session.get', side_effect=profile_response)
+    def test_revalidates_stale(self, mock_get):
+        self.client.get_datastream_profile('test:pid', 'OCR', datetime(2016, 1, 1))
+        mock_get.side_effect = None
+        mock_get.return_value = MockResponse(None, 304)
+        ocr = self.client.get_datastream_profile('test:pid', 'OCR', datetime(2016, 1, 1))
+        self.assertEqual(
+            mock.call(PROFILE_URL, auth=('user', 'pass'), headers={'If-Modified-Since': 'Fri, 10 Oct 2014 01:11:02 GMT'}),
+            mock_get.call_args
+        )
+        self.assertEqual(datetime(2014, 10, 10, 1, 11, 2, 792000), ocr.created_date)
+
+    @mock.patch('requests.Session.get', return_value=MockResponse(None, 404))
+    def test_caches_missing(self, mock_get):
+        self.assertIsNone(self.client.get_datastream_profile('test:pid', 'OCR', datetime(2016, 1, 1)))
+        cached = self.cache.get('test:pid', 'OCR')
+        self.assertIsNone(cached.datastream)
+        # A missing datastream may have been added since, so it is always revalidated
+        mock_get.side_effect = profile_response
+        ocr = self.client.get_datastream_profile('test:pid', 'OCR', datetime(2016, 1, 1))
+        self.assertEqual('If-Modified-Since', list(mock_get.call_args.kwargs['headers'])[0])
+        self.assertEqual('OCR', ocr.dsid)
+        self.assertEqual('OCR', self.cache.get('test:pid', 'OCR').datastream.dsid)
+
+    @mock.patch('requests.Session.get', return_value=MockResponse(None, 500))
+    def test_errors_not_cached(self, mock_get):
+        self.assertRaises(requests.HTTPError, self.client.get_datastream_profile, 'test:pid', 'OCR',
+                          datetime(2016, 1, 1))
+        self.assertIsNone(self.cache.get('test:pid', 'OCR'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+
+from ocr.profiling import RunProfiler, categorize, ROOT
+
+
+def parse(n):
+    from datetime import datetime
+    return [datetime.strptime('2014-10-10T01:11:02.792Z', '%Y-%m-%dT%H:%M:%S.%fZ') for _ in range(n)]
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def test_categorize(self):
+        self.assertEqual('fedora.client', categorize(os.path.join(ROOT, 'fedora', 'client.py')))
+        self.assertEqual('ocr', categorize(os.path.join(ROOT, 'ocr', '__init__.py')))
+        self.assertEqual('local_activemq_api_client.connector',
+                         categorize(os.path.join(ROOT, 'local_activemq_api_client', 'connector.py')))
+        self.assertEqual('strptime', categorize('/usr/lib/python3.11/_strptime.py', '_strptime'))
+        self.assertEqual('logging', categorize('/usr/lib/python3.11/logging/__init__.py', 'emit'))
+        self.assertEqual('http', categorize('~', "<method 'recv_into' of '_socket.socket' objects>"))
+        self.assertEqual('other', categorize('/usr/lib/python3.11/json/decoder.py', 'decode'))
+
+    def test_profile_threads(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile')
+            profiler = RunProfiler(path)
+            profiler.start()
+            thread = threading.Thread(target=parse, args=(200,))
+            thread.start()
+            thread.join()
+            profiler.stop()
+            stats = pstats.Stats(path + '.prof')
+            # The strptime calls happened in the worker thread
+            self.assertIn('strptime', RunProfiler.time_by_category(stats))
+            with open(path + '.txt') as f:
+                report = f.read()
+            self.assertIn('CPU by module', report)
+            self.assertIn('Memory by module', report)
+
+
+if __name__ == '__main__':
+    unittest.main()
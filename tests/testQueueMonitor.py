@@ -11,11 +11,11 @@ def mock_get_queue_dequeue_count(*args, **kwargs):
     if args[0] == 'test_queue':
         return 5
 
-def mock_get_queue_size(*args, **kwargs):
-    if args[0] == 'test_queue':
-        return 5
-    elif args[0] == 'test_queue2':
-        return 10
+def mock_get_queues_details(*args, **kwargs):
+    return [
+        {'name': 'test_queue', 'consumerCount': 1, 'enqueueCount': 10, 'dequeueCount': 5, 'size': 5},
+        {'name': 'test_queue2', 'consumerCount': 1, 'enqueueCount': 20, 'dequeueCount': 10, 'size': 10},
+    ]
 
 class QueueMonitorTestCase(unittest.TestCase):
 
@@ -41,8 +41,8 @@ class QueueMonitorTestCase(unittest.TestCase):
         self.assertIsInstance(monitor, QueueMonitor)
         monitor.close()
 
-    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queue_size', side_effect=mock_get_queue_size)
-    def test_get_queue_size(self, mock_enqueue):
+    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queues_details', side_effect=mock_get_queues_details)
+    def test_get_queue_size(self, mock_details):
         config = {
             'username': 'user',
             'password': 'pass',
@@ -54,11 +54,10 @@ class QueueMonitorTestCase(unittest.TestCase):
         self.assertIsInstance(monitor, QueueMonitor)
         self.assertFalse(monitor.queue_size_too_large())
         monitor.close()
-        self.assertIn(mock.call('test_queue'), mock_enqueue.call_args_list)
-        self.assertEqual(1, len(mock_enqueue.call_args_list))
+        self.assertEqual(1, len(mock_details.call_args_list))
 
-    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queue_size', side_effect=mock_get_queue_size)
-    def test_get_queue_size2(self, mock_enqueue):
+    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queues_details', side_effect=mock_get_queues_details)
+    def test_get_queue_size2(self, mock_details):
         config = {
             'username': 'user',
             'password': 'pass',
@@ -71,11 +70,10 @@ class QueueMonitorTestCase(unittest.TestCase):
         self.assertIsInstance(monitor, QueueMonitor)
         self.assertTrue(monitor.queue_size_too_large())
         monitor.close()
-        self.assertIn(mock.call('test_queue2'), mock_enqueue.call_args_list)
-        self.assertEqual(1, len(mock_enqueue.call_args_list))
+        self.assertEqual(1, len(mock_details.call_args_list))
 
-    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queue_size', side_effect=mock_get_queue_size)
-    def test_get_queue_size3(self, mock_enqueue):
+    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queues_details', side_effect=mock_get_queues_details)
+    def test_get_queue_size3(self, mock_details):
         config = {
             'username': 'user',
             'password': 'pass',
@@ -88,12 +86,10 @@ class QueueMonitorTestCase(unittest.TestCase):
         self.assertIsInstance(monitor, QueueMonitor)
         self.assertTrue(monitor.queue_size_too_large())
         monitor.close()
-        self.assertIn(mock.call('test_queue'), mock_enqueue.call_args_list)
-        self.assertIn(mock.call('test_queue2'), mock_enqueue.call_args_list)
-        self.assertEqual(2, len(mock_enqueue.call_args_list))
+        self.assertEqual(1, len(mock_details.call_args_list))
 
-    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queue_size', side_effect=mock_get_queue_size)
-    def test_get_queue_size4(self, mock_enqueue):
+    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queues_details', side_effect=mock_get_queues_details)
+    def test_get_queue_size4(self, mock_details):
         config = {
             'username': 'user',
             'password': 'pass',
@@ -109,9 +105,28 @@ class QueueMonitorTestCase(unittest.TestCase):
         self.assertIsInstance(monitor, QueueMonitor)
         self.assertFalse(monitor.queue_size_too_large())
         monitor.close()
-        self.assertIn(mock.call('test_queue'), mock_enqueue.call_args_list)
-        self.assertIn(mock.call('test_queue2'), mock_enqueue.call_args_list)
-        self.assertEqual(2, len(mock_enqueue.call_args_list))
+        self.assertEqual(1, len(mock_details.call_args_list))
+
+    @mock.patch('local_activemq_api_client.client.ActiveMQClient.get_queues_details', side_effect=mock_get_queues_details)
+    def test_snapshot_ttl(self, mock_details):
+        config = {
+            'username': 'user',
+            'password': 'pass',
+            'host': 'localhost',
+            'max_queue_size': 5,
+            'cache_ttl': 60,
+            'queue_name': 'test_queue'
+        }
+        monitor = QueueMonitor(config)
+        self.assertFalse(monitor.queue_size_too_large())
+        self.assertFalse(monitor.queue_size_too_large())
+        self.assertEqual(10, monitor.get_queue_size('test_queue2'))
+        self.assertIsNone(monitor.get_queue_size('missing'))
+        self.assertEqual(1, len(mock_details.call_args_list))
+        with mock.patch('time.monotonic', return_value=monitor._snapshot_time + 60):
+            monitor.queue_size_too_large()
+        self.assertEqual(2, len(mock_details.call_args_list))
+        monitor.close()
 
     """
     def test_live(self):
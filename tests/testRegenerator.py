@@ -1,9 +1,15 @@
+import os
+import tempfile
 import unittest
 from datetime import datetime
 from os.path import dirname
 from unittest import mock
 
+import requests
+
 from ocr import OcrRegenerator
+from ocr import outcomes
+from ocr.journal import ProgressJournal
 
 
 class MockResponse:
@@ -11,11 +17,15 @@ class MockResponse:
         self.content = content
         self.status_code = status_code
 
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(str(self.status_code))
+
 
-# This method will be used by the mock to replace requests.get
+# This method will be used by the mock to replace requests.Session.get
 def mocked_requests(*args, **kwargs):
-    if args[0] == 'http://localhost:8080/fcrepo/objects/test:pid/datastreams?format=xml&profiles=true':
-        with open(dirname(__file__) + '/resources/list_datastreams_profile.xml', 'rb') as f:
+    if args[0] == 'http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml':
+        with open(dirname(__file__) + '/resources/datastream_profile.xml', 'rb') as f:
             return MockResponse(f.read(), 200)
     elif args[0] == 'http://localhost:8080/ocr/test:pid':
         return MockResponse(None, 204)
@@ -89,10 +99,9 @@ class RegeneratorTest(unittest.TestCase):
                 OcrRegenerator(config, datetime.now())
 
 
-    @mock.patch('fedora.client.requests.get', side_effect=mocked_requests)
-    @mock.patch('ocr.regenerator.requests.get', side_effect=mocked_requests)
-    def test_single_pid(self, mock_regen, mock_fedora):
-        # decorators are applied bottom to top, so the calls all seem to appear in the last mock.
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_single_pid(self, mock_get, mock_queue):
         config = {
             'fedora': {
                 'url': 'http://localhost:8080/fcrepo/',
@@ -113,19 +122,20 @@ class RegeneratorTest(unittest.TestCase):
         regen = OcrRegenerator(config, today)
         regen.check('test:pid')
         self.assertIn(
-            mock.call('http://localhost:8080/fcrepo/objects/test:pid/datastreams?format=xml&profiles=true', auth=('user', 'pass')),
-            mock_fedora.call_args_list
+            mock.call('http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml', auth=('user', 'pass')),
+            mock_get.call_args_list
         )
         self.assertIn(
             mock.call('http://localhost:8080/ocr/test:pid'),
-            mock_fedora.call_args_list
+            mock_get.call_args_list
         )
-        self.assertEqual(2, len(mock_fedora.call_args_list))
-        self.assertEqual(0, len(mock_regen.call_args_list))
+        self.assertEqual(2, len(mock_get.call_args_list))
+        self.assertEqual(1, regen.stats['checked'])
+        self.assertEqual(1, regen.stats['regenerated'])
 
-    @mock.patch('fedora.client.requests.get', side_effect=mocked_requests)
-    @mock.patch('ocr.regenerator.requests.get', side_effect=mocked_requests)
-    def test_single_pid_old(self, mock_regen, mock_fedora):
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_single_pid_old(self, mock_get, mock_queue):
         config = {
             'fedora': {
                 'url': 'http://localhost:8080/fcrepo/',
@@ -146,16 +156,334 @@ class RegeneratorTest(unittest.TestCase):
         regen = OcrRegenerator(config, today)
         regen.check('test:pid')
         self.assertIn(
-            mock.call('http://localhost:8080/fcrepo/objects/test:pid/datastreams?format=xml&profiles=true',
+            mock.call('http://localhost:8080/fcrepo/objects/test:pid/datastreams/OCR?format=xml',
                       auth=('user', 'pass')),
-            mock_fedora.call_args_list
+            mock_get.call_args_list
         )
         self.assertNotIn(
             mock.call('http://localhost:8080/ocr/test:pid'),
-            mock_fedora.call_args_list
+            mock_get.call_args_list
+        )
+        self.assertEqual(1, len(mock_get.call_args_list))
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_file_concurrent(self, mock_get, mock_queue):
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+                'batch_size': 2,
+                'workers': 3
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('test:pid\n' * 5)
+            f.write('not-a-pid\n')
+        try:
+            regen = OcrRegenerator(config, datetime.now())
+            regen.check(f.name)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(5, regen.stats['checked'])
+        self.assertEqual(5, regen.stats['regenerated'])
+        self.assertEqual(10, len(mock_get.call_args_list))
+        self.assertEqual(3, len(mock_queue.call_args_list))
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_resume(self, mock_get, mock_queue):
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            pid_file = os.path.join(directory, 'pids.txt')
+            with open(pid_file, 'w') as f:
+                f.write('test:pid\nother:pid\ndone:pid\n')
+            journal = ProgressJournal(os.path.join(directory, 'journal.db'))
+            journal.record('done:pid', outcomes.UP_TO_DATE)
+            journal.record('other:pid', outcomes.FAILED)
+            regen = OcrRegenerator(config, datetime.now())
+            regen.set_journal(journal, resume=True)
+            regen.check(pid_file)
+            self.assertEqual(1, regen.stats['skipped'])
+            self.assertEqual(1, regen.stats['regenerated'])
+            self.assertEqual(1, regen.stats['no_ocr'])
+            self.assertEqual(outcomes.REGENERATED, journal.get_outcome('test:pid'))
+            self.assertEqual(outcomes.NO_OCR, journal.get_outcome('other:pid'))
+            journal.close()
+        self.assertEqual(3, len(mock_get.call_args_list))
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get')
+    def test_fedora_error(self, mock_get, mock_queue):
+        def responses(*args, **kwargs):
+            if args[0] == 'http://localhost:8080/fcrepo/objects/broken:pid/datastreams/OCR?format=xml':
+                return MockResponse(None, 500)
+            return mocked_requests(*args, **kwargs)
+
+        mock_get.side_effect = responses
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            pid_file = os.path.join(directory, 'pids.txt')
+            with open(pid_file, 'w') as f:
+                f.write('broken:pid\ntest:pid\nother:pid\n')
+            journal = ProgressJournal(os.path.join(directory, 'journal.sqlite'))
+            regen = OcrRegenerator(config, datetime.now())
+            regen.set_journal(journal)
+            regen.check(pid_file)
+            # The error fails that pid, which a resumed run retries, and the others are still checked
+            self.assertEqual(outcomes.FAILED, journal.get_outcome('broken:pid'))
+            self.assertFalse(journal.is_finished('broken:pid'))
+            journal.close()
+        self.assertEqual(3, regen.stats['checked'])
+        self.assertEqual(1, regen.stats['failed'])
+        self.assertEqual(1, regen.stats['regenerated'])
+        self.assertEqual(1, regen.stats['no_ocr'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('fedora.client.FedoraClient.find_stale_datastreams', return_value=iter(['test:pid', 'other:pid']))
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_regenerate_stale(self, mock_get, mock_stale, mock_queue):
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        check_before = datetime.strptime('2016-01-01', '%Y-%m-%d')
+        regen = OcrRegenerator(config, check_before)
+        regen.regenerate_stale(500)
+        mock_stale.assert_called_once_with('OCR', check_before, 500)
+        self.assertEqual(
+            [mock.call('http://localhost:8080/ocr/test:pid'), mock.call('http://localhost:8080/ocr/other:pid')],
+            mock_get.call_args_list
         )
-        self.assertEqual(1, len(mock_fedora.call_args_list))
-        self.assertEqual(0, len(mock_regen.call_args_list))
+        self.assertEqual(1, regen.stats['regenerated'])
+        self.assertEqual(1, regen.stats['failed'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('fedora.client.FedoraClient.find_stale_datastreams')
+    @mock.patch('requests.Session.get', return_value=MockResponse(None, 204))
+    def test_regenerate_stale_targets(self, mock_get, mock_stale, mock_queue):
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+                'targets': [
+                    {'dsid': 'HOCR', 'url': 'http://localhost:8080/hocr'},
+                    {'dsid': 'TN', 'url': 'http://localhost:8080/tn', 'check_before': '2014-01-01'},
+                ]
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        stale = {'HOCR': ['test:1', 'test:3'], 'TN': ['test:2', 'test:3']}
+        mock_stale.side_effect = lambda dsid, before, page_size: iter(stale[dsid])
+        check_before = datetime(2016, 1, 1)
+        regen = OcrRegenerator(config, check_before)
+        regen.regenerate_stale(500)
+        self.assertEqual([mock.call('HOCR', check_before, 500), mock.call('TN', datetime(2014, 1, 1), 500)],
+                         mock_stale.call_args_list)
+        # Each target is regenerated from its own endpoint, test:3 is regenerated once for both
+        self.assertEqual([
+            mock.call('http://localhost:8080/hocr/test:1'),
+            mock.call('http://localhost:8080/tn/test:2'),
+            mock.call('http://localhost:8080/hocr/test:3'),
+            mock.call('http://localhost:8080/tn/test:3'),
+        ], mock_get.call_args_list)
+        self.assertEqual(3, regen.stats['regenerated'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('fedora.client.FedoraClient.find_objects', return_value=iter(['test:pid', 'other:pid']))
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_check_objects(self, mock_get, mock_find, mock_queue):
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        regen = OcrRegenerator(config, datetime.now())
+        regen.check_objects('test:*', modified_before=datetime(2020, 1, 1), page_size=50)
+        mock_find.assert_called_once_with('pid~test:* mDate<2020-01-01T00:00:00.000Z', 50)
+        self.assertEqual(1, regen.stats['regenerated'])
+        self.assertEqual(1, regen.stats['no_ocr'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('fedora.client.FedoraClient.find_members')
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_check_members(self, mock_get, mock_members, mock_queue):
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        members = {'test:book': ['test:pid', 'other:pid'], 'test:issue': ['other:pid']}
+        mock_members.side_effect = lambda pid, page_size: iter(members[pid])
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('test:book\ntest:issue\ntest:book\n')
+        try:
+            regen = OcrRegenerator(config, datetime.now())
+            regen.check_members(f.name, page_size=50)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual([mock.call('test:book', 50), mock.call('test:issue', 50)], mock_members.call_args_list)
+        self.assertEqual(2, regen.stats['checked'])
+        self.assertEqual(1, regen.stats['regenerated'])
+        self.assertEqual(1, regen.stats['no_ocr'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', side_effect=mocked_requests)
+    def test_dispatcher(self, mock_get, mock_queue):
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+                'workers': 2,
+                'max_in_flight': 2,
+                'rate_limit': 1000
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('test:pid\n' * 4)
+        try:
+            regen = OcrRegenerator(config, datetime.now())
+            regen.check(f.name)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(4, regen.stats['checked'])
+        self.assertEqual(4, regen.stats['regenerated'])
+        self.assertEqual(8, len(mock_get.call_args_list))
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get')
+    def test_targets(self, mock_get, mock_queue):
+        def responses(*args, **kwargs):
+            if args[0] == 'http://localhost:8080/fcrepo/objects/test:pid/datastreams?format=xml&profiles=true':
+                with open(dirname(__file__) + '/resources/list_datastreams_profile.xml', 'rb') as f:
+                    return MockResponse(f.read(), 200)
+            return MockResponse(None, 204)
+
+        mock_get.side_effect = responses
+        config = {
+            'fedora': {
+                'url': 'http://localhost:8080/fcrepo/',
+                'username': 'user',
+                'password': 'pass'
+            },
+            'regenerator': {
+                'url': 'http://localhost:8080/ocr',
+                'targets': [
+                    {'dsid': 'OCR'},
+                    {'dsid': 'HOCR', 'url': 'http://localhost:8080/hocr', 'check_before': '2014-01-01'},
+                    {'dsid': 'TN', 'url': 'http://localhost:8080/tn/', 'check_before': datetime(2015, 1, 1).date()},
+                    {'dsid': 'FULL_TEXT'},
+                ]
+            },
+            'queue_monitor': {
+                'host': 'localhost',
+                'username': 'user',
+                'password': 'pass',
+                'queue_name': 'queue'
+            }
+        }
+        regen = OcrRegenerator(config, datetime(2016, 1, 1))
+        self.assertEqual(outcomes.REGENERATED, regen._check_for_ocr('test:pid'))
+        # Every target is read from the one listing, only OCR and TN are older than their cutoffs
+        self.assertEqual([
+            mock.call('http://localhost:8080/fcrepo/objects/test:pid/datastreams?format=xml&profiles=true',
+                      auth=('user', 'pass')),
+            mock.call('http://localhost:8080/ocr/test:pid'),
+            mock.call('http://localhost:8080/tn/test:pid'),
+        ], mock_get.call_args_list)
 
 if __name__ == "__main__":
     unittest.main()
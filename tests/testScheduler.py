@@ -0,0 +1,148 @@
+import os
+import random
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from fedora.client import Datastream
+from ocr import OcrRegenerator
+from ocr.plan import PlanWriter
+from ocr.scheduler import RegenerationScheduler
+from ocr.targets import Regeneration
+
+CONFIG = {
+    'fedora': {
+        'url': 'http://localhost:8080/fcrepo/',
+        'username': 'user',
+        'password': 'pass'
+    },
+    'regenerator': {
+        'url': 'http://localhost:8080/ocr',
+        'priority': {'max_in_memory': 4},
+    },
+    'queue_monitor': {
+        'host': 'localhost',
+        'username': 'user',
+        'password': 'pass',
+        'queue_name': 'queue'
+    }
+}
+
+
+class MockResponse:
+    def __init__(self, content, status_code):
+        self.content = content
+        self.status_code = status_code
+
+
+def ocr(created: datetime, size: int = 1000):
+    return Datastream('OCR', 'OCR Record', 0, 'A', 'text/plain', size, 'M', 'OCR.0', created.isoformat())
+
+
+def regeneration(pid: str, created: datetime, size: int = 0, dsids=('OCR',)):
+    return Regeneration(pid, dsids, created, size)
+
+
+class RegenerationSchedulerTest(unittest.TestCase):
+
+    def test_oldest_first(self):
+        scheduler = RegenerationScheduler()
+        scheduler.push(regeneration('test:new', datetime(2015, 1, 1)))
+        scheduler.push(regeneration('test:old', datetime(2010, 1, 1)))
+        scheduler.push(regeneration('test:middle', datetime(2012, 1, 1)))
+        scheduler.push(regeneration('test:also-old', datetime(2010, 1, 1)))
+        self.assertEqual(4, len(scheduler))
+        self.assertEqual(['test:old', 'test:also-old', 'test:middle', 'test:new'],
+                         [scheduler.pop().pid for _ in range(4)])
+        self.assertIsNone(scheduler.pop())
+
+    def test_weights(self):
+        scheduler = RegenerationScheduler(size_weight=10, namespaces={'urgent': 365})
+        scheduler.push(regeneration('test:old', datetime(2014, 1, 1)))
+        # 2MB counts as 20 days older
+        scheduler.push(regeneration('test:large', datetime(2014, 1, 15), 2 * 1024 * 1024))
+        scheduler.push(regeneration('urgent:new', datetime(2014, 12, 1)))
+        self.assertEqual(['urgent:new', 'test:large', 'test:old'], [scheduler.pop().pid for _ in range(3)])
+
+    def test_spills_to_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            scheduler = RegenerationScheduler(max_in_memory=8, spill_directory=directory)
+            days = list(range(200))
+            random.Random(1).shuffle(days)
+            for day in days:
+                scheduler.push(regeneration(f'test:{day}', datetime(2010, 1, 1) + timedelta(days=day), day,
+                                            ('OCR', 'HOCR')))
+                if day % 3 == 0:
+                    # Interleave pops with pushes
+                    scheduler.push(regeneration(f'test:early-{day}', datetime(2000, 1, 1) + timedelta(days=day)))
+                    scheduler.pop()
+            self.assertTrue(os.listdir(directory))
+            self.assertLessEqual(len(scheduler._heap), 8)
+            popped = list(iter(scheduler.pop, None))
+            self.assertEqual([f'test:{day}' for day in range(200)], [entry.pid for entry in popped])
+            # Entries read back from disk are intact
+            self.assertEqual(regeneration('test:7', datetime(2010, 1, 8), 7, ('OCR', 'HOCR')), popped[7])
+            del scheduler
+            self.assertEqual([], os.listdir(directory))
+
+    def test_iterate_while_pushing(self):
+        scheduler = RegenerationScheduler()
+        taken = []
+        consumer = threading.Thread(target=lambda: taken.extend(entry.pid for entry in scheduler))
+        consumer.start()
+        for day in range(20):
+            scheduler.push(regeneration(f'test:{day}', datetime(2010, 1, 1) + timedelta(days=day)))
+        scheduler.close()
+        consumer.join(5)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(sorted(taken), sorted(f'test:{day}' for day in range(20)))
+
+    def test_discard(self):
+        scheduler = RegenerationScheduler()
+        scheduler.push(regeneration('test:pid', datetime(2010, 1, 1)))
+        scheduler.close(discard=True)
+        self.assertEqual([], list(scheduler))
+
+
+class PrioritizedRegeneratorTest(unittest.TestCase):
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', return_value=MockResponse(None, 204))
+    def test_dispatch_oldest_first(self, mock_get, mock_queue):
+        with tempfile.TemporaryDirectory() as directory:
+            plan_path = os.path.join(directory, 'plan.tsv')
+            plan = PlanWriter(plan_path)
+            for pid, year in [('test:1', 2014), ('test:2', 2011), ('test:3', 2013), ('test:4', 2010), ('test:5', 2012)]:
+                plan.add(pid, ocr(datetime(year, 1, 1)))
+            plan.close()
+            regen = OcrRegenerator(CONFIG, datetime(2016, 1, 1))
+            regen.dispatch(plan_path)
+        self.assertEqual([mock.call(f'http://localhost:8080/ocr/test:{n}') for n in [4, 2, 5, 3, 1]],
+                         mock_get.call_args_list)
+        self.assertEqual(5, regen.stats['regenerated'])
+
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    @mock.patch('requests.Session.get', return_value=MockResponse(None, 204))
+    @mock.patch('fedora.client.FedoraClient.get_datastream_profile')
+    def test_check_schedules_stale(self, mock_profile, mock_get, mock_queue):
+        dates = {f'test:{n}': datetime(2010 + n, 1, 1) for n in range(10)}
+        mock_profile.side_effect = lambda pid, dsid, trust_cached_from=None: ocr(dates[pid])
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write(''.join(f'{pid}\n' for pid in dates))
+        try:
+            regen = OcrRegenerator(CONFIG, datetime(2015, 1, 1))
+            regen.check(f.name)
+        finally:
+            os.unlink(f.name)
+        self.assertEqual(sorted(mock.call(f'http://localhost:8080/ocr/test:{n}') for n in range(5)),
+                         sorted(mock_get.call_args_list))
+        self.assertEqual(5, regen.stats['regenerated'])
+        self.assertEqual(5, regen.stats['up_to_date'])
+        self.assertEqual(10, regen.stats['checked'])
+        self.assertIsNone(regen.scheduler)
+
+
+if __name__ == '__main__':
+    unittest.main()
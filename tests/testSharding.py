@@ -0,0 +1,62 @@
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from ocr import OcrRegenerator
+from ocr.sharding import Shard
+
+
+class ShardTest(unittest.TestCase):
+
+    pids = [f'test:{i}' for i in range(1000)]
+
+    def test_parse(self):
+        shard = Shard.parse('2/4')
+        self.assertEqual(2, shard.number)
+        self.assertEqual(4, shard.count)
+        self.assertEqual('2/4', str(shard))
+        for text in ['0/4', '5/4', '1/0', '2', 'a/b']:
+            with self.assertRaises(ValueError):
+                Shard.parse(text)
+
+    def test_partition(self):
+        shards = [Shard(number, 4) for number in range(1, 5)]
+        selected = [list(shard.filter(self.pids)) for shard in shards]
+        # Every pid is in exactly one shard
+        self.assertEqual(sorted(self.pids), sorted(pid for pids in selected for pid in pids))
+        for pids in selected:
+            self.assertGreater(len(pids), 200)
+        # The same pid always lands in the same shard, whitespace aside
+        self.assertEqual(shards[0].contains('test:1'), shards[0].contains(' test:1\n'))
+        self.assertEqual(selected[0], list(Shard(1, 4).filter(self.pids)))
+
+    def test_single_shard(self):
+        self.assertEqual(self.pids, list(Shard(1, 1).filter(self.pids)))
+
+    def test_path(self):
+        shard = Shard(2, 4)
+        self.assertEqual('/tmp/progress.2-of-4.sqlite', shard.path('/tmp/progress.sqlite'))
+        self.assertEqual('plan.2-of-4', shard.path('plan'))
+
+    @mock.patch('ocr.regenerator.OcrRegenerator._regenerate_ocr', return_value=True)
+    @mock.patch('queue_monitor.activemq_client.QueueMonitor.queue_size_too_large', return_value=False)
+    def test_regenerator_shard(self, mock_queue, mock_regenerate):
+        config = {
+            'fedora': {'url': 'http://localhost:8080/fcrepo/', 'username': 'user', 'password': 'pass'},
+            'regenerator': {'url': 'http://localhost:8080/ocr', 'batch_size': 10},
+            'queue_monitor': {'host': 'localhost', 'username': 'user', 'password': 'pass', 'queue_name': 'queue'},
+        }
+        shard = Shard(3, 4)
+        regen = OcrRegenerator(config, datetime.now())
+        regen.set_shard(shard)
+        # Each of the 4 nodes checks the shared queue 4 times as often
+        self.assertEqual(2, regen.batch_size)
+        with mock.patch('fedora.client.FedoraClient.find_stale_datastreams', return_value=iter(self.pids)):
+            regen.regenerate_stale()
+        expected = list(shard.filter(self.pids))
+        self.assertEqual([mock.call(pid, ('OCR',)) for pid in expected], mock_regenerate.call_args_list)
+        self.assertEqual(len(expected), regen.stats['regenerated'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from ocr.sources import prefetch, read_pids
+
+
+class SourcesTest(unittest.TestCase):
+
+    content = 'test:1\n\n  test:2  \ntest:3\n'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, name, opener):
+        path = os.path.join(self.directory.name, name)
+        with opener(path, 'wt') as f:
+            f.write(self.content)
+        return path
+
+    def test_plain(self):
+        path = self._write('pids.txt', open)
+        self.assertEqual(['test:1', 'test:2', 'test:3'], list(read_pids(path)))
+
+    def test_compressed(self):
+        for name, opener in [('pids.gz', gzip.open), ('pids.txt.BZ2', bz2.open), ('pids.xz', lzma.open)]:
+            path = self._write(name, opener)
+            self.assertEqual(['test:1', 'test:2', 'test:3'], list(read_pids(path)))
+
+    @mock.patch('sys.stdin', io.StringIO(content))
+    def test_stdin(self):
+        self.assertEqual(['test:1', 'test:2', 'test:3'], list(read_pids('-')))
+
+    def test_lazy(self):
+        path = self._write('pids.txt', open)
+        pids = read_pids(path)
+        self.assertEqual('test:1', next(pids))
+        pids.close()
+
+    def test_prefetch(self):
+        self.assertEqual([f'test:{i}' for i in range(100)], list(prefetch((f'test:{i}' for i in range(100)), 10)))
+        self.assertEqual([], list(prefetch([])))
+
+    def test_prefetch_reads_ahead(self):
+        read = threading.Event()
+
+        def pids():
+            yield 'test:1'
+            yield 'test:2'
+            read.set()
+
+        items = prefetch(pids(), 10)
+        self.assertEqual('test:1', next(items))
+        # The rest is read while the first pid is being worked on
+        self.assertTrue(read.wait(5))
+        self.assertEqual(['test:2'], list(items))
+
+    def test_prefetch_error(self):
+        def pids():
+            yield 'test:1'
+            raise IOError('Lost connection')
+
+        items = prefetch(pids())
+        self.assertEqual('test:1', next(items))
+        with self.assertRaises(IOError):
+            next(items)
+
+    def test_prefetch_stops(self):
+        produced = []
+
+        def pids():
+            for i in range(1000):
+                produced.append(i)
+                yield f'test:{i}'
+
+        items = prefetch(pids(), 5)
+        next(items)
+        items.close()
+        threading.Event().wait(0.3)
+        self.assertLess(len(produced), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import time
+import unittest
+
+from benchmarks.standins import Broker, StompStandIn
+from local_activemq_api_client.stomp import StompActiveMQClient, decode_frame, encode_frame, parse_statistics
+from queue_monitor import QueueMonitor
+
+
+class StompFrameTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        buffer = bytearray(b'\n' + encode_frame('SEND', {'destination': '/queue/a:b'}, b'body\x00with null')
+                           + encode_frame('DISCONNECT')[:5])
+        command, headers, body = decode_frame(buffer)
+        self.assertEqual('SEND', command)
+        self.assertEqual('/queue/a:b', headers['destination'])
+        self.assertEqual(b'body\x00with null', body)
+        # The second frame is incomplete
+        self.assertIsNone(decode_frame(buffer))
+        self.assertEqual(b'DISCO', bytes(buffer))
+
+    def test_parse_statistics(self):
+        body = (b'<map><entry><string>destinationName</string><string>queue://fedora</string></entry>'
+                b'<entry><string>size</string><long>12</long></entry>'
+                b'<entry><string>averageEnqueueTime</string><double>1.5</double></entry></map>')
+        self.assertEqual({'destinationName': 'queue://fedora', 'size': 12, 'averageEnqueueTime': 1.5},
+                         parse_statistics(body))
+
+    def test_bad_content_length(self):
+        buffer = bytearray(b'MESSAGE\ncontent-length:abc\n\n<map/>\x00' + encode_frame('RECEIPT', {'receipt-id': '1'}))
+        self.assertEqual(('MESSAGE', {'content-length': 'abc'}, b'<map/>'), decode_frame(buffer))
+        self.assertEqual('RECEIPT', decode_frame(buffer)[0])
+
+    def test_skips_unreadable_messages(self):
+        client = StompActiveMQClient('localhost', 61613, 'admin', 'admin', ['fedora'])
+        with self.assertLogs('local_activemq_api_client.stomp', 'WARNING'):
+            client._handle('MESSAGE', {}, b'not xml')
+            client._handle('MESSAGE', {}, b'<map><entry><string>size</string><long>many</long></entry></map>')
+        client._handle('MESSAGE', {}, b'<map><entry><string>destinationName</string><string>queue://fedora</string>'
+                                      b'</entry><entry><string>size</string><long>4</long></entry></map>')
+        self.assertEqual(4, client.get_queues_snapshot()['fedora']['size'])
+
+
+class StompClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.broker = Broker(queue_name='fedora', drain_rate=0)
+        self.stand_in = StompStandIn(self.broker).start()
+        self.host, self.port = self.stand_in._server.server_address[:2]
+
+    def tearDown(self):
+        self.stand_in.stop()
+
+    def test_snapshot(self):
+        client = StompActiveMQClient(self.host, self.port, 'admin', 'admin', ['fedora'], interval=0.05)
+        client.start()
+        try:
+            self.assertEqual({'fedora': {'name': 'fedora', 'consumerCount': 1, 'enqueueCount': 0, 'dequeueCount': 0,
+                                         'size': 0}}, client.get_queues_snapshot())
+            for _ in range(3):
+                self.broker.enqueue()
+            deadline = time.monotonic() + 5
+            while client.get_queues_snapshot()['fedora']['size'] != 3 and time.monotonic() < deadline:
+                client.wait_for_update(1)
+            self.assertEqual(3, client.get_queues_snapshot()['fedora']['size'])
+        finally:
+            client.close()
+
+    def test_stale_statistics(self):
+        client = StompActiveMQClient(self.host, self.port, 'admin', 'admin', ['fedora'], interval=0.05, max_age=0.2)
+        client.start()
+        try:
+            client.get_queues_snapshot()
+            self.stand_in.stop()
+            time.sleep(0.5)
+            with self.assertRaises(ConnectionError):
+                client.get_queues_snapshot()
+        finally:
+            client.close()
+
+    def test_queue_monitor(self):
+        monitor = QueueMonitor({'host': 'http://localhost:8161', 'username': 'admin', 'password': 'admin',
+                                'backend': 'stomp', 'stomp_host': self.host, 'stomp_port': self.port,
+                                'stats_interval': 0.05, 'queue_name': 'fedora', 'max_queue_size': 1})
+        try:
+            self.assertFalse(monitor.queue_size_too_large())
+            self.broker.enqueue()
+            self.broker.enqueue()
+            start = time.monotonic()
+            while not monitor.queue_size_too_large() and time.monotonic() - start < 5:
+                monitor.wait_for_change(1)
+            self.assertTrue(monitor.queue_size_too_large())
+            # Returns as soon as the next statistics arrive rather than sleeping the whole timeout
+            start = time.monotonic()
+            monitor.wait_for_change(5)
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            monitor.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
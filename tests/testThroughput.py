@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+
+from queue_monitor import ThroughputController
+
+
+def queue(size, enqueued, dequeued):
+    return {'test_queue': {'name': 'test_queue', 'consumerCount': 1, 'enqueueCount': enqueued,
+                           'dequeueCount': dequeued, 'size': size}}
+
+
+class ThroughputControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.monitor = mock.Mock(max_queue_size=100, queues=['test_queue'])
+        self.config = {'target_depth': 50, 'min_rate': 1, 'max_rate': 100, 'interval': 10, 'horizon': 30,
+                       'smoothing': 1}
+
+    @mock.patch('queue_monitor.throughput.time.monotonic')
+    def test_rate_follows_drain(self, mock_time):
+        self.monitor.get_snapshot.side_effect = [
+            queue(20, 1000, 980),
+            queue(20, 1010, 1080),
+        ]
+        controller = ThroughputController(self.monitor, self.config, max_concurrency=20)
+        mock_time.return_value = 100
+        self.assertEqual(0, controller.reserve())
+        self.assertEqual(1, controller.rate)
+        # The second slot is a second later at 1 pid per second
+        self.assertEqual(1, controller.reserve())
+        mock_time.return_value = 110
+        self.assertEqual(0, controller.reserve())
+        # Drained 10/s, plus (50 - 20) / 30 to reach the target, each of the 2 pids produced 5 messages
+        self.assertEqual(10, controller.drain_rate)
+        self.assertEqual(5, controller.messages_per_pid)
+        self.assertAlmostEqual(11 / 5, controller.rate)
+        self.assertEqual(1, controller.concurrency)
+
+    @mock.patch('queue_monitor.throughput.time.monotonic')
+    def test_rate_share(self, mock_time):
+        self.monitor.get_snapshot.side_effect = [
+            queue(20, 1000, 980),
+            queue(20, 1010, 1080),
+        ]
+        controller = ThroughputController(self.monitor, self.config, max_concurrency=20)
+        controller.share = 0.5
+        mock_time.return_value = 100
+        controller.reserve()
+        controller.reserve()
+        mock_time.return_value = 110
+        controller.reserve()
+        # The 2 pids submitted here are taken as half of the 4 that produced the 10 messages
+        self.assertEqual(2.5, controller.messages_per_pid)
+        self.assertAlmostEqual(11 / 2.5 * 0.5, controller.rate)
+
+    @mock.patch('queue_monitor.throughput.time.monotonic')
+    def test_rate_bounds(self, mock_time):
+        self.monitor.get_snapshot.side_effect = [
+            queue(0, 0, 0),
+            queue(0, 1, 10000),
+            queue(60, 62, 10000),
+            queue(150, 1000, 10000),
+        ]
+        controller = ThroughputController(self.monitor, self.config, max_concurrency=20)
+        mock_time.return_value = 0
+        controller.reserve()
+        mock_time.return_value = 10
+        controller.reserve()
+        self.assertEqual(100, controller.rate)
+        self.assertEqual(20, controller.concurrency)
+        mock_time.return_value = 20
+        controller.reserve()
+        self.assertEqual(1, controller.rate)
+        mock_time.return_value = 30
+        self.assertIsNone(controller.reserve())
+        self.assertEqual(0, controller.rate)
+        self.assertEqual(150, controller.depth)
+
+
+if __name__ == "__main__":
+    unittest.main()
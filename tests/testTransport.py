@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+import aiohttp
+import requests
+
+from transport import create_session, RetryingSession, TimeoutHTTPAdapter
+
+
+class MockResponse:
+    def __init__(self, status):
+        self.status = status
+        self.released = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.released = True
+        return False
+
+
+class FailedRequest:
+    async def __aenter__(self):
+        raise aiohttp.ClientConnectionError('refused')
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class TransportTest(unittest.TestCase):
+
+    def test_defaults(self):
+        session = create_session()
+        adapter = session.get_adapter('http://localhost:8080/fcrepo')
+        self.assertIsInstance(adapter, TimeoutHTTPAdapter)
+        self.assertEqual(10, adapter._pool_maxsize)
+        self.assertEqual(3, adapter.max_retries.total)
+        self.assertEqual(30, adapter.timeout)
+        self.assertEqual('keep-alive', session.headers['Connection'])
+        session.close()
+
+    def test_config(self):
+        session = create_session({
+            'pool_size': 50,
+            'keep_alive': False,
+            'timeout': [5, 60],
+            'retries': 1,
+            'backoff_factor': 1
+        })
+        adapter = session.get_adapter('https://localhost:8080/fcrepo')
+        self.assertEqual(50, adapter._pool_maxsize)
+        self.assertEqual(1, adapter.max_retries.total)
+        self.assertEqual(1, adapter.max_retries.backoff_factor)
+        self.assertEqual((5, 60), adapter.timeout)
+        self.assertEqual('close', session.headers['Connection'])
+        session.close()
+
+    @mock.patch('requests.adapters.HTTPAdapter.send')
+    def test_timeout_applied(self, mock_send):
+        response = requests.Response()
+        response.status_code = 200
+        mock_send.return_value = response
+        session = create_session({'timeout': 7})
+        session.get('http://localhost:8080/fcrepo')
+        self.assertEqual(7, mock_send.call_args.kwargs['timeout'])
+        session.get('http://localhost:8080/fcrepo', timeout=2)
+        self.assertEqual(2, mock_send.call_args.kwargs['timeout'])
+        session.close()
+
+    def test_returns_last_error(self):
+        requests_seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests_seen.append(self.path)
+                self.send_response(500)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        session = create_session({'retries': 2, 'backoff_factor': 0})
+        try:
+            response = session.get(f'http://127.0.0.1:{server.server_address[1]}/ocr/test:pid')
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(500, response.status_code)
+        self.assertEqual(3, len(requests_seen))
+
+
+class RetryingSessionTest(unittest.TestCase):
+
+    @staticmethod
+    def get_status(session: RetryingSession) -> int:
+        async def get():
+            async with session.get('http://localhost:8080/fcrepo', headers={'a': 'b'}) as response:
+                return response.status
+        return asyncio.run(get())
+
+    @mock.patch('asyncio.sleep')
+    def test_retries_errors(self, mock_sleep):
+        responses = [MockResponse(503), MockResponse(502), MockResponse(200)]
+        client_session = mock.Mock(get=mock.Mock(side_effect=[FailedRequest()] + responses))
+        session = RetryingSession(client_session, retries=3, backoff_factor=0.5)
+        self.assertEqual(200, self.get_status(session))
+        self.assertEqual(4, client_session.get.call_count)
+        self.assertEqual({'a': 'b'}, client_session.get.call_args.kwargs['headers'])
+        self.assertEqual([mock.call(0), mock.call(1.0), mock.call(2.0)], mock_sleep.call_args_list)
+        self.assertTrue(all(response.released for response in responses))
+
+    @mock.patch('asyncio.sleep')
+    def test_gives_up(self, mock_sleep):
+        client_session = mock.Mock(get=mock.Mock(side_effect=lambda *args, **kwargs: MockResponse(503)))
+        self.assertEqual(503, self.get_status(RetryingSession(client_session, retries=2)))
+        self.assertEqual(3, client_session.get.call_count)
+        client_session.get.side_effect = lambda *args, **kwargs: FailedRequest()
+        self.assertRaises(aiohttp.ClientConnectionError, self.get_status, RetryingSession(client_session, retries=1))
+
+    def test_no_retry(self):
+        client_session = mock.Mock(get=mock.Mock(side_effect=[MockResponse(404)]))
+        self.assertEqual(404, self.get_status(RetryingSession(client_session)))
+        self.assertEqual(1, client_session.get.call_count)
+
+
+if __name__ == "__main__":
+    unittest.main()
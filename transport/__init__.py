@@ -0,0 +1,2 @@
+from .async_session import RetryingSession
+from .session import create_session, TimeoutHTTPAdapter
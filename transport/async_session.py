@@ -0,0 +1,56 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+BACKOFF_MAX = 120
+
+
+class RetryingSession:
+    """
+    Wraps an aiohttp ClientSession so GETs retry connection errors, timeouts and 5xx responses, backing off between
+    attempts like the Retry of a session from create_session.
+    """
+
+    def __init__(self, session: aiohttp.ClientSession, retries: int = 3, backoff_factor: float = 0.3):
+        """
+        :param session: The session to send requests with
+        :param retries: Retries for connection errors and 5xx responses
+        :param backoff_factor: Backoff between retries, there is none before the first and it doubles after that
+        """
+        self.session = session
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+
+    @asynccontextmanager
+    async def get(self, url: str, **kwargs):
+        """
+        Send a GET, retrying until it gets a response that is not a 5xx or runs out of retries
+        :param url: The url
+        :param kwargs: Passed to the session's get
+        :return: A context manager for the last response
+        """
+        attempt = 0
+        while True:
+            request = self.session.get(url, **kwargs)
+            try:
+                response = await request.__aenter__()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt >= self.retries:
+                    raise
+            else:
+                if response.status not in RETRY_STATUSES or attempt >= self.retries:
+                    break
+                await request.__aexit__(None, None, None)
+            attempt += 1
+            await asyncio.sleep(self._backoff(attempt))
+        try:
+            yield response
+        finally:
+            await request.__aexit__(None, None, None)
+
+    def _backoff(self, attempt: int) -> float:
+        if attempt <= 1:
+            return 0
+        return min(BACKOFF_MAX, self.backoff_factor * 2 ** (attempt - 1))
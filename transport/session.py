@@ -0,0 +1,49 @@
+import requests
+from requests.adapters import HTTPAdapter
+from requests.adapters import Retry
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """ An HTTPAdapter that applies a default timeout to every request sent through it. """
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def create_session(config: dict = None) -> requests.Session:
+    """
+    Create a requests Session with a pooled, retrying transport
+    :param config: The transport settings, all optional:
+        pool_size: Connections kept open per host (default 10)
+        keep_alive: Whether to reuse connections between requests (default True)
+        timeout: Seconds to wait to connect and for a response, a number or a [connect, read] pair (default 30)
+        retries: Retries for connection errors and 5xx responses (default 3)
+        backoff_factor: Backoff between retries (default 0.3)
+    :return: The session
+    """
+    config = config or {}
+    pool_size = config.get('pool_size', 10)
+    timeout = config.get('timeout', 30)
+    if isinstance(timeout, list):
+        timeout = tuple(timeout)
+    retry = Retry(
+        total=config.get('retries', 3),
+        backoff_factor=config.get('backoff_factor', 0.3),
+        status_forcelist=[500, 502, 503, 504],
+        # Return the last response once the retries run out, so callers still see the error status
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry,
+                                 timeout=timeout)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not config.get('keep_alive', True):
+        session.headers.update({"Connection": "close"})
+    return session